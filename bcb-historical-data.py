@@ -1,10 +1,5 @@
 from datetime import datetime, date
-from bcb import sgs
-from dateutil.relativedelta import relativedelta
-from bcb import currency
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import mplcursors
+from financialmarket import rendering
 
 #
 # Overview
@@ -51,62 +46,16 @@ while start_date is None:
 # Data
 #
 
-# Get data
-selic = sgs.get({'Selic': 432}, start=start_date)
-currencies = currency.get(['USD', 'EUR'], start=start_date, end=date.today(), side='ask')
-ipca = sgs.get({'IPCA': 433}, start=start_date)
-igpm = sgs.get({'IGP-M': 189}, start=start_date)
+from financialmarket import analyses, charts, data
 
-# Convert the start_date to a datetime object and subtract 11 months from the date
-inflation_12m_start_date = datetime.strptime(start_date, "%Y-%m-%d")
-inflation_12m_start_date = inflation_12m_start_date - relativedelta(months=11)
-# Calculate the 12-month rolling inflation rates using a moving window approach and the previousl calculated inflation_12m_start_date.
-ipca_12m = sgs.get({'IPCA': 433}, start=inflation_12m_start_date)
-ipca_12m = ipca_12m.rolling(12).apply(lambda x: (1 + x / 100).prod() - 1).dropna() * 100
-igpm_12m = sgs.get({'IGP-M': 189}, start=inflation_12m_start_date)
-igpm_12m = igpm_12m.rolling(12).apply(lambda x: (1 + x / 100).prod() - 1).dropna() * 100
+# Get data (the four downloads run at the same time)
+downloads = data.download_bcb_history(start_date)
+results = analyses.bcb_history(**downloads, start_date=start_date)
 
 #
 # Graph
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-graphs, axes = plt.subplots(4, figsize=(14, 8), sharex='col')
-
-axes[0].plot(selic, label='Selic')
-axes[0].yaxis.set_major_formatter(ticker.PercentFormatter())
-axes[0].set_ylabel('Selic')
-axes[0].legend(title=f'Current Selic: {selic["Selic"].iloc[-1]}')
-
-def brl_formatter(x, pos):
-    return f'R${x:.2f}'
-
-axes[1].plot(currencies['USD'], label='USD')
-axes[1].plot(currencies['EUR'], label='EUR')
-axes[1].yaxis.set_major_formatter(brl_formatter)
-axes[1].set_ylabel('Currencies')
-axes[1].legend(title=f'Last USD: R$ {currencies["USD"].iloc[-1]:.2f}\nLast EUR: R$ {currencies["EUR"].iloc[-1]:.2f}')
-
-axes[2].plot(ipca, label='IPCA')
-axes[2].plot(igpm, label='IGP-M')
-axes[2].yaxis.set_major_formatter(ticker.PercentFormatter())
-axes[2].set_ylabel('Monthly Inflation')
-axes[2].legend(title=f'Last IPCA: {ipca["IPCA"].iloc[-1]:.2f}\nLast IGP-M: {igpm["IGP-M"].iloc[-1]:.2f}')
-
-axes[3].plot(ipca_12m, label='IPCA')
-axes[3].plot(igpm_12m, label='IGP-M')
-axes[3].yaxis.set_major_formatter(ticker.PercentFormatter())
-axes[3].set_ylabel('12-month Rolling Inflation')
-axes[3].legend(title=f'Last IPCA: {ipca_12m["IPCA"].iloc[-1]:.2f}\nLast IGP-M: {igpm_12m["IGP-M"].iloc[-1]:.2f}')
-
-# Add interactive annotations with cursor functionality
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
-
-plt.show()
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.bcb_history_chart(figure, **results)
+rendering.finish(figure)
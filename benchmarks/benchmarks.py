@@ -0,0 +1,369 @@
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import analyses, bootstrap, compounding, currencies, kernels, optimization, risk, stress, synthetic
+from financialmarket.cdi import CDIIndex
+from financialmarket.downsampling import downsample
+from financialmarket.pricestore import PriceStore
+from financialmarket.providers import SyntheticProvider
+from financialmarket.streaming import StreamingStatistics
+
+#
+# Benchmarks
+#
+
+# asv style benchmarks: setup(*params) runs before each time_* method, untimed. They use seeded
+# synthetic data only, so they run without network access (see benchmarks/run.py).
+
+ASSETS = [10, 100, 1000]
+YEARS = [5, 20, 50]
+
+@lru_cache(maxsize=4)
+def prices(assets, years, staggered=True):
+    return synthetic.gbm_prices(synthetic.tickers(assets), synthetic.business_days(years), seed=assets + years, staggered=staggered)
+
+@lru_cache(maxsize=4)
+def cdi_rates(years):
+    return synthetic.ar_rates(synthetic.business_days(years), seed=years)
+
+def equal_weights(prices):
+    return {ticker: 100 / len(prices.columns) for ticker in prices.columns}
+
+class Drawdown:
+    params = (ASSETS, YEARS)
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years)
+        self.weights = equal_weights(self.prices)
+
+    def time_assets(self, assets, years):
+        analyses.drawdown(self.prices)
+
+    def time_portfolio(self, assets, years):
+        analyses.drawdown(self.prices, self.weights)
+
+class ValueAtRisk:
+    params = (ASSETS, YEARS)
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years)
+        self.weights = equal_weights(self.prices)
+
+    def time_assets(self, assets, years):
+        analyses.value_at_risk(self.prices, 0.95)
+
+    def time_portfolio(self, assets, years):
+        analyses.value_at_risk(self.prices, 0.95, self.weights)
+
+class VarDecomposition:
+    # Component VaR and ES of every position and the incremental VaR of 100 trades of 10 assets each
+    params = (ASSETS, YEARS[:2])
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.returns = risk.scenario_returns(prices(assets, years, staggered=False))
+        self.weights = pd.Series(1 / assets, index=self.returns.columns)
+        self.portfolio_risk = risk.PortfolioRisk(self.returns, self.weights, 0.99)
+        random = np.random.default_rng(assets)
+        self.trades = pd.DataFrame(random.normal(0, 0.01, (100, 10)), columns=random.choice(self.returns.columns, 10, replace=False))
+
+    def time_decomposition(self, assets, years):
+        portfolio_risk = risk.PortfolioRisk(self.returns, self.weights, 0.99)
+        portfolio_risk.parametric()
+        portfolio_risk.historical()
+
+    def time_incremental(self, assets, years):
+        self.portfolio_risk.incremental_var(self.trades)
+
+class StressTest:
+    # Every scenario applied to many portfolios of all the assets at once, over 20 years of prices
+    params = (ASSETS, [100, 10000])
+    param_names = ['assets', 'portfolios']
+
+    def setup(self, assets, portfolios):
+        self.prices = prices(assets, 20)
+        random = np.random.default_rng(portfolios)
+        self.weights = pd.DataFrame(random.dirichlet(np.ones(assets), portfolios).T, index=self.prices.columns)
+        self.scenarios = stress.load_scenarios()
+
+    def time_stress_test(self, assets, portfolios):
+        stress.stress_test(self.prices, self.weights, self.scenarios)
+
+class Markowitz:
+    # The SLSQP optimizations take minutes with 100 assets and hours with 1000, so the frontier
+    # has 10 points and the largest scale is left out
+    params = (ASSETS[:2], YEARS)
+    param_names = ['assets', 'years']
+    timeout = 600
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years, staggered=False)
+        self.log_mean, self.covariance = analyses.annualized_log_returns(self.prices)
+        self.limits = analyses.markowitz_limits(self.log_mean, self.covariance)
+
+    def time_annualized_log_returns(self, assets, years):
+        analyses.annualized_log_returns(self.prices)
+
+    def time_limits(self, assets, years):
+        analyses.markowitz_limits(self.log_mean, self.covariance)
+
+    def time_frontier(self, assets, years):
+        analyses.efficient_frontier(self.log_mean, self.covariance, self.limits['minimum_risk_return'], self.limits['maximum_return'], 10)
+
+    def time_sharpe(self, assets, years):
+        analyses.markowitz(self.prices, 'sharpe', limits=self.limits, frontier_points=10)
+
+class RiskParity:
+    # Allocations without SLSQP, up to the largest scale
+    params = (ASSETS, YEARS[:2])
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.covariance = analyses.annualized_log_returns(prices(assets, years, staggered=False))[1]
+        # scipy's clustering is imported once, outside the timings
+        analyses.hrp_weights(self.covariance.iloc[:2, :2])
+
+    def time_hrp(self, assets, years):
+        analyses.hrp_weights(self.covariance)
+
+    def time_erc(self, assets, years):
+        analyses.erc_weights(self.covariance)
+
+class ConstrainedMarkowitz:
+    # Optimizations under bounds with short positions, 10 group limits, exposure and turnover limits
+    params = ([100, 300], YEARS[:1])
+    param_names = ['assets', 'years']
+    timeout = 600
+
+    def setup(self, assets, years):
+        self.log_mean, self.covariance = analyses.annualized_log_returns(prices(assets, years, staggered=False))
+        tickers = list(self.log_mean.index)
+        self.constraints = {
+            'bounds': {'default': [-0.05, 0.05]},
+            'groups': {f'group {group}': {'assets': tickers[group::10], 'min': 0.02, 'max': 0.15} for group in range(10)},
+            'long': 1.3,
+            'short': 0.3,
+            'current': {ticker: 1 / assets for ticker in tickers},
+            'turnover': 0.5,
+        }
+        self.limits = optimization.constrained_limits(self.log_mean, self.covariance, self.constraints)
+
+    def time_minimum_variance(self, assets, years):
+        optimization.minimum_variance(self.log_mean, self.covariance, self.constraints)
+
+    def time_sharpe(self, assets, years):
+        optimization.maximum_sharpe(self.log_mean, self.covariance, self.constraints)
+
+    def time_limits(self, assets, years):
+        optimization.constrained_limits(self.log_mean, self.covariance, self.constraints)
+
+    def time_frontier(self, assets, years):
+        optimization.constrained_frontier(self.log_mean, self.covariance, self.constraints, self.limits['minimum_risk_return'], self.limits['maximum_return'], 10)
+
+class PortfolioBacktest:
+    params = (ASSETS, YEARS)
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years)
+        self.weights = equal_weights(self.prices)
+
+    def time_backtest(self, assets, years):
+        analyses.portfolio_backtest(self.prices, self.weights)
+
+class Methods:
+    params = (YEARS,)
+    param_names = ['years']
+
+    def setup(self, years):
+        self.ibov = prices(1, years)[synthetic.tickers(1)[0]]
+        self.cdi = cdi_rates(years)
+
+    def time_ma(self, years):
+        analyses.ma_method(self.ibov, self.cdi, 10)
+
+    def time_lmp(self, years):
+        analyses.lmp_method(self.ibov, self.cdi)
+
+class TrendFollowing:
+    # The moving average method over a universe of assets in one pass
+    params = (ASSETS, ['equal', 'volatility'])
+    param_names = ['assets', 'weighting']
+
+    def setup(self, assets, weighting):
+        self.prices = prices(assets, 20)
+        self.cdi = cdi_rates(20)
+
+    def time_trend_following(self, assets, weighting):
+        analyses.trend_following(self.prices, self.cdi, 10, weighting)
+
+class Bootstrap:
+    # Confidence intervals of an equally weighted portfolio from 20 years of daily returns, in a
+    # single process and across the default process pool
+    params = ([1000, 10000], bootstrap.METHODS)
+    param_names = ['resamples', 'method']
+    timeout = 600
+
+    def setup(self, resamples, method):
+        self.returns = risk.daily_returns(prices(10, 20, staggered=False)).dropna().mean(axis=1).to_frame('Portfolio')
+
+    def time_single_process(self, resamples, method):
+        bootstrap.bootstrap(self.returns, 252, resamples, method, processes=1)
+
+    def time_process_pool(self, resamples, method):
+        bootstrap.bootstrap(self.returns, 252, resamples, method)
+
+class CurrencyConversion:
+    # A universe quoted in BRL, USD and EUR converted to BRL with one multiply, against reindexing
+    # the exchange rate of each ticker separately (only the first 100 tickers)
+    params = (ASSETS, YEARS[:2])
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years).copy()
+        suffixes = ['.SA', '', '.DE']
+        self.prices.columns = [f'{ticker}{suffixes[number % 3]}' for number, ticker in enumerate(self.prices.columns)]
+        # The rates are generated once, as they are downloaded once per run (data.download_currencies)
+        provider = SyntheticProvider(end_date=self.prices.index[-1])
+        self.rates = provider.currencies(['USD', 'EUR'], self.prices.index[0] - pd.Timedelta(days=10), self.prices.index[-1])
+        self.source = type('CurrencySource', (), {'download_currencies': staticmethod(lambda symbols, start_date, end_date: self.rates[symbols])})
+
+    def time_to_base(self, assets, years):
+        currencies.to_base(self.prices, source=self.source)
+
+    def time_per_ticker(self, assets, years):
+        tagged = currencies.ticker_currencies(list(self.prices.columns[:100]))
+        for ticker, currency in zip(self.prices.columns[:100], tagged):
+            if currency != 'BRL':
+                self.prices[ticker] * self.rates[currency].reindex(self.prices.index, method='ffill')
+
+class Kernels:
+    # The path dependent kernels (compiled by numba when it is installed, NumPy otherwise) against
+    # their loops run by the interpreter, which setup checks they give the same results as
+    params = (YEARS,)
+    param_names = ['years']
+    timeout = 600
+
+    def setup(self, years):
+        self.values = prices(10, years, staggered=False).iloc[:, 0].to_numpy()
+        self.returns = risk.daily_returns(prices(10, years, staggered=False)).fillna(0.0).to_numpy()
+        self.target = np.full(10, 0.1)
+        for kernel_episodes, loop_episodes in zip(kernels.drawdown_episodes(self.values), kernels.drawdown_episodes.loop(self.values)):
+            np.testing.assert_array_equal(kernel_episodes, loop_episodes)
+        kernel_returns, kernel_rebalanced = kernels.threshold_rebalance(self.returns, self.target, 0.02)
+        loop_returns, loop_rebalanced = kernels.threshold_rebalance.loop(self.returns, self.target, 0.02)
+        np.testing.assert_array_equal(kernel_rebalanced, loop_rebalanced)
+        np.testing.assert_allclose(kernel_returns, loop_returns, rtol=0, atol=1e-12)
+
+    def time_drawdown_episodes(self, years):
+        kernels.drawdown_episodes(self.values)
+
+    def time_drawdown_episodes_loop(self, years):
+        kernels.drawdown_episodes.loop(self.values)
+
+    def time_threshold_rebalance(self, years):
+        kernels.threshold_rebalance(self.returns, self.target, 0.02)
+
+    def time_threshold_rebalance_loop(self, years):
+        kernels.threshold_rebalance.loop(self.returns, self.target, 0.02)
+
+class CDIAccumulation:
+    # CDI returns of many periods looked up in the accumulation index, against compounding the
+    # daily rates of each period
+    params = (YEARS, [100, 10000])
+    param_names = ['years', 'periods']
+
+    def setup(self, years, periods):
+        self.directory = tempfile.mkdtemp()
+        rates = cdi_rates(years)
+        self.index = CDIIndex(os.path.join(self.directory, 'cdi-index.npz'), download=lambda start: rates[rates.index >= start])
+        self.index.update(rates.index[0])
+        self.rates = rates
+        random = np.random.default_rng(periods)
+        self.start_dates = random.choice(rates.index[:-63], periods)
+        self.end_dates = self.start_dates + np.timedelta64(90, 'D')
+
+    def teardown(self, years, periods):
+        shutil.rmtree(self.directory)
+
+    def time_index_lookup(self, years, periods):
+        self.index.period_returns(self.start_dates, self.end_dates)
+
+    def time_compounded_periods(self, years, periods):
+        # The daily rates of each period compounded again (only the first 100 periods)
+        growth = 1 + self.rates / 100
+        for start, end in zip(self.start_dates[:100], self.end_dates[:100]):
+            growth[(growth.index > start) & (growth.index <= end)].prod()
+
+class Inflation:
+    params = (YEARS,)
+    param_names = ['years']
+
+    def setup(self, years):
+        self.ipca = synthetic.monthly_rates(years, seed=years)
+        self.daily = cdi_rates(years)
+
+    def time_rolling_12m(self, years):
+        compounding.rolling_compounded(self.ipca, 12)
+
+    def time_rolling_252d(self, years):
+        compounding.rolling_compounded(self.daily, 252)
+
+class Downsampling:
+    params = (YEARS, ['minmax', 'lttb'])
+    param_names = ['years', 'method']
+
+    def setup(self, years, method):
+        self.prices = prices(10, years)
+
+    def time_downsample(self, years, method):
+        downsample(self.prices, 2800, method)
+
+class MemoryMappedPrices:
+    params = (ASSETS, ['float64', 'float32'])
+    param_names = ['assets', 'dtype']
+
+    def setup(self, assets, dtype):
+        self.directory = tempfile.mkdtemp()
+        self.store = PriceStore.from_frame(os.path.join(self.directory, 'store'), prices(assets, 20), dtype)
+        tickers = list(self.store.tickers)
+        self.range = tickers[len(tickers) // 4:len(tickers) // 2]
+        self.scattered = tickers[::4]
+
+    def teardown(self, assets, dtype):
+        shutil.rmtree(self.directory)
+
+    def time_view_range(self, assets, dtype):
+        self.store.view(self.range, '2010-01-01').sum()
+
+    def time_view_scattered(self, assets, dtype):
+        self.store.view(self.scattered, '2010-01-01').sum()
+
+    def time_drawdown_chunks(self, assets, dtype):
+        for chunk in self.store.chunks(size=100):
+            analyses.drawdown(chunk)
+
+class Streaming:
+    # End of day update of the statistics of every asset with the newest bar, against recomputing
+    # the drawdowns over the whole history
+    params = (ASSETS, YEARS)
+    param_names = ['assets', 'years']
+
+    def setup(self, assets, years):
+        self.prices = prices(assets, years)
+        self.state = StreamingStatistics(self.prices.columns).update_frame(self.prices.iloc[:-1]).state()
+        self.last_date = self.prices.index[-1]
+        self.last_prices = self.prices.iloc[-1].to_numpy()
+
+    def time_update_bar(self, assets, years):
+        StreamingStatistics.from_state(self.state).update(self.last_date, self.last_prices)
+
+    def time_full_history(self, assets, years):
+        analyses.drawdown(self.prices)
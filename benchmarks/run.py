@@ -0,0 +1,95 @@
+import argparse
+import fnmatch
+import gc
+import inspect
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks import benchmarks
+
+#
+# Runner
+#
+
+# Runs the asv style benchmarks without asv, reporting the best time of a few runs and the peak
+# memory allocated (tracemalloc) by one more run of each benchmark
+
+def benchmark_classes(module=benchmarks):
+    return [cls for _, cls in inspect.getmembers(module, inspect.isclass) if cls.__module__ == module.__name__]
+
+def parameter_sets(cls, quick=False):
+    params = getattr(cls, 'params', ())
+    if params and not isinstance(params[0], (list, tuple)):
+        params = (params,)
+    sets = list(itertools.product(*params))
+    # The quick run only uses the smallest scale
+    return sets[:1] if quick else sets
+
+def measure(function, args, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+def run(pattern='*', repeat=3, quick=False, file=sys.stdout):
+    results = []
+    for cls in benchmark_classes():
+        methods = [name for name in dir(cls) if name.startswith('time_')]
+        for params in parameter_sets(cls, quick):
+            selected = [name for name in methods if fnmatch.fnmatch(f'{cls.__name__}.{name}', pattern)]
+            if not selected:
+                continue
+            instance = cls()
+            if hasattr(instance, 'setup'):
+                instance.setup(*params)
+            for name in selected:
+                seconds, peak = measure(getattr(instance, name), params, repeat)
+                result = {'benchmark': f'{cls.__name__}.{name}', 'params': list(params), 'seconds': seconds, 'peak_bytes': peak}
+                results.append(result)
+                print(f'{result["benchmark"]:<42} {str(tuple(params)):<16} {seconds * 1000:12.2f} ms {peak / 2 ** 20:10.1f} MiB', file=file, flush=True)
+            if hasattr(instance, 'teardown'):
+                instance.teardown(*params)
+    return results
+
+def compare(results, baseline_path, file=sys.stdout):
+    # Ratios of the times of this run to the times of a previous run saved with --json
+    with open(baseline_path) as baseline_file:
+        baseline = {(result['benchmark'], tuple(result['params'])): result for result in json.load(baseline_file)}
+    print('\nCompared to the baseline (time ratio, < 1 is faster):', file=file)
+    for result in results:
+        previous = baseline.get((result['benchmark'], tuple(result['params'])))
+        if previous:
+            print(f'{result["benchmark"]:<42} {str(tuple(result["params"])):<16} {result["seconds"] / previous["seconds"]:8.2f}x', file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Run the benchmarks on synthetic data.')
+    parser.add_argument('-k', '--pattern', default='*', help='only run benchmarks matching this pattern, e.g. "Drawdown.*"')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each benchmark, the best one is reported')
+    parser.add_argument('--quick', action='store_true', help='only run the smallest scale of each benchmark')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='compare the times to the results saved in this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat, args.quick)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
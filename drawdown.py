@@ -1,9 +1,5 @@
-import logging
 from datetime import datetime, date
-import yfinance as yf
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mplticker
-import mplcursors
+from financialmarket import rendering
 
 #
 # Overview
@@ -18,9 +14,6 @@ print('\n#----------------------------------------------------------------------
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -38,17 +31,12 @@ def validate_date(input_date):
         return False
 
 def validate_assets(asset_inputs, start_date):
-    assets = {}
-    asset_tickers = asset_inputs.split(',')
-    for ticker in asset_tickers:
-        # Remove leading/trailing spaces
-        ticker = ticker.strip() 
-        # Download asset data using yfinance
-        asset_data = yf.download(ticker, start_date)['Adj Close']
-        if len(asset_data) > 0:
-            # Store asset data if successfully downloaded
-            assets[ticker] = asset_data
-    return assets
+    # Download the adjusted closes of the tickers, keeping only the ones with data (the data
+    # libraries are only imported once they're needed, after the start date is known)
+    from financialmarket import data
+
+    asset_tickers = [ticker.strip() for ticker in asset_inputs.split(',')]
+    return data.download_prices(asset_tickers, start_date)
 
 start_date = None
 while start_date is None:
@@ -65,10 +53,15 @@ asset_tickers = None
 while asset_tickers is None:
     asset_tickers = input('Specify the asset ticker symbols (comma-separated): ')
     assets = validate_assets(asset_tickers, start_date)
-    if not assets:
+    if assets.empty:
         print('No valid assets found. Please enter at least one valid asset ticker symbol.')
         asset_tickers = None
 
+# Assets quoted in other currencies can be converted to BRL
+from financialmarket import currencies
+
+assets = currencies.prompt_conversion(assets)
+
 # If calculating VaR for a portfolio, gather asset weights
 asset_weights = {}
 if drawdown_type == 'portfolio':
@@ -96,58 +89,25 @@ if drawdown_type == 'portfolio':
 # Drawdown
 #
 
-# Calculate the maximum drawdown for each asset and store the results in a dictionary
-max_drawdowns = {}
-for ticker, asset_data in assets.items():
-    asset_data_max = asset_data.cummax()
-    drawdowns = (asset_data - asset_data_max) / asset_data_max
-    drawdown_max = drawdowns.min()
-    max_drawdowns[ticker] = drawdown_max
+import pandas as pd
+from financialmarket import analyses
 
-# Calculate the maximum drawdown of the portfolio if portfolio was selected
-if drawdown_type == 'portfolio':
-    combined_asset_data = None
-    for ticker, asset_data in assets.items():
-        weighted_asset_data = asset_data * asset_weights[ticker]
-        if combined_asset_data is None:
-            combined_asset_data = weighted_asset_data
-        else:
-            combined_asset_data += weighted_asset_data
+# Calculate the drawdowns and maximum drawdown of each asset, and of the portfolio if portfolio was selected
+results = analyses.drawdown(assets, asset_weights if drawdown_type == 'portfolio' else None, episodes=True)
 
-    combined_asset_data_max = combined_asset_data.cummax()
-    combined_portfolio_drawdowns = (combined_asset_data - combined_asset_data_max) / combined_asset_data_max
-    max_drawdowns['Portfolio'] = combined_portfolio_drawdowns.min()
+# Print the deepest drawdown episode of each asset or of the portfolio, with its peak, trough and recovery dates
+for series, episodes in results['episodes'].groupby('series', sort=False):
+    worst = episodes.loc[episodes['drawdown'].idxmin()]
+    recovery = 'not recovered yet' if pd.isna(worst['recovery']) else f'recovered on {worst["recovery"]:%Y-%m-%d}'
+    print(f'{series}: {worst["drawdown"]:.2%} from its peak on {worst["peak"]:%Y-%m-%d} to {worst["trough"]:%Y-%m-%d}, {recovery}')
 
 #
 # Graph
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-drawdown, axes = plt.subplots(figsize=(14, 8))
-
-if drawdown_type == 'assets':
-    for ticker, asset_data in assets.items():
-        drawdowns = (asset_data - asset_data.cummax()) / asset_data.cummax()
-        axes.plot(drawdowns, label=ticker)
-elif drawdown_type == 'portfolio':
-    axes.plot(combined_portfolio_drawdowns, label='Portfolio')
-
-axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
-plt.xlabel('Time')
-plt.ylabel('Drawdown')
-axes.set_title('Drawdown x Time')
-
-legend_text = '\n'.join([f'{ticker}: {max_drawdown:.2%}' for ticker, max_drawdown in max_drawdowns.items()]) + '\n'
-plt.legend(title=f'Max. Drawdowns:\n\n{legend_text}')
-
-# Enable cursor interaction on the graph
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
+from financialmarket import charts
 
-plt.show()
+# Plot the drawdowns of the individual assets or of the portfolio
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.drawdown_chart(figure, results['drawdowns'], results['max_drawdowns'])
+rendering.finish(figure)
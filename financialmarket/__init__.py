@@ -0,0 +1,5 @@
+import os
+
+# Repository root and the local directory where downloaded data is stored
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, 'data')
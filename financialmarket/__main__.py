@@ -0,0 +1,3 @@
+from financialmarket.cli import main
+
+main()
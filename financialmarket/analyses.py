@@ -0,0 +1,522 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from financialmarket import compounding, copom, inflation, kernels, optimization, profiling, risk, stress
+from financialmarket.cdi import CDIIndex
+from financialmarket.profiling import timed
+
+#
+# Analyses
+#
+
+# The computations behind each program, taking already downloaded data so they can be run by the
+# interactive programs, the command line jobs or anything else. Prices are DataFrames of adjusted
+# closes with one column per ticker and weights map tickers to percentages.
+
+def weighted_prices(prices, weights):
+    # Combined value of the portfolio (prices weighted by the asset weights) on the dates all the assets have prices
+    weights = pd.Series(weights, dtype=float)
+    return prices[weights.index].dropna().mul(weights, axis=1).sum(axis=1)
+
+#
+# Drawdown
+#
+
+def drawdowns(prices):
+    # Drawdown of each price from its running maximum
+    prices_max = prices.cummax()
+    return (prices - prices_max) / prices_max
+
+def drawdown_episodes(prices):
+    # Every drawdown episode of each column: the dates of its peak, trough and recovery (missing
+    # while it has not recovered) and its drawdown, one row per episode
+    columns = {'series': [], 'peak': [], 'trough': [], 'recovery': [], 'drawdown': []}
+    for name, series in prices.items():
+        series = series.dropna()
+        dates = series.index.to_numpy()
+        peaks, troughs, recoveries, episode_drawdowns = kernels.drawdown_episodes(series.to_numpy(dtype=float))
+        columns['series'].append(np.full(len(peaks), name, dtype=object))
+        columns['peak'].append(dates[peaks])
+        columns['trough'].append(dates[troughs])
+        columns['recovery'].append(np.where(recoveries >= 0, dates[recoveries], np.datetime64('NaT')))
+        columns['drawdown'].append(episode_drawdowns)
+    return pd.DataFrame({name: np.concatenate(values) if values else [] for name, values in columns.items()})
+
+@timed('compute')
+def drawdown(prices, weights=None, episodes=False):
+    # Drawdowns of the individual assets or, when weights are given, of the portfolio (and all
+    # their drawdown episodes with episodes=True)
+    asset_drawdowns = drawdowns(prices)
+    max_drawdowns = asset_drawdowns.min().to_dict()
+    if weights is None:
+        results = {'drawdowns': asset_drawdowns, 'max_drawdowns': max_drawdowns}
+        if episodes:
+            results['episodes'] = drawdown_episodes(prices)
+        return results
+
+    portfolio_prices = weighted_prices(prices, weights).to_frame('Portfolio')
+    portfolio_drawdowns = drawdowns(portfolio_prices)
+    max_drawdowns['Portfolio'] = portfolio_drawdowns['Portfolio'].min()
+    results = {'drawdowns': portfolio_drawdowns, 'max_drawdowns': max_drawdowns}
+    if episodes:
+        results['episodes'] = drawdown_episodes(portfolio_prices)
+    return results
+
+#
+# Value at Risk
+#
+
+@timed('compute')
+def value_at_risk(prices, confidence_level, weights=None, horizons=risk.HORIZONS, scaling=False):
+    # Historical VaR (positive fractions) of the individual assets or, when weights are given, of the
+    # portfolio, for each horizon: overlapping returns over the horizon or, with scaling, the
+    # 1-day VaR scaled by the square root of time
+    if weights is not None:
+        prices = weighted_prices(prices, weights).to_frame('Portfolio')
+    horizons_var = risk.horizon_var(prices, confidence_level, horizons, scaling)
+    return {'var': horizons_var.to_dict(orient='index'), 'horizons': horizons_var}
+
+@timed('compute')
+def var_decomposition(prices, confidence_level, weights, horizon='1d', trades=None):
+    # Marginal and component VaR and ES of each asset, parametric and historical, for a portfolio
+    # rebalanced to the weights at the start of each horizon (so the components add up to the VaR of
+    # its returns rather than that of the weighted prices). trades are hypothetical trades, each a
+    # dict of weight changes (percentages) by ticker, whose incremental VaR is also returned; more
+    # can be evaluated later with the returned risk.PortfolioRisk (in fractions).
+    returns = risk.scenario_returns(prices[list(weights)], risk.horizon_days(horizon))
+    portfolio_risk = risk.PortfolioRisk(returns, pd.Series(weights, dtype=float) / 100, confidence_level)
+    results = {
+        'decomposition': pd.concat({'parametric': portfolio_risk.parametric(), 'historical': portfolio_risk.historical()}, axis=1),
+        'totals': portfolio_risk.totals(),
+        'incremental': None,
+        'portfolio_risk': portfolio_risk,
+    }
+    if trades:
+        results['incremental'] = portfolio_risk.incremental_var(pd.DataFrame(trades) / 100)
+    return results
+
+#
+# Stress test
+#
+
+@timed('compute')
+def stress_test(prices, weights, scenarios=None):
+    # Returns of a portfolio (weights by ticker) or of many (a DataFrame of weights with one row per
+    # portfolio and one column per ticker) in the historical windows and hypothetical shocks of the
+    # scenarios (stress.load_scenarios() by default), and their lowest return within each window.
+    # The results are DataFrames with one row per scenario and one column per portfolio.
+    portfolios = weights if isinstance(weights, pd.DataFrame) else pd.DataFrame([weights], index=['Portfolio'])
+    return stress.stress_test(prices, portfolios.fillna(0.0).T / 100, scenarios or stress.load_scenarios())
+
+#
+# Markowitz
+#
+
+def annualized_log_returns(prices):
+    # Annualized mean of log returns and its covariance matrix
+    log_returns = np.log(prices / prices.shift(1))
+    values = log_returns.to_numpy()[1:]
+    if len(values) > 1 and not np.isnan(values).any():
+        # Without missing returns a single matrix product gives the same covariances as the pairwise DataFrame.cov
+        covariance = pd.DataFrame(np.cov(values, rowvar=False), index=log_returns.columns, columns=log_returns.columns)
+        return log_returns.mean() * 252, covariance * 252
+    return log_returns.mean() * 252, log_returns.cov() * 252
+
+def portfolio_metrics(weights, log_mean, covariance):
+    weights = np.array(weights)
+    returns = log_mean.dot(weights)
+    volatility = np.sqrt(weights.T.dot(covariance.dot(weights)))
+    sharpe_ratio = returns / volatility
+    return [returns, volatility, sharpe_ratio]
+
+def optimize_weights(objective, log_mean, covariance, constraints=()):
+    # Minimizes objective(metrics) over long only weights (between 0 and 1) that sum to 1, starting from equal weights
+    from scipy import optimize
+
+    count = len(log_mean)
+    bounds = [(0, 1)] * count
+    initial_guess = [(1 / count)] * count
+    constraints = [{'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1}] + list(constraints)
+    with profiling.stage('optimize'):
+        result = optimize.minimize(lambda weights: objective(portfolio_metrics(weights, log_mean, covariance)),
+                                   initial_guess, method='SLSQP', bounds=bounds, constraints=constraints)
+    profiling.count('slsqp_runs')
+    profiling.count('slsqp_iterations', result.nit)
+    profiling.count('objective_evaluations', result.nfev)
+    return result
+
+def markowitz_limits(log_mean, covariance, constraints=None):
+    # Attainable risk and return ranges, used to validate the risk and return targets
+    if constraints is not None:
+        return optimization.constrained_limits(log_mean, covariance, constraints)
+    maximum_return_weights = optimize_weights(lambda metrics: metrics[0] * -1, log_mean, covariance).x
+    minimum_risk_weights = optimize_weights(lambda metrics: metrics[1], log_mean, covariance).x
+    maximum_risk_weights = optimize_weights(lambda metrics: metrics[1] * -1, log_mean, covariance).x
+    return {
+        'maximum_return': portfolio_metrics(maximum_return_weights, log_mean, covariance)[0],
+        'minimum_risk': portfolio_metrics(minimum_risk_weights, log_mean, covariance)[1],
+        'minimum_risk_return': portfolio_metrics(minimum_risk_weights, log_mean, covariance)[0],
+        'maximum_risk': portfolio_metrics(maximum_risk_weights, log_mean, covariance)[1],
+    }
+
+def efficient_frontier(log_mean, covariance, minimum_return, maximum_return, points=100, constraints=None):
+    # Minimum volatility for each target return between minimum_return and maximum_return
+    if constraints is not None:
+        return optimization.constrained_frontier(log_mean, covariance, constraints, minimum_return, maximum_return, points)
+    target_returns = np.linspace(minimum_return, maximum_return, points)
+    frontier_volatility = []
+    for target_return in target_returns:
+        constraints = [{'type': 'eq', 'fun': lambda weights: portfolio_metrics(weights, log_mean, covariance)[0] - target_return}]
+        frontier_volatility.append(optimize_weights(lambda metrics: metrics[1], log_mean, covariance, constraints).fun)
+    return frontier_volatility, list(target_returns)
+
+def cluster_variance(covariance, cluster):
+    # Variance of the inverse-variance portfolio of the assets in the cluster (positions)
+    cluster_covariance = covariance[np.ix_(cluster, cluster)]
+    inverse_variance = 1 / np.diag(cluster_covariance)
+    weights = inverse_variance / inverse_variance.sum()
+    return weights @ cluster_covariance @ weights
+
+def hrp_weights(covariance):
+    # Hierarchical Risk Parity (Lopez de Prado): the assets are clustered by their correlation
+    # distance, ordered so similar assets are next to each other and the weights are split
+    # between the two halves of each cluster in inverse proportion to their variances, down to
+    # single assets. No matrix is inverted, so it is stable with many correlated assets.
+    from scipy.cluster import hierarchy
+    from scipy.spatial.distance import squareform
+
+    covariance = np.asarray(covariance, dtype=float)
+    volatility = np.sqrt(np.diag(covariance))
+    correlation = covariance / np.outer(volatility, volatility)
+    distance = np.sqrt(np.clip((1 - correlation) / 2, 0, None))
+    np.fill_diagonal(distance, 0)
+    order = hierarchy.leaves_list(hierarchy.linkage(squareform(distance, checks=False), method='single'))
+
+    # Recursive bisection, one level of the tree at a time
+    weights = np.ones(len(order))
+    clusters = [order]
+    while clusters:
+        clusters = [half for cluster in clusters if len(cluster) > 1 for half in (cluster[:len(cluster) // 2], cluster[len(cluster) // 2:])]
+        for left, right in zip(clusters[::2], clusters[1::2]):
+            left_variance, right_variance = cluster_variance(covariance, left), cluster_variance(covariance, right)
+            left_share = 1 - left_variance / (left_variance + right_variance)
+            weights[left] *= left_share
+            weights[right] *= 1 - left_share
+    return weights
+
+def erc_weights(covariance, tolerance=1e-10, max_sweeps=1000):
+    # Equal risk contributions (every asset adds the same amount to the portfolio volatility),
+    # from the convex problem min y'Sy / 2 - sum(log(y)) / n, whose solution normalized to sum 1
+    # gives the weights (Spinu). Cyclical coordinate descent solves it one asset at a time, each
+    # coordinate having a closed form (the positive root of a quadratic), and keeps Sy up to date
+    # with one row of the covariance matrix per update (Griveau-Billion, Richard and Roncalli).
+    covariance = np.ascontiguousarray(covariance, dtype=float)
+    count = len(covariance)
+    budget = 1 / count
+    variances = np.diag(covariance).copy()
+
+    # Inverse volatility start, scaled to the solution's y'Sy = 1
+    y = 1 / np.sqrt(variances)
+    y /= np.sqrt(y @ covariance @ y)
+    covariance_y = covariance @ y
+    sweeps = 0
+    with profiling.stage('optimize'):
+        for sweeps in range(1, max_sweeps + 1):
+            for asset in range(count):
+                others = covariance_y[asset] - variances[asset] * y[asset]
+                updated = (np.sqrt(others * others + 4 * variances[asset] * budget) - others) / (2 * variances[asset])
+                covariance_y += covariance[asset] * (updated - y[asset])
+                y[asset] = updated
+            if np.abs(covariance_y - budget / y).max() < tolerance:
+                break
+    profiling.count('erc_sweeps', sweeps)
+    return y / y.sum()
+
+def risk_contributions(weights, covariance):
+    # Fraction of the portfolio variance coming from each asset
+    weights = np.asarray(weights, dtype=float)
+    contributions = weights * (np.asarray(covariance, dtype=float) @ weights)
+    return contributions / contributions.sum()
+
+# Allocations that don't need an optimizer, by goal
+ALLOCATORS = {
+    'hrp': hrp_weights,
+    'erc': erc_weights,
+}
+
+@timed('compute')
+def markowitz(prices, goal='sharpe', target=None, limits=None, frontier_points=100, constraints=None):
+    # Optimal weights for the goal: 'sharpe' (highest sharpe ratio), 'risk' (highest return for a volatility
+    # up to target), 'return' (lowest volatility for an expected return of target), or the weights of
+    # the 'hrp' (hierarchical risk parity) or 'erc' (equal risk contributions) allocations. These two
+    # don't use SLSQP, which then only runs for the frontier and the highest sharpe ratio portfolio
+    # shown with it, so frontier_points=0 leaves SLSQP out (for many assets). With constraints (a
+    # specification, see financialmarket.optimization) the goals are solved as quadratic programs.
+    log_mean, covariance = annualized_log_returns(prices)
+    if constraints is not None and goal in ALLOCATORS:
+        raise ValueError(f'The {goal} allocation does not take constraints.')
+    if limits is None and (frontier_points or (constraints is not None and goal == 'risk')):
+        limits = markowitz_limits(log_mean, covariance, constraints)
+
+    sharpe_ratio_weights = None
+    if goal not in ALLOCATORS or frontier_points:
+        if constraints is not None:
+            sharpe_ratio_weights = optimization.maximum_sharpe(log_mean, covariance, constraints)
+        else:
+            sharpe_ratio_weights = optimize_weights(lambda metrics: metrics[2] * -1, log_mean, covariance).x
+    if goal in ALLOCATORS:
+        optimal_weights = ALLOCATORS[goal](covariance)
+    elif goal == 'sharpe':
+        optimal_weights = sharpe_ratio_weights
+    elif goal == 'risk' and constraints is not None:
+        optimal_weights = optimization.maximum_return_for_risk(log_mean, covariance, constraints, target, limits)
+    elif goal == 'risk':
+        target_constraints = [{'type': 'ineq', 'fun': lambda weights: target - portfolio_metrics(weights, log_mean, covariance)[1]}]
+        optimal_weights = optimize_weights(lambda metrics: metrics[0] * -1, log_mean, covariance, target_constraints).x
+    elif goal == 'return' and constraints is not None:
+        optimal_weights = optimization.minimum_variance(log_mean, covariance, constraints, target)
+    elif goal == 'return':
+        target_constraints = [{'type': 'eq', 'fun': lambda weights: portfolio_metrics(weights, log_mean, covariance)[0] - target}]
+        optimal_weights = optimize_weights(lambda metrics: metrics[1], log_mean, covariance, target_constraints).x
+    else:
+        raise ValueError(f'Unknown optimization goal: {goal}')
+
+    frontier_volatility, frontier_return = [], []
+    if frontier_points:
+        frontier_volatility, frontier_return = efficient_frontier(log_mean, covariance, limits['minimum_risk_return'], limits['maximum_return'], frontier_points, constraints)
+    return {
+        'weights': dict(zip(prices.columns, optimal_weights)),
+        'metrics': portfolio_metrics(optimal_weights, log_mean, covariance),
+        'risk_contributions': dict(zip(prices.columns, risk_contributions(optimal_weights, covariance))),
+        'sharpe_ratio_weights': None if sharpe_ratio_weights is None else dict(zip(prices.columns, sharpe_ratio_weights)),
+        'sharpe_ratio_metrics': None if sharpe_ratio_weights is None else portfolio_metrics(sharpe_ratio_weights, log_mean, covariance),
+        'frontier_volatility': frontier_volatility,
+        'frontier_return': frontier_return,
+        'limits': limits,
+    }
+
+#
+# Portfolio Backtest
+#
+
+@timed('compute')
+def portfolio_backtest(prices, weights, real=False, threshold=None):
+    # Align all assets data by reindexing them to the same dates
+    all_dates = pd.date_range(start=prices.index.min(), end=date.today())
+    aligned_prices = prices.reindex(all_dates).ffill()
+
+    # Daily returns, set to 0 before each asset's inception
+    daily_returns = aligned_prices.pct_change().fillna(0)
+    asset_exists_mask = aligned_prices.notna().astype(float)
+    weights = pd.Series(weights, dtype=float) / 100
+    rebalances = None
+    if threshold is None:
+        # Constant weights (rebalanced every day)
+        portfolio_returns = (daily_returns * asset_exists_mask)[weights.index].mul(weights, axis=1).sum(axis=1)
+    else:
+        # Weights drifting with the returns, rebalanced when one is further than threshold (a fraction) from its target
+        asset_returns = (daily_returns * asset_exists_mask)[weights.index].to_numpy(dtype=float)
+        values, rebalanced = kernels.threshold_rebalance(asset_returns, weights.to_numpy(), float(threshold))
+        portfolio_returns = pd.Series(values, index=daily_returns.index)
+        rebalances = daily_returns.index[rebalanced]
+
+    # Deflate the returns by the IPCA if real returns were selected
+    if real:
+        daily_returns = inflation.deflate(daily_returns)
+        portfolio_returns = inflation.deflate(portfolio_returns)
+
+    portfolio_growth = (1 + portfolio_returns).cumprod()
+    # Returns from each trading day to the next, so the days in between, which only have inflation
+    # (real returns), are compounded into the following trading day's return
+    trading_growth = portfolio_growth[portfolio_growth.index.isin(prices.index)]
+    return {
+        'asset_cumulative_returns': (1 + daily_returns).cumprod() - 1,
+        'cumulative_portfolio_returns': portfolio_growth - 1,
+        'portfolio_returns': trading_growth / trading_growth.shift(1, fill_value=1.0) - 1,
+        # Dates of the threshold rebalances
+        'rebalances': rebalances,
+    }
+
+#
+# Switching Methods (IBOV x CDI)
+#
+
+def monthly_returns(prices):
+    # Monthly returns (from month closings) and the return of the first, incomplete, month
+    month_closing = prices.resample('ME').last()
+    month_opening = prices.resample('ME').first()
+    first_month_returns = (month_closing.iloc[0] - month_opening.iloc[0]) / month_opening.iloc[0]
+    return month_closing.pct_change().dropna(), first_month_returns
+
+def cdi_monthly_returns(cdi, start_date):
+    # Monthly returns since start_date looked up in a cdi.CDIIndex, or compounded from daily CDI
+    # rates (in percent)
+    if isinstance(cdi, CDIIndex):
+        return cdi.monthly_returns(start_date)
+    cdi_cumulative_daily_returns = (1 + cdi[cdi.index >= start_date] / 100).cumprod()
+    return monthly_returns(cdi_cumulative_daily_returns)
+
+@timed('compute')
+def ma_method(prices, cdi, ma_months, ma_prices=None, real=False):
+    # Invests in the asset if the previous month's closing value was higher than its moving average, in CDI if not.
+    # cdi is a cdi.CDIIndex or the daily CDI rates.
+    cdi_returns, first_month_cdi_returns = cdi_monthly_returns(cdi, prices.index.min())
+
+    # Moving average of 21 working days / month (of ma_prices, e.g. unadjusted closes, when given)
+    prices = prices.sort_index()
+    ma = (prices if ma_prices is None else ma_prices.sort_index()).rolling(ma_months * 21).mean()
+
+    month_closing = prices.resample('ME').last()
+    ma_month_closing = ma.resample('ME').last()
+    asset_returns, first_month_asset_returns = monthly_returns(prices)
+
+    returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Moving Average Method'], index=asset_returns.index)
+    returns['CDI'] = cdi_returns
+    returns['IBOV'] = asset_returns
+
+    # The asset when the previous month's closing was higher than its moving average, CDI for the
+    # first months (without a moving average) and otherwise
+    months = len(asset_returns)
+    invested = (month_closing.iloc[:months].to_numpy() > ma_month_closing.iloc[:months].to_numpy()) & (np.arange(months) > ma_months - 1)
+    returns['Moving Average Method'] = np.where(invested, asset_returns.to_numpy(), cdi_returns.iloc[:months].to_numpy())
+    choices = pd.Series(np.where(invested, 'IBOV', 'CDI'), index=asset_returns.index, name='Moving Average Method', dtype=object)
+
+    return method_results(returns.astype(float), choices, real)
+
+# Trading days of the volatility that scales the weights of the trend following method
+VOLATILITY_DAYS = 63
+
+@timed('compute')
+def trend_following(prices, cdi, ma_months, weighting='equal', ma_prices=None, real=False):
+    # The moving average method applied to every asset (column) of prices at once: each asset has a
+    # share of the portfolio (equal, or inversely proportional to its volatility over the last
+    # VOLATILITY_DAYS with weighting='volatility'), invested in the asset when its previous month's
+    # closing was higher than its moving average and in CDI if not. Every step is an operation on
+    # the whole months x assets array, so a universe of hundreds of assets is one pass.
+    cdi_returns, first_month_cdi_returns = cdi_monthly_returns(cdi, prices.index.min())
+
+    # Moving averages over each asset's own prices (an asset not traded on a date keeps its last price)
+    prices = prices.sort_index()
+    ma = (prices if ma_prices is None else ma_prices.sort_index()).ffill().rolling(ma_months * 21).mean()
+    month_closing = prices.resample('ME').last()
+    ma_month_closing = ma.resample('ME').last()
+    asset_returns = month_closing.pct_change(fill_method=None).iloc[1:]
+
+    # Signal from the previous month's closing, once the asset has more than ma_months months of prices (as in ma_method)
+    months_traded = month_closing.notna().cumsum()
+    invested = ((month_closing > ma_month_closing) & (months_traded > ma_months)).shift(1).iloc[1:].astype(bool)
+
+    # Shares of the assets with a return in the month, scaled by the volatility up to the previous month
+    eligible = asset_returns.notna()
+    if weighting == 'volatility':
+        volatility = prices.pct_change(fill_method=None).rolling(VOLATILITY_DAYS).std().resample('ME').last().shift(1).iloc[1:]
+        eligible &= volatility > 0
+        shares = (1 / volatility).where(eligible, 0.0)
+    elif weighting == 'equal':
+        shares = eligible.astype(float)
+    else:
+        raise ValueError(f'Unknown weighting: {weighting}. Please use "equal" or "volatility".')
+    shares = shares.div(shares.sum(axis=1).where(lambda total: total > 0, 1.0), axis=0)
+
+    # The shares not invested in their assets (and all of them in months without any asset) are in CDI
+    weights = shares.where(invested & eligible, 0.0)
+    cdi_returns = cdi_returns.reindex(asset_returns.index)
+    filled_returns = asset_returns.fillna(0.0)
+    returns = pd.DataFrame({
+        'CDI': cdi_returns,
+        'Universe': (shares * filled_returns).sum(axis=1) + (1 - shares.sum(axis=1)) * cdi_returns,
+        'Trend Following': (weights * filled_returns).sum(axis=1) + (1 - weights.sum(axis=1)) * cdi_returns,
+    })
+
+    results = method_results(returns, invested & eligible, real)
+    results['weights'] = weights.assign(CDI=1 - weights.sum(axis=1))
+    results['current_choice'] = list(weights.columns[weights.iloc[-1] > 0])
+    return results
+
+@timed('compute')
+def lmp_method(prices, cdi, real=False):
+    # Invests in the asset if it outperformed CDI last month, and vice-versa (cdi as in ma_method)
+    cdi_returns, first_month_cdi_returns = cdi_monthly_returns(cdi, prices.index.min())
+    asset_returns, first_month_asset_returns = monthly_returns(prices.sort_index())
+
+    returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Last Month Perf. Method'], index=asset_returns.index)
+    returns['CDI'] = cdi_returns
+    returns['IBOV'] = asset_returns
+
+    # The asset when it outperformed CDI in the previous month (the first, incomplete, month for the first one)
+    months = len(asset_returns)
+    previous_asset_returns = np.concatenate([[first_month_asset_returns], asset_returns.iloc[:months - 1].to_numpy()])
+    previous_cdi_returns = np.concatenate([[first_month_cdi_returns], cdi_returns.iloc[:months - 1].to_numpy()])
+    invested = previous_asset_returns > previous_cdi_returns
+    returns['Last Month Perf. Method'] = np.where(invested, asset_returns.to_numpy(), cdi_returns.iloc[:months].to_numpy())
+    choices = pd.Series(np.where(invested, 'IBOV', 'CDI'), index=asset_returns.index, name='Last Month Perf. Method', dtype=object)
+
+    return method_results(returns.astype(float), choices, real)
+
+def method_results(returns, choices, real):
+    # Deflate all the returns by the IPCA if real returns were selected
+    if real:
+        returns = inflation.deflate(returns)
+    return {
+        'returns': returns,
+        'choices': choices,
+        'cumulative_returns': (1 + returns).cumprod() - 1,
+        'current_choice': choices.iloc[-1],
+    }
+
+#
+# Brazilian Central Bank
+#
+
+@timed('compute')
+def bcb_history(selic, currencies, ipca, igpm, start_date):
+    # ipca and igpm start 11 months before the other series, for their first 12-month compounding
+    start_date = pd.Timestamp(start_date)
+    return {
+        'selic': selic,
+        'currencies': currencies,
+        'ipca': ipca[ipca.index >= start_date],
+        'igpm': igpm[igpm.index >= start_date],
+        'ipca_12m': compounding.rolling_compounded(ipca, 12).dropna(),
+        'igpm_12m': compounding.rolling_compounded(igpm, 12).dropna(),
+    }
+
+def format_selic_expectations(data):
+    # Place each meeting on its COPOM calendar date, keeping the rate until the next meeting (step function)
+    dataframe = copom.selic_path(data)
+    dataframe = dataframe.set_index('DataReferencia')
+    return dataframe.drop(columns=['Data', 'Reuniao'])
+
+def format_expectations(data, type):
+    dataframe = data.copy()
+
+    # Convert the 'DataReferencia' column to datetime using the specified format
+    if type == 'monthly':
+        dataframe['DataReferencia'] = pd.to_datetime(dataframe['DataReferencia'], format='%m/%Y')
+    elif type == 'anual':
+        dataframe['DataReferencia'] = pd.to_datetime(dataframe['DataReferencia'], format='%Y')
+
+    dataframe = dataframe.set_index('DataReferencia').sort_index()
+    return dataframe.drop(columns=['Data'])
+
+# Focus survey series shown by the expectations program: name, endpoint kind and indicator
+EXPECTATIONS = [
+    ('selic', 'selic', 'Selic'),
+    ('dollar', 'monthly', 'Câmbio'),
+    ('monthly_ipca', 'monthly', 'IPCA'),
+    ('monthly_igpm', 'monthly', 'IGP-M'),
+    ('anual_ipca', 'anual', 'IPCA'),
+    ('anual_igpm', 'anual', 'IGP-M'),
+]
+
+@timed('compute')
+def bcb_expectations(store, update=True):
+    # Latest Focus survey of each series, bringing the local store up to date first
+    expectations = {}
+    for name, kind, indicator in EXPECTATIONS:
+        if update:
+            store.update(kind, indicator)
+        latest = store.latest(kind, indicator)
+        expectations[name] = format_selic_expectations(latest) if kind == 'selic' else format_expectations(latest, kind)
+    return expectations
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import profiling
+
+#
+# Bootstrap confidence intervals
+#
+
+# Confidence intervals of the statistics of return series (the columns of a DataFrame, e.g. a
+# strategy and its benchmarks) from resampled histories. Returns are resampled in blocks of
+# consecutive periods, so the resampled histories keep the autocorrelation and volatility
+# clustering of the original one: fixed length blocks ('block', circular) or blocks of random,
+# geometrically distributed lengths ('stationary', Politis and Romano). The same periods are
+# drawn for all the columns, keeping their correlation.
+#
+# The resamples are split into chunks of a fixed size, each with its own seed spawned from the
+# seed given, and every chunk is computed as (resamples x periods x columns) arrays in a worker
+# process. The results only depend on the seed, not on the number of processes.
+METHODS = ['stationary', 'block']
+STATISTICS = ['cagr', 'sharpe_ratio', 'max_drawdown']
+
+def default_block_length(periods):
+    # Cube root of the number of periods, a common choice for the mean block length
+    return max(1, int(round(periods ** (1 / 3))))
+
+def resample_indexes(random, resamples, periods, block_length, method='stationary'):
+    # (resamples x periods) positions of the original periods in each resampled history. Blocks
+    # that go past the last period continue from the first one.
+    if method == 'block':
+        blocks = -(-periods // block_length)
+        starts = random.integers(0, periods, (resamples, blocks))
+        indexes = (starts[:, :, None] + np.arange(block_length)).reshape(resamples, -1)[:, :periods]
+    elif method == 'stationary':
+        # A new block starts at each period with probability 1 / block_length, from a random period
+        new_block = random.random((resamples, periods)) < 1 / block_length
+        new_block[:, 0] = True
+        starts = random.integers(0, periods, (resamples, periods))
+        block_start = np.maximum.accumulate(np.where(new_block, np.arange(periods), 0), axis=1)
+        indexes = np.take_along_axis(starts, block_start, axis=1) + np.arange(periods) - block_start
+    else:
+        raise ValueError(f'Unknown bootstrap method: {method}. Please use "stationary" or "block".')
+    return indexes % periods
+
+def statistics(returns, log_growth, periods_per_year):
+    # CAGR, sharpe ratio (annualized mean over annualized volatility, without a risk free rate, as
+    # in analyses.portfolio_metrics) and maximum drawdown of returns (and their log growth,
+    # log(1 + returns)) along the second to last axis. The drawdowns are taken on the cumulative
+    # log growth, so the wealth of every resampled history is never exponentiated.
+    periods = returns.shape[-2]
+    cumulative = np.cumsum(log_growth, axis=-2)
+    cagr = np.expm1(cumulative[..., -1, :] * periods_per_year / periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratio = returns.mean(axis=-2) / returns.std(axis=-2, ddof=1) * np.sqrt(periods_per_year)
+    peaks = np.maximum.accumulate(np.maximum(cumulative, 0), axis=-2)
+    max_drawdown = np.expm1((cumulative - peaks).min(axis=-2))
+    return np.stack([cagr, sharpe_ratio, max_drawdown])
+
+def bootstrap_chunk(values, log_growth, periods_per_year, resamples, block_length, method, seed):
+    # Statistics (statistics x resamples x columns) of one chunk of resampled histories
+    random = np.random.default_rng(seed)
+    indexes = resample_indexes(random, resamples, len(values), block_length, method)
+    return statistics(values[indexes], log_growth[indexes], periods_per_year)
+
+def bootstrap(returns, periods_per_year, resamples=5000, method='stationary', block_length=None,
+              confidence_level=0.95, seed=0, processes=None, chunk_size=250):
+    # returns is a DataFrame of periodic returns (as fractions) with one column per series, e.g.
+    # analyses.ma_method(...)['returns'] with periods_per_year=12. Returns a DataFrame with the
+    # estimate of each statistic on the original history and the bounds of its confidence
+    # interval (percentiles of the resampled statistics), one row per column and statistic.
+    returns = returns.dropna()
+    values = returns.to_numpy(dtype=float)
+    if len(values) < 2:
+        raise ValueError('At least two periods of returns are needed for the bootstrap.')
+    log_growth = np.log1p(values)
+    block_length = block_length or default_block_length(len(values))
+    seeds = np.random.SeedSequence(seed).spawn(-(-resamples // chunk_size))
+    chunks = [(values, log_growth, periods_per_year, min(chunk_size, resamples - number * chunk_size), block_length, method, chunk_seed)
+              for number, chunk_seed in enumerate(seeds)]
+
+    processes = min(processes or os.cpu_count() or 1, len(chunks))
+    if processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(bootstrap_chunk, *zip(*chunks)))
+    else:
+        results = [bootstrap_chunk(*chunk) for chunk in chunks]
+    resampled = np.concatenate(results, axis=1)
+    profiling.count('bootstrap_resamples', resamples)
+
+    tail = (1 - confidence_level) / 2
+    lower, upper = np.nanquantile(resampled, [tail, 1 - tail], axis=1)
+    estimate = statistics(values, log_growth, periods_per_year)
+    index = pd.MultiIndex.from_product([returns.columns, STATISTICS], names=['series', 'statistic'])
+    return pd.DataFrame({
+        'estimate': estimate.T.ravel(),
+        'lower': lower.T.ravel(),
+        'upper': upper.T.ravel(),
+    }, index=index)
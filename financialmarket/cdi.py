@@ -0,0 +1,128 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import data
+from financialmarket.providers import get_provider
+from financialmarket.streaming import load_checkpoint, save_checkpoint
+
+#
+# CDI accumulation index
+#
+
+# The factor a deposit earning the CDI has accumulated by each business day (the product of
+# 1 + rate of every day so far), kept on disk and extended with the rates published since its last
+# update. The CDI return between two dates is the ratio of their factors, looked up for whole
+# arrays of dates at once, instead of compounding the daily rates again for every period.
+
+# First date of the index when no earlier one is asked for
+FIRST_DATE = '2000-01-01'
+
+# Held while an index is read from disk, extended and saved, as the service updates its index from
+# several worker threads at once
+UPDATE_LOCK = threading.Lock()
+
+def download_cdi(start_date):
+    # Daily CDI rates (in percent) since start_date
+    return data.download_sgs('CDI', 11, start_date)['CDI']
+
+class CDIIndex:
+
+    def __init__(self, path=None, download=download_cdi):
+        # Each provider has its own index, so the synthetic CDI never mixes with the real one
+        self.path = path or os.path.join(get_provider().data_dir, 'cdi-index.npz')
+        self.download = download
+        # The first entry is the base (a factor of 1) on the day before the first rate
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.factors = np.array([])
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            checkpoint = load_checkpoint(self.path)
+            self.dates = checkpoint['dates'].astype('datetime64[D]')
+            self.factors = checkpoint['factors'].astype(float)
+
+    @property
+    def first_date(self):
+        # Date of the first rate
+        return pd.Timestamp(self.dates[1]) if len(self.dates) > 1 else None
+
+    @property
+    def last_date(self):
+        return pd.Timestamp(self.dates[-1]) if len(self.dates) > 1 else None
+
+    def growth(self, start_date):
+        # Dates and daily growth factors (1 + rate) of the rates since start_date
+        rates = self.download(pd.Timestamp(start_date).strftime('%Y-%m-%d')).dropna()
+        return rates.index.to_numpy(dtype='datetime64[D]'), 1 + rates.to_numpy(dtype=float) / 100
+
+    def update(self, start_date=None):
+        # Extends the index back to start_date (when it starts later) and up to the last published
+        # rate, saving it when anything was added. Returns the number of rates added.
+        with UPDATE_LOCK:
+            # Another index on the same file may have extended it since this one was loaded
+            self.load()
+            return self.extend(start_date)
+
+    def extend(self, start_date):
+        added = 0
+        if self.first_date is None or (start_date is not None and pd.Timestamp(start_date) < self.first_date):
+            dates, growth = self.growth(start_date or FIRST_DATE)
+            if self.first_date is not None:
+                # Rates already in the index are rescaled to the new base instead of compounded again
+                earlier = dates < self.dates[1]
+                factors = np.cumprod(growth[earlier])
+                dates = np.concatenate([dates[earlier], self.dates[1:]])
+                factors = np.concatenate([factors, self.factors[1:] * factors[-1:].prod()])
+            else:
+                factors = np.cumprod(growth)
+            if len(dates) == 0:
+                return 0
+            added += len(dates) - (len(self.dates) - 1 if len(self.dates) else 0)
+            self.dates = np.concatenate([[dates[0] - np.timedelta64(1, 'D')], dates])
+            self.factors = np.concatenate([[1.0], factors])
+
+        # The rate of a business day is only published on the next one
+        next_date = self.last_date + pd.Timedelta(days=1)
+        if next_date <= pd.Timestamp.today().normalize() - pd.offsets.BDay(1):
+            dates, growth = self.growth(next_date)
+            newer = dates > self.dates[-1]
+            self.dates = np.concatenate([self.dates, dates[newer]])
+            self.factors = np.concatenate([self.factors, self.factors[-1] * np.cumprod(growth[newer])])
+            added += newer.sum()
+
+        if added:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            save_checkpoint(self.path, {'dates': self.dates, 'factors': self.factors})
+        return int(added)
+
+    def factors_at(self, dates):
+        # Factor at the close of each date (that of the last business day on or before it), missing
+        # before the base of the index
+        positions = np.searchsorted(self.dates, np.asarray(dates, dtype='datetime64[D]'), side='right') - 1
+        return np.where(positions >= 0, self.factors[np.maximum(positions, 0)], np.nan)
+
+    def period_returns(self, start_dates, end_dates):
+        # CDI return from the close of each start date to the close of the matching end date (as
+        # fractions), for arrays of date pairs
+        return self.factors_at(end_dates) / self.factors_at(start_dates) - 1
+
+    def monthly_returns(self, start_date, end_date=None):
+        # Monthly returns since start_date and the return of the first, incomplete, month, as
+        # analyses.monthly_returns gives them for the compounded daily rates
+        start_date = pd.Timestamp(start_date)
+        end_date = self.last_date if end_date is None else min(pd.Timestamp(end_date), self.last_date)
+        # Date of the first rate since start_date (never the base, which has no rate)
+        rate_dates = self.dates[1:]
+        first_date = rate_dates[np.searchsorted(rate_dates, np.datetime64(start_date, 'D'), side='left')]
+        # Months from that of the first rate, so a start date after the last rate of a month (e.g. on
+        # a weekend) does not add an empty month
+        month_ends = pd.date_range(pd.Timestamp(first_date), end_date + pd.offsets.MonthEnd(0), freq='ME')
+
+        # The first month starts with the rate of its first day, as the month opening there
+        first_month_returns = self.factors_at([month_ends[0]])[0] / self.factors_at([first_date])[0] - 1
+        returns = self.period_returns(month_ends[:-1], month_ends[1:])
+        return pd.Series(returns, index=month_ends[1:], name='CDI'), first_month_returns
@@ -0,0 +1,186 @@
+import numpy as np
+import matplotlib.ticker as mplticker
+from financialmarket.downsampling import downsample
+from financialmarket.profiling import timed
+
+#
+# Charts
+#
+
+# Every chart draws into the figure it receives, so the same functions are used to show a chart
+# on screen and to render it to a file (possibly on a reused figure, see rendering.render_many)
+
+def brl_formatter(x, pos):
+    return f'R${x:.2f}'
+
+def plot_line(axes, data, method='minmax', **kwargs):
+    # Long series are downsampled to at most two points per pixel column of the figure before
+    # plotting, so render and hover time don't grow with the length of the history
+    figure = axes.get_figure()
+    points = 2 * int(figure.get_figwidth() * figure.dpi)
+    return axes.plot(downsample(data, points, method), **kwargs)
+
+@timed('render')
+def drawdown_chart(figure, drawdowns, max_drawdowns):
+    axes = figure.subplots()
+
+    for label, drawdown in drawdowns.items():
+        plot_line(axes, drawdown, label=label)
+
+    axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+    axes.set_xlabel('Time')
+    axes.set_ylabel('Drawdown')
+    axes.set_title('Drawdown x Time')
+
+    legend_text = '\n'.join([f'{ticker}: {max_drawdown:.2%}' for ticker, max_drawdown in max_drawdowns.items()]) + '\n'
+    axes.legend(title=f'Max. Drawdowns:\n\n{legend_text}')
+
+@timed('render')
+def portfolio_chart(figure, portfolio_returns, asset_returns, ylabel='Returns'):
+    axes = figure.subplots()
+
+    # Plot portfolio cumulative returns
+    plot_line(axes, portfolio_returns, label='Portfolio', linewidth=2)
+
+    # Plot cumulative returns for each asset
+    for ticker, cum_returns in asset_returns.items():
+        plot_line(axes, cum_returns, label=f'{ticker}', alpha=0.3)
+
+    axes.set_xlabel('Date')
+    axes.set_ylabel(ylabel)
+    axes.set_title('Portfolio and Asset Cumulative Returns Over Time')
+    axes.legend()
+
+    # Format y-axis tick labels as percentages
+    axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+
+@timed('render')
+def performance_chart(figure, cumulative_returns, legend_title, ylabel='Performance'):
+    axes = figure.subplots()
+
+    for column in cumulative_returns.columns:
+        plot_line(axes, cumulative_returns[column], label=column)
+
+    axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+    axes.set_xlabel('Time')
+    axes.set_ylabel(ylabel)
+    axes.set_title('Performance x Time')
+    axes.legend(title=legend_title)
+
+@timed('render')
+def stress_chart(figure, returns, worst):
+    # Return of the portfolio in each scenario and, for the historical windows, its lowest return within the window
+    axes = figure.subplots()
+
+    positions = np.arange(len(returns))
+    axes.bar(positions - 0.2, returns.to_numpy(), width=0.4, label='Scenario Return')
+    axes.bar(positions[:len(worst)] + 0.2, worst.reindex(returns.index[:len(worst)]).to_numpy(), width=0.4, label='Lowest Return in the Window')
+    axes.axhline(0, color='gray', linewidth=0.8)
+    axes.set_xticks(positions, returns.index, rotation=15)
+
+    axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+    axes.set_ylabel('Portfolio Return')
+    axes.set_title('Portfolio Return x Stress Scenario')
+    axes.legend()
+
+def efficient_frontier_chart(figure, frontier_volatility, frontier_return, portfolios, legend_title):
+    # portfolios maps a label to the (volatility, return) point of a portfolio
+    axes = figure.subplots()
+
+    if len(frontier_volatility) > 0:
+        axes.plot(frontier_volatility, frontier_return, label='Efficient Frontier')
+    for label, (volatility, expected_return) in portfolios.items():
+        axes.scatter(volatility, expected_return, marker='o', label=label)
+
+    axes.xaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+    axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
+    axes.set_xlabel('Volatility')
+    axes.set_ylabel('Return')
+    axes.set_title('Anual Expected Return x Volatility')
+    axes.legend(title=legend_title)
+
+# Portfolios of the allocation goals (see analyses.ALLOCATORS), the others are optimal for their goal
+PORTFOLIO_LABELS = {
+    'hrp': 'HRP Portfolio',
+    'erc': 'Risk Parity Portfolio',
+}
+
+@timed('render')
+def markowitz_chart(figure, results, goal):
+    # Efficient frontier with the optimal portfolio (and the highest sharpe ratio one when the goal is not the sharpe ratio)
+    optimal_metrics = results['metrics']
+    label = PORTFOLIO_LABELS.get(goal, 'Optimal Portfolio')
+    if goal == 'sharpe' or results['sharpe_ratio_metrics'] is None:
+        portfolios = {label: (optimal_metrics[1], optimal_metrics[0])}
+    else:
+        portfolios = {
+            'Max. Sharpe Ratio': (results['sharpe_ratio_metrics'][1], results['sharpe_ratio_metrics'][0]),
+            label: (optimal_metrics[1], optimal_metrics[0]),
+        }
+
+    legend_text = '\n'.join([f'{metric}: {optimal_metrics[i]:.2%}' for i, metric in enumerate(['Expected Return','Volatility','Sharpe Ratio'])]) + '\n\n'
+    legend_text = legend_text + '\n'.join([f'{asset}\'s weight: {weight:.2%}' for asset, weight in results['weights'].items()]) + '\n'
+
+    efficient_frontier_chart(figure, results['frontier_volatility'], results['frontier_return'], portfolios, legend_text)
+
+@timed('render')
+def bcb_history_chart(figure, selic, currencies, ipca, igpm, ipca_12m, igpm_12m):
+    axes = figure.subplots(4, sharex='col')
+
+    plot_line(axes[0], selic, label='Selic')
+    axes[0].yaxis.set_major_formatter(mplticker.PercentFormatter())
+    axes[0].set_ylabel('Selic')
+    axes[0].legend(title=f'Current Selic: {selic["Selic"].iloc[-1]}')
+
+    plot_line(axes[1], currencies['USD'], label='USD')
+    plot_line(axes[1], currencies['EUR'], label='EUR')
+    axes[1].yaxis.set_major_formatter(brl_formatter)
+    axes[1].set_ylabel('Currencies')
+    axes[1].legend(title=f'Last USD: R$ {currencies["USD"].iloc[-1]:.2f}\nLast EUR: R$ {currencies["EUR"].iloc[-1]:.2f}')
+
+    axes[2].plot(ipca, label='IPCA')
+    axes[2].plot(igpm, label='IGP-M')
+    axes[2].yaxis.set_major_formatter(mplticker.PercentFormatter())
+    axes[2].set_ylabel('Monthly Inflation')
+    axes[2].legend(title=f'Last IPCA: {ipca["IPCA"].iloc[-1]:.2f}\nLast IGP-M: {igpm["IGP-M"].iloc[-1]:.2f}')
+
+    axes[3].plot(ipca_12m, label='IPCA')
+    axes[3].plot(igpm_12m, label='IGP-M')
+    axes[3].yaxis.set_major_formatter(mplticker.PercentFormatter())
+    axes[3].set_ylabel('12-month Rolling Inflation')
+    axes[3].legend(title=f'Last IPCA: {ipca_12m["IPCA"].iloc[-1]:.2f}\nLast IGP-M: {igpm_12m["IGP-M"].iloc[-1]:.2f}')
+
+@timed('render')
+def bcb_expectations_chart(figure, selic, dollar, monthly_ipca, monthly_igpm, anual_ipca, anual_igpm):
+    axes = figure.subplots(2, 2)
+
+    axes[0][0].plot(selic, label='Selic')
+    axes[0][0].yaxis.set_major_formatter(mplticker.PercentFormatter())
+    axes[0][0].set_ylabel('Selic')
+    axes[0][0].legend()
+
+    axes[0][1].plot(dollar, label='USD')
+    axes[0][1].yaxis.set_major_formatter(brl_formatter)
+    axes[0][1].set_ylabel('Dollar (USD)')
+    axes[0][1].legend()
+
+    axes[1][0].plot(monthly_ipca, label='IPCA')
+    axes[1][0].plot(monthly_igpm, label='IGP-M')
+    axes[1][0].yaxis.set_major_formatter(mplticker.PercentFormatter(decimals=2))
+    axes[1][0].set_ylabel('Monthly Inflation')
+    axes[1][0].legend()
+
+    # Convert the index of anual_ipca and anual_igpm to a list for plotting in bars
+    years_ipca = anual_ipca.index.year.tolist()
+    years_igpm = anual_igpm.index.year.tolist()
+
+    # Define the bar width and an offset for the bars graph
+    bar_width = 0.3
+    bar_offset = bar_width / 2
+
+    # Plot IPCA and IGP-M anual inflation data with offset to avoid bars overlapping
+    axes[1][1].bar(np.array(years_ipca) - bar_offset, anual_ipca['Mediana'], width=bar_width, label='IPCA')
+    axes[1][1].bar(np.array(years_igpm) + bar_offset, anual_igpm['Mediana'], width=bar_width, label='IGP-M')
+    axes[1][1].yaxis.set_major_formatter(mplticker.PercentFormatter(decimals=2))
+    axes[1][1].set_ylabel('Annual Inflation')
+    axes[1][1].legend()
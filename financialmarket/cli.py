@@ -0,0 +1,258 @@
+import argparse
+import builtins
+import json
+import os
+import runpy
+import sys
+import time
+
+from financialmarket import ROOT_DIR
+
+#
+# Command line
+#
+
+# Analyses available from the command line and the program that runs each one
+PROGRAMS = {
+    'drawdown': 'drawdown.py',
+    'var': 'value-at-risk.py',
+    'stress': 'stress-test.py',
+    'markowitz': 'markowitz-optimization.py',
+    'backtest': 'portfolio-backtest.py',
+    'ma': 'ma-method-backtest.py',
+    'lmp': 'lmp-method-backtest.py',
+    'bcb-history': 'bcb-historical-data.py',
+    'bcb-expectations': 'bcb-market-expectations.py',
+}
+
+class ImportTimer:
+    # Records how long each package imported by the program takes to load, including everything
+    # that package imports in turn
+
+    def __init__(self):
+        self.times = {}
+        self.depth = 0
+
+    def __enter__(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+        return self
+
+    def __exit__(self, *exception):
+        builtins.__import__ = self.original_import
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        package = name.partition('.')[0]
+        # Only imports made by the program itself (not nested ones) of packages not loaded yet are timed
+        if self.depth or level or package in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            module = self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.depth -= 1
+        self.times[package] = time.perf_counter() - start
+        return module
+
+    def report(self, file=sys.stderr):
+        print('\nImport time:', file=file)
+        for package, seconds in sorted(self.times.items(), key=lambda item: item[1], reverse=True):
+            print(f'  {package:<24} {seconds * 1000:8.1f} ms', file=file)
+        print(f'  {"total":<24} {sum(self.times.values()) * 1000:8.1f} ms', file=file)
+
+def run_program(analysis, import_time=False):
+    path = os.path.join(ROOT_DIR, PROGRAMS[analysis])
+    if not import_time:
+        runpy.run_path(path, run_name='__main__')
+        return
+
+    timer = ImportTimer()
+    try:
+        with timer:
+            runpy.run_path(path, run_name='__main__')
+    finally:
+        timer.report()
+
+#
+# Non-interactive runs
+#
+
+# Options of each analysis, matching the keys of a job (see financialmarket.jobs)
+OPTIONS = {
+    'drawdown': ['start', 'tickers', 'weights', 'currency', 'store'],
+    'var': ['start', 'tickers', 'weights', 'confidence', 'horizons', 'scaling', 'trades', 'currency', 'store'],
+    'stress': ['start', 'tickers', 'weights', 'portfolios', 'scenarios', 'currency', 'store'],
+    'markowitz': ['start', 'tickers', 'goal', 'target', 'frontier', 'constraints', 'currency', 'store'],
+    'backtest': ['start', 'tickers', 'weights', 'threshold', 'real', 'bootstrap', 'currency', 'store'],
+    'ma': ['start', 'months', 'tickers', 'weighting', 'real', 'bootstrap', 'currency', 'store'],
+    'lmp': ['start', 'real', 'bootstrap'],
+    'bcb-history': ['start'],
+    'bcb-expectations': ['offline'],
+}
+
+def add_options(parser, options):
+    if 'start' in options:
+        parser.add_argument('--start', help='start date (YYYY-MM-DD)')
+    if 'tickers' in options:
+        parser.add_argument('--tickers', help='comma-separated asset ticker symbols, e.g. PETR4.SA,VALE3.SA')
+    if 'weights' in options:
+        parser.add_argument('--weights', help='comma-separated weights (percentages), one for each ticker')
+    if 'confidence' in options:
+        parser.add_argument('--confidence', type=float, help='confidence level (percentage), default 95')
+    if 'horizons' in options:
+        parser.add_argument('--horizons', help='comma-separated horizons in trading days or months, default 1d,10d,1m')
+    if 'scaling' in options:
+        parser.add_argument('--scaling', action='store_true', default=None, help='scale the 1-day VaR by the square root of time instead of using overlapping returns')
+    if 'trades' in options:
+        parser.add_argument('--trades', help='hypothetical trades for the incremental VaR, as weight changes (percentages), e.g. "PETR4.SA:5,VALE3.SA:-5;ITUB4.SA:10"')
+    if 'portfolios' in options:
+        parser.add_argument('--portfolios', metavar='FILE', help='CSV file of many portfolios, one per row (name first) with a column of weights (percentages) per ticker, instead of --tickers and --weights')
+    if 'scenarios' in options:
+        parser.add_argument('--scenarios', metavar='FILE', help='JSON file of historical windows and hypothetical shocks, default data/stress-scenarios.json')
+    if 'goal' in options:
+        parser.add_argument('--goal', choices=['sharpe', 'risk', 'return', 'hrp', 'erc'], help='optimization goal or allocation (hierarchical risk parity, equal risk contributions), default sharpe')
+    if 'target' in options:
+        parser.add_argument('--target', type=float, help='risk or return target (fraction) for the risk and return goals')
+    if 'frontier' in options:
+        parser.add_argument('--frontier', type=int, help='efficient frontier points, default 100 (0 skips the frontier, e.g. for hrp or erc with many assets)')
+    if 'constraints' in options:
+        parser.add_argument('--constraints', metavar='FILE', help='JSON file (or JSON text) of weight bounds, group limits, exposure and turnover limits (see the README)')
+    if 'months' in options:
+        parser.add_argument('--months', type=int, help='moving average window, in months')
+    if 'weighting' in options:
+        parser.add_argument('--weighting', choices=['equal', 'volatility'], help='shares of the assets given with --tickers: equal or inversely proportional to their volatility, default equal')
+    if 'threshold' in options:
+        parser.add_argument('--threshold', type=float, help='let the weights drift and rebalance when one is further than this (percentage points) from its target, instead of keeping them constant')
+    if 'real' in options:
+        parser.add_argument('--real', action='store_true', default=None, help='deflate the returns by the IPCA')
+    if 'bootstrap' in options:
+        parser.add_argument('--bootstrap', type=int, help='number of bootstrap resamples for confidence intervals of the CAGR, sharpe ratio and max. drawdown, e.g. 5000')
+        parser.add_argument('--bootstrap-method', choices=['stationary', 'block'], help='random (stationary) or fixed (block) block lengths, default stationary')
+        parser.add_argument('--seed', type=int, help='seed of the bootstrap resamples, default 0')
+    if 'currency' in options:
+        parser.add_argument('--currency', help='convert the prices of tickers quoted in other currencies to this one, e.g. BRL (see data/ticker-currencies.csv)')
+    if 'store' in options:
+        parser.add_argument('--store', metavar='DIR', help='read the prices from a price store instead of downloading them')
+    if 'offline' in options:
+        parser.add_argument('--offline', action='store_true', default=None, help='use the stored surveys without downloading new ones')
+    parser.add_argument('--format', choices=['json', 'csv'], help='output format, default json')
+    parser.add_argument('--output', help='write the results to this file instead of the standard output')
+    parser.add_argument('--chart', help='save the chart to this file (.png, .svg, ...)')
+
+def write_results(text, output=None, file=sys.stdout):
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.write(text + '\n')
+    else:
+        print(text, file=file)
+
+def add_profile_options(parser):
+    parser.add_argument('--import-time', action='store_true', help='report the time spent importing each library')
+    parser.add_argument('--profile', metavar='FILE', help='save the time spent in each stage (fetch, compute, optimize, render, ...) to a JSON report')
+    parser.add_argument('--cprofile', action='store_true', help='add a cProfile of the run to the report (and save it next to it as .prof)')
+    parser.add_argument('--tracemalloc', action='store_true', help='add the peak memory of each stage to the report')
+
+def run_jobs(job_list, processes=None):
+    # Runs the jobs one after the other (downloads are shared through the data caches), then
+    # renders all the requested charts in worker processes. A failed job is reported and skipped.
+    from financialmarket import jobs, rendering
+
+    chart_jobs = []
+    failed = 0
+    for number, job in enumerate(job_list, start=1):
+        try:
+            results = jobs.run_job(job)
+            write_results(jobs.format_results(results, job.get('format', 'json')), job.get('output'))
+        except Exception as error:
+            failed += 1
+            write_results(json.dumps({'job': number, 'analysis': job.get('analysis'), 'error': str(error)}), file=sys.stderr)
+            continue
+        if job.get('chart') and results['chart'] is not None:
+            chart, data = results['chart']
+            chart_jobs.append((chart, data, job['chart']))
+
+    if len(chart_jobs) == 1:
+        rendering.setup(interactive=False)
+        rendering.render_job(chart_jobs[0])
+    elif chart_jobs:
+        rendering.render_many(chart_jobs, processes)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m financialmarket',
+        description='Run one of the financial market analyses. Without options, the analysis asks for its inputs interactively.',
+    )
+    subparsers = parser.add_subparsers(dest='analysis', required=True, metavar='{' + ','.join(list(PROGRAMS) + ['jobs', 'serve', 'store']) + '}')
+    for analysis in PROGRAMS:
+        subparser = subparsers.add_parser(analysis, help=f'run the {PROGRAMS[analysis]} analysis')
+        add_profile_options(subparser)
+        add_options(subparser, OPTIONS[analysis])
+    jobs_parser = subparsers.add_parser('jobs', help='run the analyses listed in a job file (JSON list or JSON lines)')
+    jobs_parser.add_argument('file', help='job file')
+    jobs_parser.add_argument('--processes', type=int, help='number of processes used to render the charts')
+    add_profile_options(jobs_parser)
+    serve_parser = subparsers.add_parser('serve', help='serve the analyses over HTTP, keeping the downloaded data in memory')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='address to listen on, default 127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000, help='port to listen on, default 8000')
+    serve_parser.add_argument('--ttl', type=float, default=6 * 60 * 60, help='seconds before downloaded data is refreshed')
+    serve_parser.add_argument('--max-entries', type=int, default=256, help='series kept in memory before the least recently used is dropped')
+    store_parser = subparsers.add_parser('store', help='download the prices of many tickers into a memory-mapped price store')
+    store_parser.add_argument('path', help='price store directory')
+    store_parser.add_argument('--start', required=True, help='start date (YYYY-MM-DD)')
+    store_parser.add_argument('--tickers', help='comma-separated asset ticker symbols')
+    store_parser.add_argument('--tickers-file', help='file with one ticker symbol per line')
+    store_parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64', help='price precision, float32 halves the size')
+    store_parser.add_argument('--batch-size', type=int, default=200, help='tickers downloaded at a time')
+    args = parser.parse_args(argv)
+
+    if args.analysis == 'store':
+        from financialmarket.jobs import parse_list, parse_start_date
+        from financialmarket.pricestore import PriceStore
+
+        tickers = parse_list(args.tickers)
+        if args.tickers_file:
+            with open(args.tickers_file) as tickers_file:
+                tickers += parse_list(tickers_file.read().split())
+        store = PriceStore.download(args.path, tickers, parse_start_date(args.start), args.dtype, args.batch_size)
+        print(f'Price store saved to {args.path}: {len(store.dates)} dates x {len(store.tickers)} tickers ({args.dtype})')
+        return
+
+    if args.analysis == 'serve':
+        import asyncio
+        from financialmarket.service import AnalysisService
+
+        service = AnalysisService(max_entries=args.max_entries, ttl=args.ttl)
+        asyncio.run(service.serve(args.host, args.port))
+        return
+
+    if args.profile:
+        from financialmarket import profiling
+        profiling.start(args.profile, args.cprofile, args.tracemalloc)
+
+    ignored = ['analysis', 'import_time', 'profile', 'cprofile', 'tracemalloc']
+    options = {key: value for key, value in vars(args).items() if key not in ignored and value is not None}
+    timer = ImportTimer() if args.import_time else None
+
+    if args.analysis in PROGRAMS and not options:
+        run_program(args.analysis, args.import_time)
+        return
+
+    if args.analysis == 'jobs':
+        from financialmarket.jobs import load_jobs
+        job_list = load_jobs(args.file)
+    else:
+        job_list = [{'analysis': args.analysis, **options}]
+
+    if not timer:
+        failed = run_jobs(job_list, options.get('processes'))
+    else:
+        try:
+            with timer:
+                failed = run_jobs(job_list, options.get('processes'))
+        finally:
+            timer.report()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+#
+# Compounding
+#
+
+# Rates are given per period in percent by default (scale=100, e.g. monthly IPCA from SGS) or
+# as decimals (scale=1). Inputs can be a Series, a DataFrame (one series per column) or an array
+# with time along the first axis, and results are returned in the same type and scale.
+
+def _like(rates, values):
+    if isinstance(rates, pd.DataFrame):
+        return pd.DataFrame(values, index=rates.index, columns=rates.columns)
+    if isinstance(rates, pd.Series):
+        return pd.Series(values, index=rates.index, name=rates.name)
+    return values
+
+def compounded(rates, scale=100):
+    # Compounded rate from the first period up to each period
+    log_growth = np.log1p(np.asarray(rates, dtype=float) / scale)
+    return _like(rates, np.expm1(np.cumsum(log_growth, axis=0)) * scale)
+
+def rolling_compounded(rates, window, scale=100):
+    # Compounded rate over the last `window` periods, e.g. 12-month inflation from monthly rates.
+    # Log growth is summed once and each window is the difference of two cumulative sums, so the
+    # cost does not depend on the window size and no python function is called per window.
+    return rolling_compounded_windows(rates, [window], scale)[0]
+
+def rolling_compounded_windows(rates, windows, scale=100):
+    # rolling_compounded for several window sizes, sharing the cumulative sums
+    for window in windows:
+        if not isinstance(window, (int, np.integer)) or window < 1:
+            raise ValueError('window must be a positive integer')
+    log_growth = np.log1p(np.asarray(rates, dtype=float) / scale)
+
+    # Missing rates are excluded from the sums and counted, so windows containing them are left missing
+    missing = np.isnan(log_growth)
+    padding = np.zeros((1,) + log_growth.shape[1:])
+    cumulative_growth = np.concatenate([padding, np.cumsum(np.where(missing, 0, log_growth), axis=0)])
+    cumulative_missing = np.concatenate([padding, np.cumsum(missing, axis=0)])
+
+    results = []
+    for window in windows:
+        window_growth = cumulative_growth[window:] - cumulative_growth[:-window]
+        window_missing = cumulative_missing[window:] - cumulative_missing[:-window]
+
+        # The first window - 1 periods don't have a full window
+        result = np.full(log_growth.shape, np.nan)
+        result[window - 1:] = np.where(window_missing > 0, np.nan, np.expm1(window_growth) * scale)
+        results.append(_like(rates, result))
+    return results
@@ -0,0 +1,59 @@
+import os
+import pandas as pd
+
+from financialmarket import DATA_DIR
+
+#
+# COPOM meeting calendar
+#
+
+# Decision dates of the COPOM meetings, identified as in the Focus survey ('R1/2024').
+# New years can be added by editing the file or with add_meetings once the BCB publishes them.
+CALENDAR_PATH = os.path.join(DATA_DIR, 'copom-meetings.csv')
+
+def load_calendar(path=CALENDAR_PATH):
+    calendar = pd.read_csv(path, parse_dates=['Data'])
+    return calendar.sort_values('Data', ignore_index=True)
+
+def add_meetings(meetings, path=CALENDAR_PATH):
+    # meetings maps meeting codes to decision dates, e.g. {'R1/2027': '2027-01-27'}
+    calendar = load_calendar(path)
+    new_meetings = pd.DataFrame({'Reuniao': list(meetings.keys()), 'Data': pd.to_datetime(list(meetings.values()))})
+    calendar = pd.concat([calendar[~calendar['Reuniao'].isin(new_meetings['Reuniao'])], new_meetings])
+    calendar = calendar.sort_values('Data', ignore_index=True)
+    calendar.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return calendar
+
+def meeting_dates(meetings, calendar=None):
+    if calendar is None:
+        calendar = load_calendar()
+
+    # Look the meetings up in the calendar (a hash join, no row-wise python)
+    dates = meetings.map(calendar.set_index('Reuniao')['Data'])
+
+    # Meetings not in the calendar yet are approximated: they happen every 45 days and the first one is on the 31st of january
+    missing = dates.isna()
+    if missing.any():
+        number_year = meetings[missing].str.extract(r'R(\d+)/(\d{4})')
+        approximation = (pd.to_datetime(number_year[1] + '-01-31')
+                         + pd.to_timedelta((number_year[0].astype(int) - 1) * 45, unit='D'))
+        dates = dates.where(~missing, approximation)
+
+    return pd.to_datetime(dates)
+
+def selic_path(data, calendar=None):
+    # Turns Focus Selic expectations (columns 'Data', 'Reuniao', 'Mediana', any number of survey dates)
+    # into a step function: each expected rate holds from its meeting until the next one
+    path = data.copy()
+    path['Data'] = pd.to_datetime(path['Data'])
+    path['DataReferencia'] = meeting_dates(path['Reuniao'], calendar)
+    path = path.sort_values(['Data', 'DataReferencia'], ignore_index=True)
+
+    # The rate decided in a meeting lasts until the next surveyed meeting (45 days for the last one)
+    step_end = path.groupby('Data')['DataReferencia'].shift(-1)
+    step_end = step_end.fillna(path['DataReferencia'] + pd.Timedelta(days=45))
+
+    # Each meeting becomes two consecutive rows: the start and the end of its step
+    steps = path.loc[path.index.repeat(2)].reset_index(drop=True)
+    steps.loc[1::2, 'DataReferencia'] = step_end.to_numpy()
+    return steps
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import DATA_DIR, data, profiling
+
+#
+# Currencies
+#
+
+# Prices are converted to a base currency (BRL by default) by multiplying the whole (dates x
+# tickers) price matrix by a matrix of exchange rates with the same shape, built from one column
+# per currency: the rates (BRL per unit, BCB PTAX) are downloaded once per currency and aligned to
+# the price dates, and each ticker's column is taken from its currency's one (a single fancy-indexed
+# copy of the matrix).
+#
+# The currency of a ticker comes from the tickers file (indexes and exceptions, which can be edited
+# or extended with add_currencies) or else from its exchange suffix; tickers without a suffix are
+# quoted in US dollars.
+BASE_CURRENCY = 'BRL'
+TICKERS_PATH = os.path.join(DATA_DIR, 'ticker-currencies.csv')
+
+# Yahoo Finance exchange suffixes
+SUFFIXES = {
+    'SA': 'BRL', 'L': 'GBP', 'DE': 'EUR', 'F': 'EUR', 'PA': 'EUR', 'AS': 'EUR', 'MI': 'EUR', 'MC': 'EUR',
+    'BR': 'EUR', 'LS': 'EUR', 'SW': 'CHF', 'TO': 'CAD', 'V': 'CAD', 'T': 'JPY', 'HK': 'HKD', 'AX': 'AUD',
+    'MX': 'MXN', 'BA': 'ARS', 'SN': 'CLP', 'ST': 'SEK', 'OL': 'NOK', 'CO': 'DKK',
+}
+
+# Calendar days the rates are downloaded from before the first price, so it has a rate published before it
+FX_LOOKBACK_DAYS = 10
+
+def load_tickers(path=TICKERS_PATH):
+    return pd.read_csv(path, index_col='Ticker')['Currency']
+
+def add_currencies(currencies, path=TICKERS_PATH):
+    # currencies maps tickers to their currencies, e.g. {'^STOXX': 'EUR'}
+    tickers = load_tickers(path)
+    tickers = pd.concat([tickers[~tickers.index.isin(currencies.keys())], pd.Series(currencies, name='Currency')])
+    tickers.rename_axis('Ticker').to_csv(path)
+    return tickers
+
+def ticker_currencies(tickers, currencies=None):
+    # Currency of each ticker: given in currencies (a dict by ticker), listed in the tickers file,
+    # from the quote of a currency pair or crypto asset ('USDBRL=X', 'BTC-USD') or from the suffix
+    listed = load_tickers().to_dict()
+    listed.update(currencies or {})
+    tagged = []
+    for ticker in tickers:
+        if ticker in listed:
+            tagged.append(listed[ticker])
+        elif ticker.endswith('=X'):
+            tagged.append(ticker[3:6] if len(ticker) == 8 else ticker[:3])
+        elif '-' in ticker and ticker.rsplit('-', 1)[1].isalpha() and len(ticker.rsplit('-', 1)[1]) == 3:
+            tagged.append(ticker.rsplit('-', 1)[1])
+        else:
+            suffix = ticker.rsplit('.', 1)[1] if '.' in ticker else None
+            tagged.append(SUFFIXES.get(suffix, 'USD'))
+    return [currency.upper() for currency in tagged]
+
+def fx_rates(symbols, dates, source=data):
+    # (dates x symbols) array of the BRL price of each currency at the close of each date, the last
+    # rate published on or before it (missing before the first one); BRL itself is 1
+    dates = pd.DatetimeIndex(dates)
+    foreign = [symbol for symbol in symbols if symbol != BASE_CURRENCY]
+    rates = np.ones((len(dates), len(symbols)))
+    if foreign and len(dates):
+        start_date = (dates[0] - pd.Timedelta(days=FX_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+        downloaded = source.download_currencies(foreign, start_date, dates[-1].strftime('%Y-%m-%d')).sort_index()
+        positions = np.searchsorted(pd.DatetimeIndex(downloaded.index).to_numpy(dtype='datetime64[ns]'), dates.to_numpy(dtype='datetime64[ns]'), side='right') - 1
+        # Forward filled per currency, so a gap in one currency does not hide the others' rates
+        values = downloaded[foreign].ffill().to_numpy(dtype=float)
+        aligned = np.where(positions[:, None] >= 0, values[np.maximum(positions, 0)], np.nan)
+        rates[:, [symbols.index(symbol) for symbol in foreign]] = aligned
+    return rates
+
+def to_base(prices, base=BASE_CURRENCY, currencies=None, source=data):
+    # Prices of every ticker in the base currency. currencies overrides the currency of some
+    # tickers (a dict by ticker); prices already in the base currency are returned unchanged.
+    base = base.upper()
+    tagged = ticker_currencies(list(prices.columns), currencies)
+    if all(currency == base for currency in tagged):
+        return prices
+    with profiling.stage('align'):
+        symbols, columns = np.unique(tagged + [base], return_inverse=True)
+        rates = fx_rates(list(symbols), prices.index, source)
+        # Rates in the base currency: the BRL price of each currency over the BRL price of the base
+        rates = rates / rates[:, columns[-1:]]
+        return prices * rates[:, columns[:-1]]
+
+def prompt_conversion(prices):
+    # For the interactive programs: asks whether to convert the prices of the assets quoted in other
+    # currencies (e.g. SPY, in USD) to BRL, so all the assets are in the same currency
+    tagged = ticker_currencies(list(prices.columns))
+    foreign_assets = [f'{ticker} ({currency})' for ticker, currency in zip(prices.columns, tagged) if currency != BASE_CURRENCY]
+    if not foreign_assets:
+        return prices
+    convert = input(f'Not quoted in {BASE_CURRENCY}: {", ".join(foreign_assets)}. Do you want to convert their prices to {BASE_CURRENCY}? (yes/no): ')
+    while convert not in ['yes', 'no']:
+        convert = input('Invalid input. Please enter "yes" or "no": ')
+    return to_base(prices) if convert == 'yes' else prices
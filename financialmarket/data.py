@@ -0,0 +1,68 @@
+from datetime import date
+
+import pandas as pd
+
+from financialmarket import profiling
+from financialmarket.providers import get_provider
+
+#
+# Data
+#
+
+# Downloads are cached for the life of the process, so running many analyses (e.g. a job file)
+# only downloads each ticker or series once
+prices_cache = {}
+sgs_cache = {}
+currencies_cache = {}
+
+def download_prices(tickers, start_date):
+    # Adjusted closes of the tickers (one column each, in the given order), leaving out tickers without data
+    missing = [ticker for ticker in tickers if (ticker, start_date) not in prices_cache]
+    if missing:
+        with profiling.stage('fetch'):
+            downloaded = get_provider().prices(missing, start_date)
+        for ticker in missing:
+            prices_cache[(ticker, start_date)] = downloaded[ticker].dropna() if ticker in downloaded else pd.Series(dtype=float)
+
+    with profiling.stage('align'):
+        prices = {ticker: prices_cache[(ticker, start_date)] for ticker in tickers}
+        return pd.DataFrame({ticker: series for ticker, series in prices.items() if len(series) > 0})
+
+def download_sgs(name, code, start_date):
+    # A BCB SGS series (e.g. download_sgs('CDI', 11, '2020-01-01')) as a single column DataFrame
+    key = (name, code, str(start_date))
+    if key not in sgs_cache:
+        with profiling.stage('fetch'):
+            sgs_cache[key] = get_provider().sgs({name: code}, start_date)
+    return sgs_cache[key]
+
+def download_currencies(symbols, start_date, end_date):
+    # Exchange rates (BRL per unit) of the currencies, one column each, cached per currency
+    keys = {symbol: (symbol, str(start_date), str(end_date)) for symbol in symbols}
+    missing = [symbol for symbol, key in keys.items() if key not in currencies_cache]
+    if missing:
+        with profiling.stage('fetch'):
+            downloaded = get_provider().currencies(missing, start_date, end_date)
+        for symbol in missing:
+            currencies_cache[keys[symbol]] = downloaded[symbol]
+    return pd.DataFrame({symbol: currencies_cache[key] for symbol, key in keys.items()})
+
+def download_concurrently(downloads, max_workers=4):
+    # Runs independent downloads at the same time, so they take as long as the slowest one.
+    # downloads maps names to (function, *arguments); the results are returned under the same names.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(downloads), 1))) as executor:
+        futures = {name: executor.submit(function, *arguments) for name, (function, *arguments) in downloads.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def download_bcb_history(start_date, download_sgs=download_sgs, download_currencies=download_currencies):
+    # Selic, USD and EUR, IPCA and IGP-M since start_date (see analyses.bcb_history). The inflation
+    # series are downloaded once, from 11 months earlier, for their 12-month compounding as well.
+    window_start_date = (pd.Timestamp(start_date) - pd.DateOffset(months=11)).strftime('%Y-%m-%d')
+    return download_concurrently({
+        'selic': (download_sgs, 'Selic', 432, start_date),
+        'currencies': (download_currencies, ['USD', 'EUR'], start_date, date.today()),
+        'ipca': (download_sgs, 'IPCA', 433, window_start_date),
+        'igpm': (download_sgs, 'IGP-M', 189, window_start_date),
+    })
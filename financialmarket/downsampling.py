@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+#
+# Downsampling
+#
+
+# Lines with more points than the screen has pixels are reduced before plotting. Min-max keeps the
+# lowest and highest point of each bucket, so troughs and peaks (e.g. the maximum drawdown) are
+# always drawn exactly. LTTB (largest triangle three buckets) keeps the point of each bucket that
+# best preserves the shape of the line.
+
+def minmax_indices(values, points):
+    count = len(values)
+    buckets = max(points // 2, 1)
+    size = -(-count // buckets)
+
+    # Lay the values out as a buckets x size grid, padding the last bucket with missing values
+    grid = np.full(buckets * size, np.nan)
+    grid[:count] = values
+    grid = grid.reshape(buckets, size)
+    missing = np.isnan(grid)
+
+    offsets = np.arange(buckets) * size
+    lowest = np.argmin(np.where(missing, np.inf, grid), axis=1) + offsets
+    highest = np.argmax(np.where(missing, -np.inf, grid), axis=1) + offsets
+
+    indices = np.unique(np.concatenate([lowest, highest, [0, count - 1]]))
+    return indices[indices < count]
+
+def lttb_indices(x, y, points):
+    count = len(y)
+    edges = np.linspace(1, count - 1, points - 1).astype(int)
+    indices = np.empty(points, dtype=int)
+    indices[0], indices[-1] = 0, count - 1
+
+    selected = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (the last point for the last bucket)
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        next_x, next_y = x[end:next_end].mean(), np.nanmean(y[end:next_end])
+
+        # Keep the point forming the largest triangle with the previously selected point and the next average
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.nanargmax(areas)) if not np.isnan(areas).all() else start
+        indices[bucket + 1] = selected
+    return np.unique(indices)
+
+def series_indices(series, points, method):
+    values = series.to_numpy(dtype=float)
+    if method == 'minmax':
+        return minmax_indices(values, points)
+    if method == 'lttb':
+        # Dates are compared by their nanosecond timestamps
+        x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else np.asarray(series.index, dtype=float)
+        return lttb_indices(x.astype(float), values, points)
+    raise ValueError(f'Unknown downsampling method: {method}')
+
+def downsample(data, points, method='minmax'):
+    # Reduces a Series (or every column of a DataFrame, keeping the union of the selected dates) to about `points` points
+    if len(data) <= points or points < 3:
+        return data
+    if isinstance(data, pd.DataFrame):
+        indices = np.unique(np.concatenate([series_indices(data[column], points, method) for column in data.columns]))
+    else:
+        indices = series_indices(data, points, method)
+    return data.iloc[indices]
@@ -0,0 +1,124 @@
+import json
+import os
+import pandas as pd
+
+from financialmarket import profiling
+from financialmarket.providers import get_provider
+
+#
+# Focus survey store
+#
+
+# Focus endpoints and the column identifying the period each expectation refers to
+ENDPOINTS = {
+    'selic': ('ExpectativasMercadoSelic', 'Reuniao'),
+    'monthly': ('ExpectativaMercadoMensais', 'DataReferencia'),
+    'anual': ('ExpectativasMercadoAnuais', 'DataReferencia'),
+}
+
+def download_expectations(kind, indicator, since=None):
+    return get_provider().expectations(kind, indicator, since)
+
+class ExpectationsStore:
+    # Append-only local copy of the Focus survey history, stored as parquet files partitioned by
+    # endpoint, indicator and survey year. A manifest per indicator records each file's survey date
+    # range and the reference periods it contains, so queries only open the files they need.
+
+    def __init__(self, path=None, download=download_expectations):
+        # Each provider has its own store, so synthetic surveys never mix with the real ones
+        self.path = path or os.path.join(get_provider().data_dir, 'expectations')
+        self.download = download
+
+    def _directory(self, kind, indicator):
+        return os.path.join(self.path, kind, indicator)
+
+    def _manifest(self, kind, indicator):
+        manifest_path = os.path.join(self._directory(kind, indicator), 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return []
+        with open(manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def _write_manifest(self, kind, indicator, parts):
+        manifest_path = os.path.join(self._directory(kind, indicator), 'manifest.json')
+        # Write to a temporary file first so an interrupted update never leaves a broken manifest
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(parts, manifest_file, indent=1)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def _read(self, kind, indicator, parts, filters=None):
+        directory = self._directory(kind, indicator)
+        columns = ['Data', ENDPOINTS[kind][1], 'Mediana']
+        with profiling.stage('load'):
+            frames = [pd.read_parquet(os.path.join(directory, part['file']), filters=filters) for part in parts]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True).sort_values(['Data', ENDPOINTS[kind][1]], ignore_index=True)
+
+    def last_survey_date(self, kind, indicator):
+        parts = self._manifest(kind, indicator)
+        if not parts:
+            return None
+        return pd.Timestamp(max(part['last'] for part in parts))
+
+    def update(self, kind, indicator):
+        reference = ENDPOINTS[kind][1]
+        last_date = self.last_survey_date(kind, indicator)
+
+        with profiling.stage('fetch'):
+            data = pd.DataFrame(self.download(kind, indicator, since=last_date))
+        if data.empty:
+            return 0
+        data = data[['Data', reference, 'Mediana']]
+        data['Data'] = pd.to_datetime(data['Data'])
+        data[reference] = data[reference].astype(str)
+        if last_date is not None:
+            data = data[data['Data'] > last_date]
+        if data.empty:
+            return 0
+
+        # Write one new file per survey year, sorted by reference period so the parquet
+        # row group statistics can skip everything but the requested period when reading
+        parts = self._manifest(kind, indicator)
+        for year, year_data in data.groupby(data['Data'].dt.year):
+            year_data = year_data.sort_values([reference, 'Data'])
+            first, last = year_data['Data'].min(), year_data['Data'].max()
+            file = os.path.join(f'year={year}', f'part-{first:%Y%m%d}-{last:%Y%m%d}.parquet')
+            os.makedirs(os.path.join(self._directory(kind, indicator), f'year={year}'), exist_ok=True)
+            year_data.to_parquet(os.path.join(self._directory(kind, indicator), file), index=False)
+            parts.append({
+                'file': file,
+                'first': f'{first:%Y-%m-%d}',
+                'last': f'{last:%Y-%m-%d}',
+                'references': sorted(year_data[reference].unique().tolist()),
+            })
+        self._write_manifest(kind, indicator, parts)
+        return len(data)
+
+    def history(self, kind, indicator, start=None, end=None):
+        parts = self._manifest(kind, indicator)
+        # Skip files whose survey dates fall entirely outside the requested range
+        if start is not None:
+            parts = [part for part in parts if pd.Timestamp(part['last']) >= pd.Timestamp(start)]
+        if end is not None:
+            parts = [part for part in parts if pd.Timestamp(part['first']) <= pd.Timestamp(end)]
+        data = self._read(kind, indicator, parts)
+        if start is not None:
+            data = data[data['Data'] >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data['Data'] <= pd.Timestamp(end)]
+        return data.reset_index(drop=True)
+
+    def latest(self, kind, indicator):
+        last_date = self.last_survey_date(kind, indicator)
+        if last_date is None:
+            return self._read(kind, indicator, [])
+        return self.history(kind, indicator, start=last_date)
+
+    def evolution(self, kind, indicator, reference_period):
+        # How the median expectation for a single reference period (e.g. '2027' or '01/2027') evolved over time
+        reference = ENDPOINTS[kind][1]
+        reference_period = str(reference_period)
+        parts = [part for part in self._manifest(kind, indicator) if reference_period in part['references']]
+        data = self._read(kind, indicator, parts, filters=[(reference, '==', reference_period)])
+        return data.set_index('Data')['Mediana'].rename(f'{indicator} {reference_period}')
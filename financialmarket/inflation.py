@@ -0,0 +1,63 @@
+from datetime import date
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from financialmarket import profiling
+
+#
+# IPCA
+#
+
+def daily_price_index(monthly_rates, end=None):
+    # Spreads each month's inflation (percent, indexed by the first day of the month) evenly over its
+    # calendar days and compounds it into a daily price level, 1.0 on the day before the first month.
+    # Months after the last release (up to `end`) repeat the last known rate.
+    months = monthly_rates.index.to_period('M')
+    last_month = pd.Period(end, 'M') if end is not None else months[-1]
+    rates = pd.Series(monthly_rates.to_numpy(dtype=float), index=months)
+    rates = rates.reindex(pd.period_range(months[0], max(last_month, months[-1]), freq='M')).ffill()
+
+    days = pd.date_range(rates.index[0].start_time, rates.index[-1].end_time.normalize(), freq='D')
+    day_months = days.to_period('M')
+    daily_log_growth = np.log1p(rates.reindex(day_months).to_numpy() / 100) / day_months.days_in_month
+    return pd.Series(np.exp(np.cumsum(daily_log_growth)), index=days, name='IPCA')
+
+def ipca_price_index(start, end=None):
+    # The end date (today by default) and the provider are resolved before the cached call, so a
+    # long-running process builds a new index for each new day instead of keeping the first one
+    from financialmarket.providers import get_provider
+
+    return provider_price_index(start, end or date.today().strftime('%Y-%m-%d'), get_provider())
+
+@lru_cache(maxsize=32)
+def provider_price_index(start, end, provider):
+    # Cached per (start, end, provider), so deflating many return series only downloads and builds the index once
+    with profiling.stage('fetch'):
+        ipca = provider.sgs({'IPCA': 433}, start, end)['IPCA']
+    return daily_price_index(ipca, end)
+
+def period_inflation(dates, price_index=None):
+    # IPCA over each period ending at `dates`, the first period having the same length as the following ones
+    dates = pd.DatetimeIndex(dates).normalize()
+    frequency = pd.infer_freq(dates) if len(dates) > 2 else None
+    if frequency is not None:
+        first_start = dates[0] - pd.tseries.frequencies.to_offset(frequency)
+    elif len(dates) > 1:
+        first_start = dates[0] - (dates[1] - dates[0])
+    else:
+        first_start = dates[0] - pd.Timedelta(days=1)
+
+    if price_index is None:
+        price_index = ipca_price_index((first_start - pd.DateOffset(months=1)).strftime('%Y-%m-01'))
+
+    period_starts = dates[:-1].insert(0, first_start)
+    levels = price_index.reindex(dates, method='ffill').to_numpy()
+    start_levels = price_index.reindex(period_starts, method='ffill').to_numpy()
+    return levels / start_levels - 1
+
+def deflate(returns, price_index=None):
+    # Real returns from nominal periodic returns (Series or DataFrame of many series sharing the same
+    # dates): (1 + nominal) / (1 + inflation) - 1, as a single broadcast over all the columns
+    inflation_factor = 1 + period_inflation(returns.index, price_index)
+    return (1 + returns.astype(float)).div(inflation_factor, axis=0) - 1
@@ -0,0 +1,346 @@
+import json
+from datetime import datetime, date
+import pandas as pd
+
+from financialmarket import analyses, bootstrap, charts, currencies, data, optimization, risk, stress
+from financialmarket.cdi import CDIIndex
+
+#
+# Jobs
+#
+
+# A job is a dict with the analysis to run and its options, using the same names as the command
+# line arguments, e.g. {"analysis": "drawdown", "start": "2020-01-01", "tickers": "PETR4.SA,VALE3.SA"}.
+# Running a job returns a machine-readable summary, a table (DataFrame) and the chart to draw.
+
+def parse_start_date(value):
+    if value is None:
+        raise ValueError('A start date (YYYY-MM-DD) is required.')
+    try:
+        parsed_date = datetime.strptime(str(value), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid date {value!r}. Please use YYYY-MM-DD format.')
+    if parsed_date.date() >= date.today():
+        raise ValueError('The start date should be before today\'s date.')
+    return parsed_date.strftime('%Y-%m-%d')
+
+def parse_list(value):
+    # Lists can be given as a list or as a comma-separated string
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+def load_prices(job, source, minimum_tickers=1):
+    tickers = parse_list(job.get('tickers'))
+    if len(tickers) < minimum_tickers:
+        raise ValueError(f'Please specify at least {minimum_tickers} asset ticker symbol(s).')
+    prices = source.download_prices(tickers, parse_start_date(job.get('start')))
+    missing = [ticker for ticker in tickers if ticker not in prices.columns]
+    if missing:
+        raise ValueError(f'No data found for ticker(s): {", ".join(missing)}.')
+    # Tickers quoted in other currencies are converted to the one given (e.g. BRL)
+    if job.get('currency'):
+        prices = currencies.to_base(prices, job['currency'], source=source)
+    return prices
+
+def parse_weights(job, tickers, required=False):
+    weights = parse_list(job.get('weights'))
+    if not weights:
+        if required:
+            raise ValueError('Weights (as percentages) are required for this analysis.')
+        return None
+    if len(weights) != len(tickers):
+        raise ValueError('Please specify one weight for each asset ticker symbol.')
+    weights = dict(zip(tickers, map(float, weights)))
+    if any(weight < 0 or weight > 100 for weight in weights.values()):
+        raise ValueError('Invalid weight. Please enter values between 0 and 100.')
+    if abs(sum(weights.values()) - 100) > 1e-9:
+        raise ValueError(f'Total weight is {sum(weights.values())}, but it should be 100.')
+    return weights
+
+def parse_trades(value):
+    # Hypothetical trades as weight changes (percentages) by ticker, e.g. "PETR4.SA:5,VALE3.SA:-5",
+    # several of them separated by semicolons or given as a list
+    if value is None:
+        return []
+    trades = value.split(';') if isinstance(value, str) else value
+    parsed = []
+    for trade in trades:
+        if isinstance(trade, dict):
+            parsed.append({ticker: float(change) for ticker, change in trade.items()})
+            continue
+        try:
+            parsed.append({ticker.strip(): float(change) for ticker, change in (item.split(':') for item in parse_list(trade))})
+        except ValueError:
+            raise ValueError(f'Invalid trade {trade!r}. Please use TICKER:PERCENTAGE pairs, e.g. PETR4.SA:5,VALE3.SA:-5.')
+    return [trade for trade in parsed if trade]
+
+def parse_flag(value):
+    # Flags can be booleans or strings such as "true" (e.g. from a query string)
+    if isinstance(value, str):
+        return value.strip().lower() in ['1', 'true', 'yes']
+    return bool(value)
+
+def bootstrap_intervals(job, returns, periods_per_year):
+    # Confidence intervals of the CAGR, sharpe ratio and maximum drawdown of each column of returns,
+    # when a number of bootstrap resamples is given
+    resamples = int(job.get('bootstrap', 0))
+    if resamples <= 0:
+        return None
+    method = job.get('bootstrap_method', 'stationary')
+    if method not in bootstrap.METHODS:
+        raise ValueError('Invalid bootstrap method. Please use "stationary" or "block".')
+    intervals = bootstrap.bootstrap(returns, periods_per_year, resamples, method, seed=int(job.get('seed', 0)))
+    return {series: intervals.loc[series].to_dict(orient='index') for series in returns.columns}
+
+def last_values(frame):
+    return {column: frame[column].dropna().iloc[-1] for column in frame.columns}
+
+def worst_episodes(episodes, count=3):
+    # The deepest drawdown episodes of each series (dates missing while not recovered are null)
+    worst = episodes.sort_values('drawdown').groupby('series', sort=False).head(count)
+    worst = worst.astype(object).where(worst.notna(), None)
+    return {series: rows.drop(columns='series').to_dict(orient='records') for series, rows in worst.groupby('series', sort=False)}
+
+#
+# Analyses
+#
+
+def run_drawdown(job, source):
+    prices = load_prices(job, source)
+    results = analyses.drawdown(prices, parse_weights(job, list(prices.columns)), episodes=True)
+    summary = {'max_drawdowns': results['max_drawdowns'], 'worst_episodes': worst_episodes(results['episodes'])}
+    chart = {'drawdowns': results['drawdowns'], 'max_drawdowns': results['max_drawdowns']}
+    return summary, results['drawdowns'], (charts.drawdown_chart, chart)
+
+def run_var(job, source):
+    prices = load_prices(job, source)
+    confidence_level = float(job.get('confidence', 95)) / 100.0
+    if confidence_level <= 0 or confidence_level >= 1:
+        raise ValueError('Invalid confidence level. Please enter a value between 1 and 99.')
+    horizons = parse_list(job.get('horizons')) or risk.HORIZONS
+    for horizon in horizons:
+        risk.horizon_days(horizon)
+    scaling = parse_flag(job.get('scaling', False))
+    weights = parse_weights(job, list(prices.columns))
+    trades = parse_trades(job.get('trades'))
+    if trades and weights is None:
+        raise ValueError('Weights (as percentages) are required for the incremental VaR of trades.')
+    results = analyses.value_at_risk(prices, confidence_level, weights, horizons, scaling)
+    summary = {'confidence_level': confidence_level, 'scaling': scaling, 'var': results['var']}
+    if weights is not None:
+        # Contributions of each asset over the first horizon
+        decomposition = analyses.var_decomposition(prices, confidence_level, weights, horizons[0], trades)
+        summary['decomposition'] = {
+            method: {'totals': decomposition['totals'][method], 'assets': decomposition['decomposition'][method].to_dict(orient='index')}
+            for method in ['parametric', 'historical']
+        }
+        if decomposition['incremental'] is not None:
+            summary['incremental'] = [dict(row, trade=trade) for trade, row in zip(trades, decomposition['incremental'].to_dict(orient='records'))]
+    return summary, results['horizons'], None
+
+def run_stress(job, source):
+    # One portfolio (tickers and weights) or many, from a CSV file with one row per portfolio (its
+    # name first) and one column of weights (percentages) per ticker
+    if job.get('portfolios'):
+        portfolios = pd.read_csv(job['portfolios'], index_col=0).apply(pd.to_numeric, errors='raise')
+        prices = load_prices(dict(job, tickers=list(portfolios.columns)), source)
+    else:
+        prices = load_prices(job, source)
+        portfolios = pd.DataFrame([parse_weights(job, list(prices.columns), required=True)], index=['Portfolio'])
+    scenarios = stress.load_scenarios(job['scenarios']) if job.get('scenarios') else stress.load_scenarios()
+    results = analyses.stress_test(prices, portfolios, scenarios)
+
+    returns, worst = results['returns'], results['worst']
+    # Scenarios without returns (e.g. windows before the start date) are null, NaN is not valid JSON
+    summary = {}
+    for scenario, scenario_returns in returns.iterrows():
+        scenario_returns = scenario_returns.dropna()
+        summary[scenario] = {
+            'mean_return': scenario_returns.mean() if len(scenario_returns) else None,
+            'lowest_return': scenario_returns.min() if len(scenario_returns) else None,
+            'lowest_return_portfolio': scenario_returns.idxmin() if len(scenario_returns) else None,
+        }
+    # One row per portfolio: its return in each scenario and its lowest return within each window
+    table = pd.concat([returns.T, worst.T.add_suffix(' (lowest)')], axis=1)
+    chart = None
+    if len(portfolios) == 1:
+        chart = (charts.stress_chart, {'returns': returns.iloc[:, 0], 'worst': worst.iloc[:, 0]})
+    return summary, table, chart
+
+def run_markowitz(job, source):
+    prices = load_prices(job, source, minimum_tickers=2).dropna()
+    if prices.empty:
+        raise ValueError('No overlapping data found for the selected assets.')
+
+    goal = job.get('goal', 'sharpe')
+    if goal not in ['sharpe', 'risk', 'return', 'hrp', 'erc']:
+        raise ValueError('Invalid goal. Please use "sharpe", "risk", "return", "hrp" or "erc".')
+    frontier_points = int(job.get('frontier', 100))
+    if frontier_points < 0:
+        raise ValueError('Please specify a number of frontier points that is zero or positive.')
+    constraints = job.get('constraints')
+    if constraints is not None:
+        if goal in analyses.ALLOCATORS:
+            raise ValueError(f'The {goal} allocation does not take constraints.')
+        constraints = optimization.load_constraints(constraints)
+    limits = None
+    if goal in ['risk', 'return'] or frontier_points:
+        log_mean, covariance = analyses.annualized_log_returns(prices)
+        limits = analyses.markowitz_limits(log_mean, covariance, constraints)
+    target = job.get('target')
+    if goal == 'risk' and not (target is not None and limits['minimum_risk'] <= float(target) <= limits['maximum_risk']):
+        raise ValueError(f'Risk target must be between {limits["minimum_risk"]:.2f} and {limits["maximum_risk"]:.2f}.')
+    if goal == 'return' and not (target is not None and limits['minimum_risk_return'] <= float(target) <= limits['maximum_return']):
+        raise ValueError(f'Return target must be between {limits["minimum_risk_return"]:.2f} and {limits["maximum_return"]:.2f}.')
+
+    results = analyses.markowitz(prices, goal, None if target is None else float(target), limits, frontier_points, constraints)
+    summary = {
+        'weights': results['weights'],
+        'risk_contributions': results['risk_contributions'],
+        'expected_return': results['metrics'][0],
+        'volatility': results['metrics'][1],
+        'sharpe_ratio': results['metrics'][2],
+        'limits': limits,
+    }
+    frontier = pd.DataFrame({'volatility': results['frontier_volatility'], 'return': results['frontier_return']})
+    return summary, frontier, (charts.markowitz_chart, {'results': results, 'goal': goal})
+
+def run_backtest(job, source):
+    prices = load_prices(job, source)
+    weights = parse_weights(job, list(prices.columns), required=True)
+    threshold = job.get('threshold')
+    if threshold is not None:
+        threshold = float(threshold) / 100
+        if threshold < 0:
+            raise ValueError('Invalid rebalancing threshold. Please enter a non-negative percentage.')
+    results = analyses.portfolio_backtest(prices, weights, real=parse_flag(job.get('real', False)), threshold=threshold)
+    table = results['asset_cumulative_returns'].assign(Portfolio=results['cumulative_portfolio_returns'])
+    chart = {
+        'portfolio_returns': results['cumulative_portfolio_returns'],
+        'asset_returns': results['asset_cumulative_returns'],
+        'ylabel': 'Real Returns' if parse_flag(job.get('real', False)) else 'Returns',
+    }
+    summary = {'cumulative_returns': last_values(table)}
+    if results['rebalances'] is not None:
+        summary['rebalances'] = len(results['rebalances'])
+    intervals = bootstrap_intervals(job, results['portfolio_returns'].to_frame('Portfolio'), 252)
+    if intervals is not None:
+        summary['bootstrap'] = intervals
+    return summary, table, (charts.portfolio_chart, chart)
+
+def run_method(job, source, method):
+    start_date = parse_start_date(job.get('start'))
+    cdi = CDIIndex(download=lambda start: source.download_sgs('CDI', 11, start)['CDI'])
+    cdi.update(start_date)
+    real = parse_flag(job.get('real', False))
+    legend_title = None
+    if method == 'ma':
+        months = int(job.get('months', 0))
+        if months <= 0:
+            raise ValueError('Please specify a positive integer number of months for the moving average.')
+        if job.get('tickers'):
+            # The moving average method over a universe of assets instead of the IBOV
+            prices = load_prices(job, source)
+            results = analyses.trend_following(prices, cdi, months, job.get('weighting', 'equal'), real=real)
+            legend_title = f'Invested in {len(results["current_choice"])} of {len(prices.columns)} assets'
+        else:
+            ibov = source.download_prices(['^BVSP'], start_date)['^BVSP']
+            results = analyses.ma_method(ibov, cdi, months, real=real)
+            label = 'MA'
+    else:
+        ibov = source.download_prices(['^BVSP'], start_date)['^BVSP']
+        results = analyses.lmp_method(ibov, cdi, real=real)
+        label = 'LMP'
+
+    summary = {'current_choice': results['current_choice'], 'cumulative_returns': last_values(results['cumulative_returns'])}
+    if 'weights' in results:
+        current_weights = results['weights'].iloc[-1]
+        summary['current_weights'] = current_weights[current_weights > 0].to_dict()
+    intervals = bootstrap_intervals(job, results['returns'], 12)
+    if intervals is not None:
+        summary['bootstrap'] = intervals
+    chart = {
+        'cumulative_returns': results['cumulative_returns'],
+        'legend_title': legend_title or f'{label} current investment: {results["current_choice"]}',
+        'ylabel': 'Real Performance' if real else 'Performance',
+    }
+    return summary, results['cumulative_returns'], (charts.performance_chart, chart)
+
+def run_bcb_history(job, source):
+    start_date = parse_start_date(job.get('start'))
+    downloads = data.download_bcb_history(start_date, source.download_sgs, source.download_currencies)
+    results = analyses.bcb_history(**downloads, start_date=start_date)
+    table = pd.concat([
+        results['selic'], results['currencies'], results['ipca'], results['igpm'],
+        results['ipca_12m'].add_suffix(' 12m'), results['igpm_12m'].add_suffix(' 12m'),
+    ], axis=1)
+    return {'last': last_values(table)}, table, (charts.bcb_history_chart, results)
+
+# Format of the reference periods of each kind of expectation in the summary
+REFERENCE_FORMATS = {'selic': '%Y-%m-%d', 'monthly': '%Y-%m', 'anual': '%Y'}
+
+def run_bcb_expectations(job, source):
+    from financialmarket.expectations import ExpectationsStore
+
+    results = analyses.bcb_expectations(ExpectationsStore(), update=not parse_flag(job.get('offline', False)))
+    # The Selic step function repeats each meeting date (end of a step and start of the next), keep the new rate
+    medians = {name: expectation['Mediana'][~expectation.index.duplicated(keep='last')] for name, expectation in results.items()}
+    table = pd.concat(medians, axis=1)
+    # Reference periods as meeting dates, months or years, so no two of them share a key
+    kinds = {name: kind for name, kind, indicator in analyses.EXPECTATIONS}
+    summary = {name: {f'{reference:{REFERENCE_FORMATS[kinds[name]]}}': value for reference, value in median.items()} for name, median in medians.items()}
+    return summary, table, (charts.bcb_expectations_chart, results)
+
+RUNNERS = {
+    'drawdown': run_drawdown,
+    'var': run_var,
+    'stress': run_stress,
+    'markowitz': run_markowitz,
+    'backtest': run_backtest,
+    'ma': lambda job, source: run_method(job, source, 'ma'),
+    'lmp': lambda job, source: run_method(job, source, 'lmp'),
+    'bcb-history': run_bcb_history,
+    'bcb-expectations': run_bcb_expectations,
+}
+
+def run_job(job, source=data):
+    # source provides download_prices, download_sgs and download_currencies (the financialmarket.data module by default)
+    if job.get('analysis') not in RUNNERS:
+        raise ValueError(f'Unknown analysis {job.get("analysis")!r}. Please use one of: {", ".join(RUNNERS)}.')
+    # Prices can be read from a memory-mapped price store instead of downloaded
+    if job.get('store'):
+        from financialmarket.pricestore import PriceStore, StoreSource
+        source = StoreSource(PriceStore(job['store']))
+    summary, table, chart = RUNNERS[job['analysis']](job, source)
+    return {'analysis': job['analysis'], 'summary': summary, 'table': table, 'chart': chart}
+
+def to_json(value):
+    # json.dumps default for the numpy and pandas values found in the summaries
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def format_results(results, output_format='json'):
+    if output_format == 'csv':
+        if results['table'] is None:
+            raise ValueError('This analysis has no table, please use the json format.')
+        return results['table'].to_csv()
+    output = {'analysis': results['analysis'], 'summary': results['summary']}
+    if results['table'] is not None:
+        output['table'] = json.loads(results['table'].to_json(orient='split', date_format='iso'))
+    return json.dumps(output, default=to_json)
+
+def load_jobs(path):
+    # A JSON list of jobs, or one JSON job per line
+    with open(path) as jobs_file:
+        content = jobs_file.read().strip()
+    if content.startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+
+#
+# Kernels
+#
+
+# Path dependent calculations (each step depends on the ones before it) on raw arrays. Each kernel
+# is a plain loop compiled with numba when it is installed, and a NumPy implementation giving the
+# same results when it is not (or when FINANCIALMARKET_NUMBA=0). numba is only imported, and the
+# loops compiled, on the first call of a kernel (compilations are cached on disk by numba).
+NUMBA_VARIABLE = 'FINANCIALMARKET_NUMBA'
+
+def numba_enabled():
+    if os.environ.get(NUMBA_VARIABLE, '1').strip().lower() in ['0', 'false', 'no']:
+        return False
+    try:
+        import numba
+    except ImportError:
+        return False
+    return True
+
+def kernel(fallback):
+    # Runs the decorated loop compiled by numba, or fallback without numba. Both are kept as the
+    # loop and fallback attributes, e.g. to compare them.
+    def decorator(loop):
+        compiled = {}
+
+        def run(*args):
+            if 'function' not in compiled:
+                if numba_enabled():
+                    import numba
+
+                    compiled['function'] = numba.njit(cache=True)(loop)
+                else:
+                    compiled['function'] = fallback
+            return compiled['function'](*args)
+
+        run.__name__ = loop.__name__
+        run.loop = loop
+        run.fallback = fallback
+        return run
+    return decorator
+
+#
+# Drawdown episodes
+#
+
+# An episode starts when a price falls below its running maximum (the peak) and ends when it gets
+# back to it (the recovery, -1 while it has not). Its trough is the first lowest price in between.
+
+def numpy_drawdown_episodes(values):
+    positions = np.arange(len(values))
+    running_max = np.maximum.accumulate(values)
+    underwater = values < running_max
+    peaks = np.maximum.accumulate(np.where(underwater, 0, positions))
+
+    # Runs of underwater prices, the first of each being the start of an episode
+    first = underwater & ~np.concatenate([[False], underwater[:-1]])
+    starts = np.flatnonzero(first)
+    ends = np.flatnonzero(underwater & ~np.concatenate([underwater[1:], [False]]))
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, np.zeros(0)
+
+    # First lowest price of each run
+    episodes = np.cumsum(first) - 1
+    lowest = np.minimum.reduceat(values, starts)
+    at_lowest = np.flatnonzero(underwater & (values == lowest[np.maximum(episodes, 0)]))
+    troughs = at_lowest[np.unique(episodes[at_lowest], return_index=True)[1]]
+
+    recoveries = np.where(ends + 1 < len(values), ends + 1, -1)
+    episode_peaks = peaks[starts]
+    return episode_peaks, troughs, recoveries, values[troughs] / values[episode_peaks] - 1
+
+@kernel(numpy_drawdown_episodes)
+def drawdown_episodes(values):
+    # Positions of the peak, trough and recovery of each episode of a 1-D array of prices (without
+    # missing values), and its drawdown (trough over peak - 1)
+    count = 0
+    peaks = np.zeros(len(values) // 2 + 1, dtype=np.int64)
+    troughs = np.zeros(len(values) // 2 + 1, dtype=np.int64)
+    recoveries = np.zeros(len(values) // 2 + 1, dtype=np.int64)
+    peak = 0
+    underwater = False
+    for position in range(1, len(values)):
+        if values[position] >= values[peak]:
+            if underwater:
+                recoveries[count - 1] = position
+                underwater = False
+            peak = position
+        elif not underwater:
+            peaks[count] = peak
+            troughs[count] = position
+            recoveries[count] = -1
+            count += 1
+            underwater = True
+        elif values[position] < values[troughs[count - 1]]:
+            troughs[count - 1] = position
+
+    peaks = peaks[:count]
+    troughs = troughs[:count]
+    return peaks, troughs, recoveries[:count], values[troughs] / values[peaks] - 1
+
+#
+# Threshold rebalancing
+#
+
+# A portfolio whose weights drift with the returns of its assets and are set back to the target
+# weights at the close of each day one of them is further than threshold from its target.
+
+# Days of the first window of the NumPy version, doubled for every window without a rebalance
+REBALANCE_WINDOW = 16
+
+def numpy_threshold_rebalance(returns, target, threshold):
+    # The drifted weights of a window of days at once, from the weights at its start; the next
+    # window starts after the first rebalance in it, with a short window again
+    portfolio_returns = np.zeros(len(returns))
+    rebalanced = np.zeros(len(returns), dtype=np.bool_)
+    weights = target.copy()
+    start = 0
+    window = REBALANCE_WINDOW
+    while start < len(returns):
+        holdings = weights * np.cumprod(1 + returns[start:start + window], axis=0)
+        values = holdings.sum(axis=1)
+        drifted = np.abs(holdings / values[:, None] - target).max(axis=1) > threshold
+        days = int(np.argmax(drifted)) + 1 if drifted.any() else len(values)
+        portfolio_returns[start:start + days] = values[:days] / np.concatenate([[1.0], values[:days - 1]]) - 1
+        if drifted.any():
+            rebalanced[start + days - 1] = True
+            weights = target.copy()
+            window = REBALANCE_WINDOW
+        else:
+            weights = holdings[-1] / values[-1]
+            window *= 2
+        start += days
+    return portfolio_returns, rebalanced
+
+@kernel(numpy_threshold_rebalance)
+def threshold_rebalance(returns, target, threshold):
+    # Daily returns of the portfolio from the (days x assets) daily returns of its assets and its
+    # target weights (fractions adding up to 1), and whether it was rebalanced at each day's close
+    days, assets = returns.shape
+    portfolio_returns = np.zeros(days)
+    rebalanced = np.zeros(days, dtype=np.bool_)
+    weights = target.copy()
+    for day in range(days):
+        value = 0.0
+        for asset in range(assets):
+            weights[asset] *= 1 + returns[day, asset]
+            value += weights[asset]
+        portfolio_returns[day] = value - 1
+        drift = 0.0
+        for asset in range(assets):
+            weights[asset] /= value
+            drift = max(drift, abs(weights[asset] - target[asset]))
+        if drift > threshold:
+            weights[:] = target
+            rebalanced[day] = True
+    return portfolio_returns, rebalanced
@@ -0,0 +1,320 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import profiling
+
+#
+# Constraint specifications
+#
+
+# Portfolio constraints given as a dict (or a JSON file), weights being fractions of the portfolio:
+#
+#   {
+#     "bounds": {"default": [0, 0.2], "PETR4.SA": [0.05, 0.1]},       per-asset minimum and maximum weights
+#     "groups": {"banks": {"assets": ["ITUB4.SA", "BBDC4.SA"], "max": 0.3}},   group minimum and/or maximum
+#     "budget": 1,                                                    sum of the weights (net exposure)
+#     "long": 1.3, "short": 0.3,                                      gross long and short exposure limits
+#     "current": {"PETR4.SA": 0.5, "VALE3.SA": 0.5}, "turnover": 0.2  sum of |weight - current weight| limit
+#   }
+#
+# Everything is optional: without bounds the weights are long only (between 0 and 1) and sum to 1,
+# as in the unconstrained optimization. All the constraints are linear, so with the covariance
+# matrix they make a quadratic program solved by solve_qp below.
+CONSTRAINT_KEYS = ['bounds', 'groups', 'budget', 'long', 'short', 'current', 'turnover']
+
+def load_constraints(value):
+    # A constraint specification from a dict, a JSON string or the path of a JSON file
+    if isinstance(value, str):
+        if value.lstrip().startswith('{'):
+            value = json.loads(value)
+        else:
+            with open(value) as constraints_file:
+                value = json.load(constraints_file)
+    unknown = [key for key in value if key not in CONSTRAINT_KEYS]
+    if unknown:
+        raise ValueError(f'Unknown constraint(s): {", ".join(unknown)}. Please use {", ".join(CONSTRAINT_KEYS)}.')
+    if ('current' in value) != ('turnover' in value):
+        raise ValueError('A turnover limit needs the current weights, and vice-versa.')
+    return value
+
+def linear_constraints(spec, tickers):
+    # Sparse rows (A) and limits (lower <= A x <= upper) of the constraints over the variables
+    # x = [weights, shorts, trades]: the shorts (at least the short part of each weight) are only
+    # added for the exposure limits and the trades (at least |weight - current|) for the turnover
+    # limit. Returns A, lower, upper and the number of variables.
+    from scipy import sparse
+
+    count = len(tickers)
+    positions = pd.Series(np.arange(count), index=tickers)
+    exposure = 'long' in spec or 'short' in spec
+    turnover = 'turnover' in spec
+    offsets = {'weights': 0}
+    variables = count
+    if exposure:
+        offsets['shorts'] = variables
+        variables += count
+    if turnover:
+        offsets['trades'] = variables
+        variables += count
+
+    identity = sparse.identity(count, format='csc')
+    blocks, lower, upper = [], [], []
+
+    def add(rows, row_lower, row_upper):
+        blocks.append(sparse.csc_matrix(rows))
+        lower.append(np.broadcast_to(np.asarray(row_lower, dtype=float), (rows.shape[0],)))
+        upper.append(np.broadcast_to(np.asarray(row_upper, dtype=float), (rows.shape[0],)))
+
+    def rows_of(variable, matrix):
+        # The matrix (rows x count) placed on the columns of the variable
+        rows = sparse.lil_matrix((matrix.shape[0], variables))
+        rows[:, offsets[variable]:offsets[variable] + count] = matrix
+        return rows.tocsc()
+
+    # Per-asset bounds
+    bounds = spec.get('bounds', {})
+    default = bounds.get('default', [0, 1])
+    minimum = np.full(count, float(default[0]))
+    maximum = np.full(count, float(default[1]))
+    for ticker, (asset_minimum, asset_maximum) in bounds.items():
+        if ticker == 'default':
+            continue
+        if ticker not in positions.index:
+            raise ValueError(f'Bounds given for {ticker}, which is not in the portfolio.')
+        minimum[positions[ticker]], maximum[positions[ticker]] = asset_minimum, asset_maximum
+    if np.any(minimum > maximum):
+        raise ValueError('Every minimum weight should be lower than the maximum weight.')
+    add(rows_of('weights', identity), minimum, maximum)
+
+    # Net exposure
+    budget = float(spec.get('budget', 1))
+    add(rows_of('weights', np.ones((1, count))), budget, budget)
+
+    # Group limits
+    for name, group in spec.get('groups', {}).items():
+        missing = [ticker for ticker in group['assets'] if ticker not in positions.index]
+        if missing:
+            raise ValueError(f'Group {name} has asset(s) not in the portfolio: {", ".join(missing)}.')
+        members = np.zeros((1, count))
+        members[0, positions[group['assets']].to_numpy()] = 1
+        add(rows_of('weights', members), group.get('min', -np.inf), group.get('max', np.inf))
+
+    # Gross exposure: shorts >= max(0, -weights), so the long parts (weights + shorts) are positive
+    # too, the gross short exposure is at least the sum of the shorts and the long one at least the
+    # sum of the weights and the shorts
+    if exposure:
+        add(rows_of('shorts', identity), 0, np.inf)
+        add(rows_of('weights', identity) + rows_of('shorts', identity), 0, np.inf)
+        add(rows_of('weights', np.ones((1, count))) + rows_of('shorts', np.ones((1, count))), -np.inf, spec.get('long', np.inf))
+        add(rows_of('shorts', np.ones((1, count))), -np.inf, spec.get('short', np.inf))
+
+    # Turnover: trades >= |weights - current| and their sum up to the limit
+    if turnover:
+        current = pd.Series(spec['current'], dtype=float).reindex(tickers, fill_value=0.0).to_numpy()
+        add(rows_of('weights', identity) - rows_of('trades', identity), -np.inf, current)
+        add(rows_of('weights', identity) + rows_of('trades', identity), current, np.inf)
+        add(rows_of('trades', np.ones((1, count))), -np.inf, spec['turnover'])
+
+    return sparse.vstack(blocks, format='csc'), np.concatenate(lower), np.concatenate(upper), variables
+
+#
+# Quadratic programs
+#
+
+# minimize x'Px / 2 + q'x subject to lower <= A x <= upper, by a primal-dual interior point method
+# with Mehrotra's predictor-corrector steps: equal limits make equality rows (E x = b), the finite
+# limits of the other rows inequalities (G x <= h, the lower ones negated) with slacks s and
+# multipliers z. Each iteration factorizes the reduced system P + G' (z / s) G once and solves it
+# twice, and the equality rows are handled through their Schur complement. It takes a few dozen
+# iterations however degenerate the problem is (e.g. at the top of the efficient frontier).
+#
+# The constraint rows are kept sparse, but the reduced system is factorized as a dense matrix (a
+# Cholesky factorization, O(n^3) per iteration for n variables): the covariance block of P is dense,
+# and the rows summing many weights (group, exposure and turnover limits) make G' (z / s) G dense
+# too. A sparse LU (scipy.sparse.linalg.splu) of the reduced system, or of the full KKT system
+# keeping G sparse, fills the same blocks and was 2 to 15 times slower for 100 to 600 assets under
+# group, long/short and turnover limits.
+
+def solve_qp(P, q, A, lower, upper, tolerance=1e-8, max_iterations=100, regularization=1e-10):
+    from scipy import linalg, sparse
+
+    A = sparse.csr_matrix(A)
+    q = np.asarray(q, dtype=float)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    equal = (upper - lower) < 1e-12
+    finite_upper, finite_lower = np.isfinite(upper) & ~equal, np.isfinite(lower) & ~equal
+    E, b = A[equal], upper[equal]
+    G = sparse.vstack([A[finite_upper], -A[finite_lower]], format='csr')
+    h = np.concatenate([upper[finite_upper], -lower[finite_lower]])
+    P = sparse.csr_matrix(P)
+    P_dense = P.toarray() + regularization * np.eye(len(q))
+
+    x, y = np.zeros(len(q)), np.zeros(E.shape[0])
+    s, z = np.maximum(h, 1.0), np.ones(len(h))
+    scale = 1 + max(np.abs(q).max(initial=0), np.abs(b).max(initial=0), np.abs(h).max(initial=0))
+    failure = 'The optimization did not converge, the constraints may not be feasible.'
+    with profiling.stage('optimize'), np.errstate(over='raise', divide='raise', invalid='raise'):
+        try:
+            for iteration in range(1, max_iterations + 1):
+                dual_residual = P @ x + q + E.T @ y + G.T @ z
+                equality_residual = E @ x - b
+                inequality_residual = G @ x + s - h
+                gap = s @ z / len(s)
+                if max(np.abs(dual_residual).max(initial=0), np.abs(equality_residual).max(initial=0), np.abs(inequality_residual).max(initial=0)) <= tolerance * scale and gap <= tolerance:
+                    break
+
+                # Factorization of the reduced system and of the Schur complement of the equality rows
+                ratio = z / s
+                factor = linalg.cho_factor(P_dense + (G.T @ sparse.diags(ratio) @ G).toarray(), check_finite=False)
+                if E.shape[0]:
+                    solved_E = linalg.cho_solve(factor, E.T.toarray(), check_finite=False)
+                    schur = linalg.cho_factor(E @ solved_E + regularization * np.eye(E.shape[0]), check_finite=False)
+
+                def newton_step(complementarity):
+                    # Steps of x, y, z and s that make all the residuals zero and s z equal to complementarity
+                    complementarity_residual = s * z - complementarity
+                    right_side = -dual_residual - G.T @ ((z * inequality_residual - complementarity_residual) / s)
+                    dx = linalg.cho_solve(factor, right_side, check_finite=False)
+                    dy = np.zeros(0)
+                    if E.shape[0]:
+                        dy = linalg.cho_solve(schur, E @ dx + equality_residual, check_finite=False)
+                        dx -= solved_E @ dy
+                    dz = ratio * (G @ dx) + (z * inequality_residual - complementarity_residual) / s
+                    ds = -inequality_residual - G @ dx
+                    return dx, dy, dz, ds
+
+                def step_length(ds, dz):
+                    # Longest step (up to 1) that keeps s and z positive
+                    ratios = np.concatenate([-ds / s, -dz / z])
+                    return min(1.0, 1 / max(ratios.max(initial=0), 1e-12))
+
+                # The affine step sets the centering, the corrected step follows the central path
+                dx, dy, dz, ds = newton_step(np.zeros(len(s)))
+                affine_length = step_length(ds, dz)
+                affine_gap = (s + affine_length * ds) @ (z + affine_length * dz) / len(s)
+                centering = (affine_gap / gap) ** 3
+                dx, dy, dz, ds = newton_step(centering * gap - ds * dz)
+                length = 0.99 * step_length(ds, dz)
+                x, y, z, s = x + length * dx, y + length * dy, z + length * dz, s + length * ds
+            else:
+                raise ValueError(failure)
+        except (FloatingPointError, linalg.LinAlgError):
+            # Iterates growing without bound (or a reduced system no longer positive definite) when
+            # the constraints are not feasible
+            raise ValueError(failure)
+    profiling.count('qp_iterations', iteration)
+    return x
+
+def solve_lp(q, A, lower, upper):
+    # minimize q'x subject to lower <= A x <= upper, with HiGHS
+    from scipy import optimize, sparse
+
+    equal = (upper - lower) < 1e-12
+    finite_upper, finite_lower = np.isfinite(upper) & ~equal, np.isfinite(lower) & ~equal
+    with profiling.stage('optimize'):
+        result = optimize.linprog(q, A_ub=sparse.vstack([A[finite_upper], -A[finite_lower]]), b_ub=np.concatenate([upper[finite_upper], -lower[finite_lower]]),
+                                  A_eq=A[equal], b_eq=upper[equal], bounds=(None, None), method='highs')
+    if result.status != 0:
+        raise ValueError(f'The optimization failed: {result.message}')
+    return result.x
+
+#
+# Constrained portfolios
+#
+
+# The Markowitz goals under a constraint specification, each one or a few quadratic programs. The
+# highest sharpe ratio is convex after the change of variables y = weights / k (with k > 0 and
+# mean'y = 1), which turns every constraint row lower <= a'x <= upper into k lower <= a'y <= k upper.
+
+def objective(covariance, variables):
+    from scipy import sparse
+
+    count = len(covariance)
+    P = sparse.lil_matrix((variables, variables))
+    P[:count, :count] = 2 * np.asarray(covariance, dtype=float)
+    return P.tocsc()
+
+def mean_row(log_mean, variables):
+    row = np.zeros((1, variables))
+    row[0, :len(log_mean)] = np.asarray(log_mean, dtype=float)
+    return row
+
+def minimum_variance(log_mean, covariance, spec, minimum_return=None):
+    # Lowest volatility weights, with an expected return of at least minimum_return
+    from scipy import sparse
+
+    A, lower, upper, variables = linear_constraints(spec, log_mean.index)
+    if minimum_return is not None:
+        A = sparse.vstack([A, mean_row(log_mean, variables)], format='csc')
+        lower, upper = np.append(lower, minimum_return), np.append(upper, np.inf)
+    return solve_qp(objective(covariance, variables), np.zeros(variables), A, lower, upper)[:len(log_mean)]
+
+def maximum_return(log_mean, covariance, spec):
+    # A linear program
+    A, lower, upper, variables = linear_constraints(spec, log_mean.index)
+    return solve_lp(-mean_row(log_mean, variables)[0], A, lower, upper)[:len(log_mean)]
+
+def maximum_sharpe(log_mean, covariance, spec):
+    from scipy import sparse
+
+    A, lower, upper, variables = linear_constraints(spec, log_mean.index)
+    # Columns [y, k]: a'y - k upper <= 0 and a'y - k lower >= 0 for the finite limits (a single
+    # a'y - k upper = 0 for equalities), mean'y = 1 and k >= 0
+    equal = (upper - lower) < 1e-12
+    finite_upper, finite_lower = np.isfinite(upper) & ~equal, np.isfinite(lower) & ~equal
+    rows = sparse.vstack([
+        sparse.hstack([A[equal], -upper[equal][:, None]]),
+        sparse.hstack([A[finite_upper], -upper[finite_upper][:, None]]),
+        sparse.hstack([A[finite_lower], -lower[finite_lower][:, None]]),
+        sparse.hstack([sparse.csc_matrix(mean_row(log_mean, variables)), sparse.csc_matrix((1, 1))]),
+        sparse.csc_matrix(([1.0], ([0], [variables])), shape=(1, variables + 1)),
+    ], format='csc')
+    row_lower = np.concatenate([np.zeros(equal.sum()), np.full(finite_upper.sum(), -np.inf), np.zeros(finite_lower.sum()), [1, 0]])
+    row_upper = np.concatenate([np.zeros(equal.sum()), np.zeros(finite_upper.sum()), np.full(finite_lower.sum(), np.inf), [1, np.inf]])
+    if np.asarray(log_mean).max() <= 0:
+        raise ValueError('No asset has a positive expected return, so there is no highest sharpe ratio portfolio.')
+    solution = solve_qp(objective(covariance, variables + 1), np.zeros(variables + 1), rows, row_lower, row_upper)
+    return solution[:len(log_mean)] / solution[-1]
+
+def maximum_return_for_risk(log_mean, covariance, spec, target, limits, tolerance=1e-6):
+    # Highest return for a volatility up to target: the return of the minimum variance portfolio
+    # grows with its volatility along the frontier, so the return target is found by bisection
+    low, high = limits['minimum_risk_return'], limits['maximum_return']
+    weights = minimum_variance(log_mean, covariance, spec)
+    while high - low > tolerance:
+        middle = (low + high) / 2
+        candidate = minimum_variance(log_mean, covariance, spec, middle)
+        if np.sqrt(candidate @ np.asarray(covariance) @ candidate) <= target:
+            low, weights = middle, candidate
+        else:
+            high = middle
+    return weights
+
+def constrained_limits(log_mean, covariance, spec):
+    # As analyses.markowitz_limits, except the maximum risk, which is that of the highest return
+    # portfolio (the top of the frontier): the highest volatility is not a convex problem
+    covariance = np.asarray(covariance, dtype=float)
+
+    def metrics(weights):
+        return log_mean.to_numpy() @ weights, np.sqrt(weights @ covariance @ weights)
+
+    maximum_return_metrics = metrics(maximum_return(log_mean, covariance, spec))
+    minimum_risk_metrics = metrics(minimum_variance(log_mean, covariance, spec))
+    return {
+        'maximum_return': maximum_return_metrics[0],
+        'minimum_risk': minimum_risk_metrics[1],
+        'minimum_risk_return': minimum_risk_metrics[0],
+        'maximum_risk': maximum_return_metrics[1],
+    }
+
+def constrained_frontier(log_mean, covariance, spec, minimum_return, maximum_return, points=100):
+    # As analyses.efficient_frontier, under the constraints
+    covariance = np.asarray(covariance, dtype=float)
+    target_returns = np.linspace(minimum_return, maximum_return, points)
+    frontier_volatility = []
+    for target_return in target_returns:
+        weights = minimum_variance(log_mean, covariance, spec, target_return)
+        frontier_volatility.append(np.sqrt(weights @ covariance @ weights))
+    return frontier_volatility, list(target_returns)
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import data
+
+#
+# Memory-mapped price store
+#
+
+# Adjusted closes of a large universe kept on disk as a single dates x tickers array (prices.npy),
+# in column-major order so each ticker's history is contiguous, with its date (dates.npy) and
+# ticker (tickers.json) indexes. The array is memory-mapped: views of a range of dates and a range
+# of tickers are DataFrames over the file itself (nothing is read until used), and any other
+# selection only reads the columns it needs.
+
+class PriceStore:
+
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.prices = np.load(os.path.join(path, 'prices.npy'), mmap_mode=mode)
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(path, 'dates.npy')), name='Date')
+        with open(os.path.join(path, 'tickers.json')) as tickers_file:
+            self.tickers = pd.Index(json.load(tickers_file))
+        self.positions = pd.Series(np.arange(len(self.tickers)), index=self.tickers)
+
+    @classmethod
+    def create(cls, path, dates, tickers, dtype='float64'):
+        # An empty (all NaN) store for the given dates and tickers
+        os.makedirs(path, exist_ok=True)
+        prices = np.lib.format.open_memmap(os.path.join(path, 'prices.npy'), mode='w+', dtype=dtype,
+                                           shape=(len(dates), len(tickers)), fortran_order=True)
+        prices[:] = np.nan
+        prices.flush()
+        np.save(os.path.join(path, 'dates.npy'), pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[D]'))
+        with open(os.path.join(path, 'tickers.json'), 'w') as tickers_file:
+            json.dump(list(tickers), tickers_file)
+        return cls(path, mode='r+')
+
+    @classmethod
+    def from_frame(cls, path, prices, dtype='float64'):
+        store = cls.create(path, prices.index, prices.columns, dtype)
+        store.prices[:] = prices.to_numpy(dtype=dtype)
+        store.prices.flush()
+        return cls(path)
+
+    @classmethod
+    def download(cls, path, tickers, start_date, dtype='float64', batch_size=200):
+        # Downloads the tickers in batches into a store over every business day since start_date,
+        # then keeps only the dates with at least one price (market holidays have none)
+        staging = cls.create(path + '.staging', pd.bdate_range(start_date, pd.Timestamp.today().normalize()), tickers, dtype)
+        for first in range(0, len(tickers), batch_size):
+            batch = tickers[first:first + batch_size]
+            prices = data.download_prices(batch, start_date).reindex(staging.dates)
+            for ticker in prices.columns:
+                staging.prices[:, staging.positions[ticker]] = prices[ticker].to_numpy(dtype=dtype)
+            # Only one batch is held in memory at a time
+            data.prices_cache.clear()
+        staging.prices.flush()
+
+        traded = np.zeros(len(staging.dates), dtype=bool)
+        for first in range(0, len(tickers), batch_size):
+            traded |= ~np.isnan(staging.prices[:, first:first + batch_size]).all(axis=1)
+        store = cls.create(path, staging.dates[traded], tickers, dtype)
+        for first in range(0, len(tickers), batch_size):
+            store.prices[:, first:first + batch_size] = staging.prices[traded, first:first + batch_size]
+        store.prices.flush()
+        del staging
+        for file in ['prices.npy', 'dates.npy', 'tickers.json']:
+            os.remove(os.path.join(path + '.staging', file))
+        os.rmdir(path + '.staging')
+        return cls(path)
+
+    def date_slice(self, start=None, end=None):
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(first, last)
+
+    def ticker_selection(self, tickers=None):
+        # A slice when the tickers are stored next to each other (so the view is zero-copy), their positions otherwise
+        if tickers is None:
+            return slice(0, len(self.tickers))
+        missing = [ticker for ticker in tickers if ticker not in self.positions.index]
+        if missing:
+            raise KeyError(f'Ticker(s) not in the price store: {", ".join(missing)}.')
+        positions = self.positions[list(tickers)].to_numpy()
+        if len(positions) > 0 and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            return slice(positions[0], positions[0] + len(positions))
+        return positions
+
+    def array(self, tickers=None, start=None, end=None):
+        return self.prices[self.date_slice(start, end), self.ticker_selection(tickers)]
+
+    def view(self, tickers=None, start=None, end=None):
+        # Prices of the tickers between start and end as a DataFrame, like financialmarket.data.download_prices
+        dates = self.date_slice(start, end)
+        selection = self.ticker_selection(tickers)
+        return pd.DataFrame(self.prices[dates, selection], index=self.dates[dates], columns=self.tickers[selection], copy=False)
+
+    def chunks(self, tickers=None, start=None, end=None, size=500):
+        # Views of up to size tickers at a time, so per-asset analyses of the whole universe run in bounded memory
+        tickers = list(self.tickers) if tickers is None else list(tickers)
+        for first in range(0, len(tickers), size):
+            yield self.view(tickers[first:first + size], start, end)
+
+class StoreSource:
+    # Source for jobs.run_job that reads prices from a store (leaving out tickers without prices
+    # since the start date) and downloads everything else
+    def __init__(self, store):
+        self.store = store
+
+    def download_prices(self, tickers, start_date):
+        tickers = [ticker for ticker in tickers if ticker in self.store.positions.index]
+        prices = self.store.view(tickers, start_date)
+        traded = prices.notna().any().to_numpy()
+        return prices if traded.all() else prices.loc[:, traded]
+
+    def download_sgs(self, name, code, start_date):
+        return data.download_sgs(name, code, start_date)
+
+    def download_currencies(self, symbols, start_date, end_date):
+        return data.download_currencies(symbols, start_date, end_date)
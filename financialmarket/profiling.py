@@ -0,0 +1,178 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+#
+# Profiling
+#
+
+# Time spent in each stage of a run (fetch, align, compute, optimize, render), with counters such as
+# the SLSQP iterations and objective evaluations, optionally with a cProfile of the whole run and
+# the peak memory (tracemalloc) of each stage. Profiling is off unless started, either with the
+# --profile option of the command line or by setting the report path in the environment, e.g.
+# FINANCIALMARKET_PROFILE=report.json python markowitz-optimization.py (and
+# FINANCIALMARKET_PROFILE_CAPTURE=cprofile,tracemalloc for the optional captures).
+PROFILE_VARIABLE = 'FINANCIALMARKET_PROFILE'
+CAPTURE_VARIABLE = 'FINANCIALMARKET_PROFILE_CAPTURE'
+
+# Every stage is also logged as a JSON object when this logger is enabled
+logger = logging.getLogger('financialmarket.profiling')
+
+class Profiler:
+
+    def __init__(self, cprofile=False, memory=False):
+        self.started = datetime.now()
+        self.start_time = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.memory = memory
+        # Stages open in every thread, to tell when stages overlap
+        self.open_stages = []
+        self.profile = None
+        if memory:
+            import tracemalloc
+            tracemalloc.start()
+        if cprofile:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    @contextmanager
+    def stage(self, name):
+        # Stages can be nested (e.g. a fetch inside an analysis), each one counts its full duration.
+        # The memory of a stage is the peak traced memory above the memory traced when it started.
+        # tracemalloc only has one peak for the whole process, so the memory of stages that overlap
+        # with stages of other threads (e.g. data.download_concurrently or the service's worker
+        # threads) can't be told apart: those stages are timed, but their memory is not recorded.
+        stack = self.local.__dict__.setdefault('stack', [])
+        entry = {'name': name, 'peak': 0, 'start_memory': 0, 'thread': threading.get_ident(), 'concurrent': False}
+        if self.memory:
+            import tracemalloc
+            with self.lock:
+                others = [other for other in self.open_stages if other['thread'] != entry['thread']]
+                for other in others:
+                    other['concurrent'] = True
+                entry['concurrent'] = bool(others)
+                self.open_stages.append(entry)
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            entry['start_memory'] = current
+        stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            peak = None
+            if self.memory:
+                import tracemalloc
+                entry['peak'] = max(entry['peak'], tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], entry['peak'])
+                with self.lock:
+                    self.open_stages.remove(entry)
+                if not entry['concurrent']:
+                    peak = entry['peak'] - entry['start_memory']
+            self.record(name, seconds, peak)
+
+    def record(self, name, seconds, peak=None):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            if peak is not None:
+                stage['peak_bytes'] = max(stage.get('peak_bytes', 0), peak)
+        logger.info(json.dumps({'stage': name, 'seconds': seconds, 'peak_bytes': peak}))
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+            self.memory = False
+
+    def report(self, functions=30):
+        report = {
+            'started': self.started.isoformat(timespec='seconds'),
+            'command': sys.argv,
+            'total_seconds': time.perf_counter() - self.start_time,
+            'stages': self.stages,
+            'counters': self.counters,
+        }
+        if self.profile is not None:
+            import pstats
+
+            # Functions with the highest cumulative time
+            statistics = pstats.Stats(self.profile).stats
+            ranked = sorted(statistics.items(), key=lambda item: item[1][3], reverse=True)[:functions]
+            report['cprofile'] = [
+                {'function': f'{path}:{line}({function})', 'calls': calls, 'total_seconds': total, 'cumulative_seconds': cumulative}
+                for (path, line, function), (_, calls, total, cumulative, _) in ranked
+            ]
+        return report
+
+    def write(self, path):
+        self.stop()
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        # The full profile can be explored with pstats or snakeviz
+        if self.profile is not None:
+            self.profile.dump_stats(os.path.splitext(path)[0] + '.prof')
+        print(f'Profile saved to {path}', file=sys.stderr)
+
+# The profiler of the current run, None when profiling is off
+profiler = None
+
+def start(path, cprofile=False, memory=False):
+    # Starts profiling and writes the report to path when the program exits
+    global profiler
+    profiler = Profiler(cprofile, memory)
+    atexit.register(profiler.write, path)
+    return profiler
+
+def start_from_environment():
+    path = os.environ.get(PROFILE_VARIABLE)
+    if path and profiler is None:
+        capture = os.environ.get(CAPTURE_VARIABLE, '').split(',')
+        start(path, cprofile='cprofile' in capture, memory='tracemalloc' in capture)
+
+@contextmanager
+def stage(name):
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
+
+def count(name, value=1):
+    if profiler is not None:
+        profiler.count(name, value)
+
+def timed(name):
+    # Decorator running the whole function as a stage
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+start_from_environment()
@@ -0,0 +1,189 @@
+import logging
+import os
+import zlib
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import DATA_DIR, synthetic
+
+#
+# Data providers
+#
+
+# Every download goes through a provider: the live one (yfinance and python-bcb) or a synthetic
+# one generating deterministic data with the same shape, so the programs, the service and the
+# benchmarks can run without network access. The provider is chosen with an environment variable,
+# e.g. FINANCIALMARKET_PROVIDER=synthetic (or synthetic:42 to change the seed).
+PROVIDER_VARIABLE = 'FINANCIALMARKET_PROVIDER'
+
+class LiveProvider:
+    name = 'live'
+    data_dir = DATA_DIR
+
+    def prices(self, tickers, start_date):
+        # Adjusted closes, one column per ticker
+        import yfinance as yf
+
+        # Set the logging level for yfinance to CRITICAL to reduce noise
+        logging.getLogger('yfinance').setLevel(logging.CRITICAL)
+
+        prices = yf.download(tickers, start=start_date, auto_adjust=False, progress=False)['Adj Close']
+        if isinstance(prices, pd.Series):
+            prices = prices.to_frame(tickers[0])
+        return prices
+
+    def sgs(self, series, start_date, end_date=None):
+        # series maps column names to SGS codes, e.g. {'CDI': 11}
+        from bcb import sgs
+
+        return sgs.get(series, start=start_date, end=end_date)
+
+    def currencies(self, symbols, start_date, end_date):
+        from bcb import currency
+
+        return currency.get(symbols, start=start_date, end=end_date, side='ask')
+
+    def expectations(self, kind, indicator, since=None):
+        # Focus survey medians: columns 'Data', the reference column of the kind and 'Mediana'
+        from bcb import Expectativas
+        from financialmarket.expectations import ENDPOINTS
+
+        endpoint_name, reference = ENDPOINTS[kind]
+        endpoint = Expectativas().get_endpoint(endpoint_name)
+
+        query = endpoint.query().filter(endpoint.baseCalculo == '1')
+        # The Selic endpoint only holds one indicator, the others are filtered by it
+        if kind != 'selic':
+            query = query.filter(endpoint.Indicador == indicator)
+        # Only ask for survey dates that are not stored yet
+        if since is not None:
+            query = query.filter(endpoint.Data > since.strftime('%Y-%m-%d'))
+
+        return (query
+                .select(endpoint.Data, getattr(endpoint, reference), endpoint.Mediana)
+                .orderby(endpoint.Data.asc())
+                .collect())
+
+# Synthetic SGS series: frequency, mean, persistence and volatility of the AR(1) process
+SGS_SERIES = {
+    11: ('daily', 0.04, 0.999, 0.0005),    # CDI (% per day)
+    432: ('daily', 10.0, 0.999, 0.05),     # Selic target (% per year)
+    433: ('monthly', 0.4, 0.6, 0.3),       # IPCA (% per month)
+    189: ('monthly', 0.5, 0.6, 0.6),       # IGP-M (% per month)
+}
+
+# Synthetic exchange rates: first value in BRL
+CURRENCIES = {'USD': 5.0, 'EUR': 5.5}
+
+# Synthetic Focus indicators: mean, persistence and volatility of the median expectation
+FOCUS_INDICATORS = {
+    ('selic', 'Selic'): (10.0, 0.995, 0.1),
+    ('monthly', 'Câmbio'): (5.0, 0.995, 0.02),
+    ('monthly', 'IPCA'): (0.4, 0.95, 0.03),
+    ('monthly', 'IGP-M'): (0.5, 0.95, 0.05),
+    ('anual', 'IPCA'): (4.5, 0.995, 0.05),
+    ('anual', 'IGP-M'): (5.0, 0.995, 0.08),
+}
+
+# How much of the distance between the current level and the mean is kept at each period ahead
+FOCUS_HORIZON_DECAY = 0.8
+
+class SyntheticProvider:
+    # Series are generated from a fixed first date and then cut at the requested start date, so a
+    # ticker or series has the same values whatever the start date, and a later end date only
+    # appends new values. Every name gets its own random stream, derived from the seed.
+    name = 'synthetic'
+    first_date = '1995-01-01'
+    first_survey_date = '2018-01-01'
+
+    def __init__(self, seed=0, end_date=None):
+        self.seed = seed
+        self.end_date = pd.Timestamp(end_date or date.today()).normalize()
+        # Data saved from the series (the CDI index, the Focus surveys) is kept apart for each seed
+        # and end date, as their values differ
+        self.data_dir = os.path.join(DATA_DIR, 'synthetic', f'seed-{seed}-{self.end_date:%Y-%m-%d}')
+
+    def random_seed(self, *names):
+        return [self.seed] + [zlib.crc32(str(name).encode()) for name in names]
+
+    def prices(self, tickers, start_date):
+        index = pd.bdate_range(self.first_date, self.end_date, name='Date')
+        prices = pd.concat([
+            synthetic.gbm_prices([ticker], index, seed=self.random_seed('prices', ticker), staggered=False)
+            for ticker in tickers
+        ], axis=1)
+        return prices[prices.index >= pd.Timestamp(start_date)]
+
+    def sgs(self, series, start_date, end_date=None):
+        end_date = pd.Timestamp(end_date) if end_date is not None else self.end_date
+        columns = {}
+        for name, code in series.items():
+            frequency, mean, persistence, volatility = SGS_SERIES.get(code, ('daily', 1.0, 0.99, 0.01))
+            if frequency == 'daily':
+                index = pd.bdate_range(self.first_date, self.end_date, name='Date')
+            else:
+                index = pd.date_range(self.first_date, self.end_date, freq='MS', name='Date')
+            columns[name] = synthetic.ar_rates(index, self.random_seed('sgs', code), mean, persistence, volatility, minimum=-np.inf)
+        data = pd.DataFrame(columns)
+        return data[(data.index >= pd.Timestamp(start_date)) & (data.index <= end_date)]
+
+    def currencies(self, symbols, start_date, end_date):
+        index = pd.bdate_range(self.first_date, self.end_date, name='Date')
+        # Driftless, so the rates stay around their first values (synthetic.gbm_prices starts at 10)
+        rates = pd.concat([
+            synthetic.gbm_prices([symbol], index, seed=self.random_seed('currency', symbol), drift=0.0, volatility=0.12, staggered=False)
+            * CURRENCIES.get(symbol, 1.0) / 10
+            for symbol in symbols
+        ], axis=1)
+        return rates[(rates.index >= pd.Timestamp(start_date)) & (rates.index <= pd.Timestamp(end_date))]
+
+    def expectations(self, kind, indicator, since=None):
+        # Daily (business days) surveys with the median expectation for each reference period ahead:
+        # the next 8 COPOM meetings, the next 18 months or the next 5 years
+        from financialmarket.expectations import ENDPOINTS
+
+        reference = ENDPOINTS[kind][1]
+        surveys = pd.bdate_range(self.first_survey_date, self.end_date)
+        mean, persistence, volatility = FOCUS_INDICATORS.get((kind, indicator), (1.0, 0.99, 0.05))
+        levels = synthetic.ar_rates(surveys, self.random_seed('focus', kind, indicator), mean, persistence, volatility, minimum=-np.inf)
+
+        if kind == 'selic':
+            # Meetings are approximated as in copom.meeting_dates: every 45 days from the 31st of January
+            meeting_codes = [f'R{number}/{year}' for year in range(surveys[0].year, self.end_date.year + 3) for number in range(1, 9)]
+            meeting_days = [pd.Timestamp(f'{code[-4:]}-01-31') + pd.Timedelta(days=45 * (int(code[1:-5]) - 1)) for code in meeting_codes]
+            meetings = pd.Series(meeting_days, index=meeting_codes)
+            ahead = [meetings[meetings > survey].index[:8] for survey in surveys]
+        elif kind == 'monthly':
+            ahead = [[f'{month:%m/%Y}' for month in pd.date_range(survey.replace(day=1), periods=18, freq='MS')] for survey in surveys]
+        else:
+            ahead = [[str(year) for year in range(survey.year, survey.year + 5)] for survey in surveys]
+
+        # The expectation moves away from the current level with the horizon, towards the mean
+        rows = []
+        for survey, level, references in zip(surveys, levels, ahead):
+            for horizon, period in enumerate(references):
+                rows.append((survey, period, round(mean + (level - mean) * FOCUS_HORIZON_DECAY ** horizon, 4)))
+        data = pd.DataFrame(rows, columns=['Data', reference, 'Mediana'])
+        if since is not None:
+            data = data[data['Data'] > pd.Timestamp(since)]
+        data['Data'] = data['Data'].dt.strftime('%Y-%m-%d')
+        return data.reset_index(drop=True)
+
+PROVIDERS = {
+    'live': LiveProvider,
+    'synthetic': SyntheticProvider,
+}
+
+@lru_cache(maxsize=None)
+def create_provider(name):
+    # name is a provider name, optionally followed by its seed (synthetic:42)
+    name, _, seed = name.partition(':')
+    if name not in PROVIDERS:
+        raise ValueError(f'Unknown data provider {name!r}. Please use one of: {", ".join(PROVIDERS)}.')
+    return PROVIDERS[name](int(seed)) if seed else PROVIDERS[name]()
+
+def get_provider():
+    return create_provider(os.environ.get(PROVIDER_VARIABLE, 'live'))
@@ -0,0 +1,93 @@
+import os
+
+from financialmarket import ROOT_DIR, profiling
+
+#
+# Rendering
+#
+
+STYLE_PATH = os.path.join(ROOT_DIR, 'mplstyles', 'financialgraphs.mplstyle')
+
+# When set, charts are saved to this path (.png, .svg, ...) instead of being shown, so the
+# programs can run on machines without a display
+OUTPUT_VARIABLE = 'FINANCIALMARKET_OUTPUT'
+
+def is_interactive():
+    return os.environ.get(OUTPUT_VARIABLE) is None
+
+def setup(interactive=None):
+    import matplotlib
+
+    if interactive is None:
+        interactive = is_interactive()
+    # The non-interactive backend must be selected before pyplot is imported
+    if not interactive:
+        matplotlib.use('Agg')
+
+    import matplotlib.pyplot as plt
+    plt.style.use(STYLE_PATH)
+    return plt
+
+def add_cursor():
+    # mplcursors is only needed (and imported) when the chart is shown on screen
+    import mplcursors
+
+    cursor = mplcursors.cursor()
+    @cursor.connect("add")
+    def on_add(sel):
+        sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
+        sel.annotation.get_bbox_patch().set_edgecolor('gray')
+        sel.annotation.arrow_patch.set_color('white')
+        sel.annotation.arrow_patch.set_arrowstyle('-')
+    return cursor
+
+def finish(figure, output=None):
+    import matplotlib.pyplot as plt
+
+    output = output or os.environ.get(OUTPUT_VARIABLE)
+    if output:
+        with profiling.stage('render'):
+            figure.savefig(output)
+        plt.close(figure)
+        print(f'Chart saved to {output}')
+    else:
+        # Enable cursor interaction on the graph
+        add_cursor()
+        plt.show()
+
+#
+# Batch rendering
+#
+
+# Figures kept alive in each process and cleared between charts, keyed by size
+figures = {}
+
+def reusable_figure(figsize=(14, 8)):
+    import matplotlib.pyplot as plt
+
+    figure = figures.get(figsize)
+    if figure is None:
+        figure = figures[figsize] = plt.figure(figsize=figsize)
+    else:
+        figure.clear()
+    return figure
+
+def render(chart, data, output, figsize=(14, 8)):
+    # Draws chart(figure, **data) on a reused figure and saves it to the output path
+    figure = reusable_figure(figsize)
+    chart(figure, **data)
+    with profiling.stage('render'):
+        figure.savefig(output)
+    return output
+
+def render_job(job):
+    return render(*job)
+
+def render_many(jobs, processes=None, chunksize=8):
+    # Renders (chart, data, output[, figsize]) jobs in worker processes. Each worker sets up the
+    # backend and the style once and reuses its figures for all the charts it draws, and the chart
+    # functions must be importable (module level) so they can be sent to the workers.
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(processes, initializer=setup, initargs=(False,)) as pool:
+        return list(pool.map(render_job, jobs, chunksize=chunksize))
@@ -0,0 +1,165 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import compounding
+
+#
+# Value at Risk
+#
+
+# Historical simulation VaR over several horizons from daily prices, for all the assets (columns)
+# in one array operation. Each horizon uses every overlapping window of that many trading days
+# (a 1-month VaR from 5 years of prices uses ~1240 returns instead of 60 calendar months) or, with
+# sqrt-time scaling, the 1-day VaR times the square root of the horizon.
+
+# Horizons are given in trading days ('1d', '10d') or months of 21 trading days ('1m', '3m')
+HORIZONS = ['1d', '10d', '1m']
+TRADING_DAYS_PER_MONTH = 21
+
+def horizon_days(horizon):
+    match = re.fullmatch(r'(\d+)([dm])', str(horizon).strip().lower())
+    if match is None or int(match[1]) == 0:
+        raise ValueError(f'Invalid horizon {horizon!r}. Please use a number of days or months, e.g. 10d or 1m.')
+    return int(match[1]) * (TRADING_DAYS_PER_MONTH if match[2] == 'm' else 1)
+
+def daily_returns(prices):
+    # Daily returns of each asset, missing before its first price; gaps (e.g. a market holiday of
+    # only some of the assets) keep the last price, so they count as a zero return
+    prices = prices.ffill()
+    return prices / prices.shift(1) - 1
+
+def horizon_returns(prices, days):
+    # Returns over every window of `days` trading days, from the cumulative sum of log returns
+    return compounding.rolling_compounded(daily_returns(prices), days, scale=1)
+
+def var_position(counts, confidence_level):
+    # Position of the VaR return among counts sorted returns (within them at any confidence level)
+    return np.minimum(((1 - confidence_level) * np.asarray(counts)).astype(int), np.maximum(np.asarray(counts) - 1, 0))
+
+def historical_var(returns, confidence_level):
+    # Loss (a positive fraction) not exceeded with the confidence level, per column. A single sort
+    # of all the columns (missing returns sort last) replaces a quantile per column, and each
+    # column's quantile is the return at its own position given its number of returns: the sorted
+    # return at int((1 - confidence level) * count), as value-at-risk.py has always used.
+    ordered = np.sort(np.asarray(returns, dtype=float).reshape(len(returns), -1), axis=0)
+    counts = (~np.isnan(ordered)).sum(axis=0)
+    positions = var_position(counts, confidence_level)
+    quantile = ordered[positions, np.arange(ordered.shape[1])]
+    return -np.where(counts > 0, quantile, np.nan)
+
+def horizon_var(prices, confidence_level, horizons=HORIZONS, scaling=False):
+    # DataFrame of the VaR of each asset (rows) for each horizon (columns)
+    prices = prices.to_frame() if isinstance(prices, pd.Series) else prices
+    returns = daily_returns(prices).to_numpy()
+    if scaling:
+        one_day = historical_var(returns, confidence_level)
+        columns = {horizon: one_day * np.sqrt(horizon_days(horizon)) for horizon in horizons}
+    else:
+        # The cumulative log sums are computed once for all the horizons
+        windows = compounding.rolling_compounded_windows(returns, [horizon_days(horizon) for horizon in horizons], scale=1)
+        columns = {horizon: historical_var(window_returns, confidence_level) for horizon, window_returns in zip(horizons, windows)}
+    return pd.DataFrame(columns, index=prices.columns)
+
+#
+# Risk decomposition
+#
+
+# VaR and expected shortfall (ES, the mean loss beyond the VaR) of a portfolio split into the
+# contributions of its positions, which add up to the portfolio's. Parametric figures assume normal
+# returns and only need the covariance matrix times the weights; historical figures come from the
+# joint return scenarios: the VaR scenario for the VaR and the tail scenarios beyond it for the ES.
+
+def scenario_returns(prices, days=1):
+    # Returns of all the assets over every window of `days` trading days, only on the dates they all have returns
+    return horizon_returns(prices, days).dropna()
+
+class PortfolioRisk:
+    # Weights are fractions of the portfolio value (a Series or dict by ticker, missing tickers have
+    # no position), and losses are fractions of the portfolio value too. Everything that depends on
+    # the whole portfolio is computed once, so the incremental VaR of a trade only touches the
+    # returns of the assets it trades.
+
+    def __init__(self, returns, weights, confidence_level):
+        from statistics import NormalDist
+
+        self.tickers = returns.columns
+        self.values = returns.to_numpy(dtype=float)
+        self.weights = pd.Series(weights, dtype=float).reindex(self.tickers, fill_value=0.0).to_numpy()
+        self.confidence_level = confidence_level
+        self.portfolio = self.values @ self.weights
+
+        # Covariance matrix times the weights from the centered returns, without the covariance matrix itself
+        self.mean = self.values.mean(axis=0)
+        self.centered = self.values - self.mean
+        self.centered_portfolio = self.centered @ self.weights
+        self.covariance_weights = self.centered.T @ self.centered_portfolio / (len(self.values) - 1)
+        self.volatility = np.sqrt(self.weights @ self.covariance_weights)
+
+        # Normal quantile and mean of the tail beyond it, in standard deviations
+        normal = NormalDist()
+        self.var_deviations = normal.inv_cdf(confidence_level)
+        self.es_deviations = normal.pdf(self.var_deviations) / (1 - confidence_level)
+
+        # Scenarios sorted from the worst portfolio return; the VaR one is at the position used by historical_var
+        self.order = np.argsort(self.portfolio, kind='stable')
+        self.var_position = int(var_position(len(self.portfolio), confidence_level))
+
+    def parametric(self):
+        # Marginal VaR and ES (per unit of weight) and component VaR and ES (weight times marginal) per asset
+        marginal_var = -self.mean + self.var_deviations * self.covariance_weights / self.volatility
+        marginal_es = -self.mean + self.es_deviations * self.covariance_weights / self.volatility
+        return self.decomposition(marginal_var, marginal_es)
+
+    def historical(self):
+        var_scenario = self.values[self.order[self.var_position]]
+        tail_scenarios = self.values[self.order[:self.var_position + 1]]
+        return self.decomposition(-var_scenario, -tail_scenarios.mean(axis=0))
+
+    def decomposition(self, marginal_var, marginal_es):
+        return pd.DataFrame({
+            'weight': self.weights,
+            'marginal_var': marginal_var,
+            'component_var': self.weights * marginal_var,
+            'marginal_es': marginal_es,
+            'component_es': self.weights * marginal_es,
+        }, index=self.tickers)
+
+    def totals(self):
+        tail = self.portfolio[self.order[:self.var_position + 1]]
+        portfolio_mean = self.mean @ self.weights
+        return {
+            'parametric': {'var': float(-portfolio_mean + self.var_deviations * self.volatility), 'es': float(-portfolio_mean + self.es_deviations * self.volatility)},
+            'historical': {'var': float(-tail[-1]), 'es': float(-tail.mean())},
+        }
+
+    def incremental_var(self, trades):
+        # VaR of the portfolio after each hypothetical trade and its change from the current VaR.
+        # trades is a DataFrame with one trade per row (or a dict or Series for a single trade)
+        # of weight changes per ticker, e.g. {'PETR4.SA': 0.05, 'VALE3.SA': -0.05}.
+        trades = pd.DataFrame([trades]) if isinstance(trades, (dict, pd.Series)) else trades
+        unknown = [ticker for ticker in trades.columns if ticker not in self.tickers]
+        if unknown:
+            raise KeyError(f'Ticker(s) not in the portfolio returns: {", ".join(unknown)}.')
+        positions = self.tickers.get_indexer(trades.columns)
+        changes = trades.fillna(0.0).to_numpy(dtype=float).T
+
+        # Portfolio returns after each trade (one column per trade), from the traded assets only
+        trade_returns = self.values[:, positions] @ changes
+        historical = historical_var(self.portfolio[:, None] + trade_returns, self.confidence_level)
+
+        # Variance after each trade: w'Sw + 2 d'Sw + d'Sd, with Sd from the traded assets only
+        centered_trades = self.centered[:, positions] @ changes
+        count = len(self.values) - 1
+        variance = self.volatility ** 2 + 2 * self.centered_portfolio @ centered_trades / count + (centered_trades ** 2).sum(axis=0) / count
+        mean = self.mean @ self.weights + self.mean[positions] @ changes
+        parametric = -mean + self.var_deviations * np.sqrt(variance)
+
+        totals = self.totals()
+        return pd.DataFrame({
+            'parametric_var': parametric,
+            'parametric_incremental_var': parametric - totals['parametric']['var'],
+            'historical_var': historical,
+            'historical_incremental_var': historical - totals['historical']['var'],
+        }, index=trades.index)
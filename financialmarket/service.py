@@ -0,0 +1,222 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl
+
+import pandas as pd
+
+from financialmarket import currencies, jobs, profiling
+from financialmarket.providers import get_provider
+
+#
+# Cache
+#
+
+class SeriesCache:
+    # Keeps the most recently used series in memory, keyed by e.g. a ticker. An entry covers the
+    # history from the earliest start date requested so far and is downloaded again when it is
+    # older than ttl seconds or a request starts before it. Concurrent requests for a key that is
+    # being downloaded wait for that download instead of starting another one.
+
+    def __init__(self, fetch, max_entries=256, ttl=6 * 60 * 60, clock=time.monotonic):
+        # fetch(key, start_date) returns the series of key since start_date, and is called in a worker thread
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.downloads = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fresh_entry(self, key, start_date):
+        entry = self.entries.get(key)
+        if entry is None or self.clock() - entry['time'] > self.ttl or pd.Timestamp(start_date) < entry['start']:
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    async def get(self, key, start_date):
+        while True:
+            entry = self.fresh_entry(key, start_date)
+            if entry is not None:
+                self.hits += 1
+                return entry['series'][entry['series'].index >= pd.Timestamp(start_date)]
+
+            download = self.downloads.get(key)
+            if download is None:
+                self.misses += 1
+                download = self.downloads[key] = asyncio.ensure_future(self.download(key, start_date))
+            # A finished download that goes back far enough is used as it is, even when it is
+            # already older than ttl (a short ttl would otherwise download again forever); one
+            # started by an earlier request may not, and the entry is checked again
+            entry = await asyncio.shield(download)
+            if pd.Timestamp(start_date) >= entry['start']:
+                return entry['series'][entry['series'].index >= pd.Timestamp(start_date)]
+
+    async def download(self, key, start_date):
+        try:
+            entry = self.entries.get(key)
+            # Never shrink the history already kept for the key
+            if entry is not None and entry['start'] < pd.Timestamp(start_date):
+                start_date = entry['start'].strftime('%Y-%m-%d')
+            series = await asyncio.get_running_loop().run_in_executor(None, self.fetch, key, start_date)
+            entry = self.entries[key] = {'series': series, 'start': pd.Timestamp(start_date), 'time': self.clock()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry
+        finally:
+            del self.downloads[key]
+
+    def stats(self):
+        return {'entries': len(self.entries), 'downloads': len(self.downloads), 'hits': self.hits, 'misses': self.misses}
+
+# The fetchers go to the provider directly instead of through the data module, whose caches are
+# never refreshed or trimmed: the SeriesCache entries are the only copies kept by the service
+
+def fetch_price(ticker, start_date):
+    with profiling.stage('fetch'):
+        prices = get_provider().prices([ticker], start_date)
+    return prices[ticker].dropna() if ticker in prices else pd.Series(dtype=float)
+
+def fetch_sgs(series, start_date):
+    # series is a (name, code) pair, e.g. ('CDI', 11)
+    name, code = series
+    with profiling.stage('fetch'):
+        return get_provider().sgs({name: code}, start_date)[name]
+
+def fetch_currency(symbol, start_date):
+    # Exchange rate (BRL per unit) of a currency since start_date, up to today
+    with profiling.stage('fetch'):
+        return get_provider().currencies([symbol], start_date, pd.Timestamp.today().strftime('%Y-%m-%d'))[symbol]
+
+class CachedSource:
+    # Source for jobs.run_job that reads from series already loaded into the caches
+
+    def __init__(self, prices, sgs, exchange_rates=None):
+        self.prices = prices
+        self.sgs = sgs
+        self.exchange_rates = exchange_rates or {}
+
+    def download_prices(self, tickers, start_date):
+        return pd.DataFrame({ticker: self.prices[ticker] for ticker in tickers if len(self.prices[ticker]) > 0})
+
+    def download_sgs(self, name, code, start_date):
+        return self.sgs[(name, code)].to_frame(name)
+
+    def download_currencies(self, symbols, start_date, end_date):
+        return pd.DataFrame({symbol: self.exchange_rates[symbol] for symbol in symbols})
+
+#
+# Service
+#
+
+# Analyses served, and the SGS series each one needs besides the prices of its tickers
+ANALYSES = {
+    'drawdown': [],
+    'var': [],
+    'markowitz': [],
+    'backtest': [],
+    'ma': [('CDI', 11)],
+    'lmp': [('CDI', 11)],
+}
+
+class AnalysisService:
+    # Runs the analyses on data kept in memory between requests. fetch_price(ticker, start_date),
+    # fetch_sgs((name, code), start_date) and fetch_currency(symbol, start_date) download the data
+    # and can be replaced, e.g. by local fakes to run the service offline.
+
+    def __init__(self, fetch_price=fetch_price, fetch_sgs=fetch_sgs, fetch_currency=fetch_currency, max_entries=256, ttl=6 * 60 * 60):
+        self.prices = SeriesCache(fetch_price, max_entries, ttl)
+        self.sgs = SeriesCache(fetch_sgs, max_entries, ttl)
+        self.exchange_rates = SeriesCache(fetch_currency, max_entries, ttl)
+
+    async def run(self, job):
+        analysis = job.get('analysis')
+        if analysis not in ANALYSES:
+            raise ValueError(f'Unknown analysis {analysis!r}. Please use one of: {", ".join(ANALYSES)}.')
+        start_date = jobs.parse_start_date(job.get('start'))
+        tickers = jobs.parse_list(job.get('tickers'))
+        if analysis == 'lmp' or (analysis == 'ma' and not tickers):
+            tickers = ['^BVSP']
+
+        # Load every series the analysis needs at the same time, then run it in a worker thread
+        prices = await asyncio.gather(*[self.prices.get(ticker, start_date) for ticker in tickers])
+        sgs = await asyncio.gather(*[self.sgs.get(series, start_date) for series in ANALYSES[analysis]])
+        # Exchange rates of the currencies to convert from and to (see currencies.to_base), from a
+        # few days before the start date
+        symbols = []
+        if job.get('currency'):
+            base = str(job['currency']).upper()
+            tagged = currencies.ticker_currencies(tickers)
+            if any(currency != base for currency in tagged):
+                symbols = sorted(set(tagged + [base]) - {currencies.BASE_CURRENCY})
+        rates_start_date = (pd.Timestamp(start_date) - pd.Timedelta(days=currencies.FX_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+        exchange_rates = await asyncio.gather(*[self.exchange_rates.get(symbol, rates_start_date) for symbol in symbols])
+        source = CachedSource(dict(zip(tickers, prices)), dict(zip(ANALYSES[analysis], sgs)), dict(zip(symbols, exchange_rates)))
+        results = await asyncio.get_running_loop().run_in_executor(None, jobs.run_job, job, source)
+        return jobs.format_results(results)
+
+    def stats(self):
+        return {'prices': self.prices.stats(), 'sgs': self.sgs.stats(), 'exchange_rates': self.exchange_rates.stats()}
+
+    async def handle(self, method, path, body):
+        # Returns the status and the JSON body of the response to a request
+        url = urlsplit(path)
+        name = url.path.strip('/')
+        if method == 'GET' and name == 'stats':
+            return 200, json.dumps(self.stats())
+        if name not in ANALYSES:
+            return 404, json.dumps({'error': f'Unknown path {url.path!r}.'})
+
+        # Options come from the query string (GET) or a JSON object (POST), e.g. /drawdown?start=2020-01-01&tickers=PETR4.SA
+        try:
+            job = json.loads(body) if method == 'POST' and body else {}
+            job.update(parse_qsl(url.query))
+            job['analysis'] = name
+            return 200, await self.run(job)
+        except ValueError as error:
+            return 400, json.dumps({'error': str(error)})
+        except Exception as error:
+            return 500, json.dumps({'error': str(error)})
+
+    async def handle_connection(self, reader, writer):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                header, _, value = line.partition(':')
+                headers[header.strip().lower()] = value.strip()
+            length = headers.get('content-length', '0')
+
+            if len(request_line) < 2:
+                status, content = 400, json.dumps({'error': 'Invalid request.'})
+            elif not (length.isascii() and length.isdigit()):
+                status, content = 400, json.dumps({'error': f'Invalid Content-Length {length!r}.'})
+            else:
+                try:
+                    body = await reader.readexactly(int(length))
+                except asyncio.IncompleteReadError:
+                    status, content = 400, json.dumps({'error': 'Request body shorter than its Content-Length.'})
+                else:
+                    status, content = await self.handle(request_line[0].upper(), request_line[1], body)
+            content = content.encode()
+            writer.write(
+                f'HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(content)}\r\nConnection: close\r\n\r\n'.encode() + content
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'Serving {", ".join(ANALYSES)} on http://{host}:{port}')
+        async with server:
+            await server.serve_forever()
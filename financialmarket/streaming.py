@@ -0,0 +1,263 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+#
+# Streaming statistics
+#
+
+# Drawdown and return statistics that are advanced bar by bar instead of recomputed over the whole
+# history, so an end of day job only processes the newest prices. Every statistic is kept for all
+# the assets at once as numpy arrays (O(1) work per asset and bar) and the state can be saved to a
+# checkpoint and loaded back the next day. Prices are adjusted closes, NaN when an asset has no
+# price on a date, and dates must always move forward.
+
+class StreamingStatistics:
+    # Per asset: running peak, current and maximum drawdown (as in analyses.drawdowns), cumulative
+    # return since the first price, and the mean and variance of the daily returns (Welford)
+    STATE = ['last_price', 'first_price', 'peak', 'max_drawdown', 'count', 'mean', 'm2']
+
+    def __init__(self, tickers):
+        self.tickers = pd.Index(tickers)
+        size = len(self.tickers)
+        self.last_date = None
+        self.last_price = np.full(size, np.nan)
+        self.first_price = np.full(size, np.nan)
+        self.peak = np.full(size, np.nan)
+        self.max_drawdown = np.full(size, np.nan)
+        self.count = np.zeros(size)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def check_date(self, date):
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f'Prices of {date:%Y-%m-%d} are not after the last update ({self.last_date:%Y-%m-%d}).')
+        return date
+
+    def update(self, date, prices):
+        # Advances the statistics by one bar; prices is a Series indexed by ticker (missing tickers
+        # have no price that day) or an array in the order of the tickers
+        date = self.check_date(date)
+        if isinstance(prices, pd.Series):
+            prices = prices.reindex(self.tickers)
+        prices = np.asarray(prices, dtype=float)
+        valid = ~np.isnan(prices)
+
+        # Welford's update of the mean and variance of the returns
+        returns = prices / self.last_price - 1
+        has_return = valid & ~np.isnan(self.last_price)
+        self.count += has_return
+        delta = np.where(has_return, returns - self.mean, 0.0)
+        self.mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=has_return)
+        self.m2 += np.where(has_return, delta * (returns - self.mean), 0.0)
+
+        self.first_price = np.where(np.isnan(self.first_price), prices, self.first_price)
+        self.peak = np.fmax(self.peak, prices)
+        self.max_drawdown = np.fmin(self.max_drawdown, prices / self.peak - 1)
+        self.last_price = np.where(valid, prices, self.last_price)
+        self.last_date = date
+        return self
+
+    def update_frame(self, prices):
+        # Advances the statistics by many bars at once (e.g. to start from a full history), with the
+        # same results as updating them bar by bar
+        prices = prices.reindex(columns=self.tickers).sort_index()
+        if prices.empty:
+            return self
+        self.check_date(prices.index[0])
+        values = prices.to_numpy(dtype=float)
+
+        # Returns from the previous price of each asset, which may come from an earlier update
+        filled = pd.DataFrame(np.vstack([self.last_price, values])).ffill().to_numpy()
+        returns = values / filled[:-1] - 1
+
+        # Merge the block's return statistics into the running ones (Chan et al.)
+        block_count = (~np.isnan(returns)).sum(axis=0)
+        has_block = block_count > 0
+        block_mean = np.divide(np.nansum(returns, axis=0), block_count, out=np.zeros(len(self.tickers)), where=has_block)
+        block_m2 = np.nansum((returns - block_mean) ** 2, axis=0)
+        count = self.count + block_count
+        delta = block_mean - self.mean
+        self.mean = np.where(has_block, self.mean + np.divide(delta * block_count, count, out=np.zeros_like(delta), where=has_block), self.mean)
+        self.m2 = np.where(has_block, self.m2 + block_m2 + np.divide(delta ** 2 * self.count * block_count, count, out=np.zeros_like(delta), where=has_block), self.m2)
+        self.count = count
+
+        first_valid = pd.DataFrame(values).bfill().to_numpy()[0]
+        self.first_price = np.where(np.isnan(self.first_price), first_valid, self.first_price)
+        peaks = np.fmax.accumulate(np.vstack([self.peak, values]), axis=0)[1:]
+        self.max_drawdown = np.fmin(self.max_drawdown, np.fmin.reduce(values / peaks - 1, axis=0))
+        self.peak = peaks[-1]
+        self.last_price = filled[-1]
+        self.last_date = pd.Timestamp(prices.index[-1])
+        return self
+
+    @property
+    def drawdown(self):
+        return self.last_price / self.peak - 1
+
+    @property
+    def cumulative_return(self):
+        return self.last_price / self.first_price - 1
+
+    @property
+    def variance(self):
+        return np.divide(self.m2, self.count - 1, out=np.full(len(self.tickers), np.nan), where=self.count > 1)
+
+    @property
+    def volatility(self):
+        # Annualized (252 trading days) volatility of the daily returns
+        return np.sqrt(self.variance * 252)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'price': self.last_price,
+            'peak': self.peak,
+            'drawdown': self.drawdown,
+            'max_drawdown': self.max_drawdown,
+            'cumulative_return': self.cumulative_return,
+            'mean_return': np.where(self.count > 0, self.mean, np.nan),
+            'volatility': self.volatility,
+            'returns': self.count.astype(int),
+        }, index=self.tickers)
+
+    def add_tickers(self, tickers):
+        # New assets start without history
+        tickers = [ticker for ticker in tickers if ticker not in self.tickers]
+        empty = StreamingStatistics(tickers)
+        for name in self.STATE:
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(empty, name)]))
+        self.tickers = self.tickers.append(pd.Index(tickers))
+        return self
+
+    def state(self):
+        state = {name: getattr(self, name) for name in self.STATE}
+        state['tickers'] = np.array(self.tickers, dtype=str)
+        state['last_date'] = np.array(str(self.last_date.date()) if self.last_date is not None else '')
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        statistics = cls(list(state['tickers']))
+        for name in cls.STATE:
+            setattr(statistics, name, state[name].astype(float))
+        statistics.last_date = pd.Timestamp(str(state['last_date'])) if str(state['last_date']) else None
+        return statistics
+
+    def save(self, path):
+        save_checkpoint(path, self.state())
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_state(load_checkpoint(path))
+
+class StreamingPortfolio:
+    # Cumulative return, drawdown and return statistics of a portfolio rebalanced to its weights
+    # every day, as in analyses.portfolio_backtest: assets without a price on a date (or not yet
+    # traded) contribute a zero return
+
+    def __init__(self, weights):
+        # weights map tickers to percentages
+        self.weights = pd.Series(weights, dtype=float) / 100
+        self.last_price = np.full(len(self.weights), np.nan)
+        # Statistics of the portfolio value, which starts at 1
+        self.value = StreamingStatistics(['Portfolio'])
+        self.value_level = 1.0
+
+    @property
+    def last_date(self):
+        return self.value.last_date
+
+    def portfolio_returns(self, values):
+        filled = pd.DataFrame(np.vstack([self.last_price, values])).ffill().to_numpy()
+        returns = np.nan_to_num(filled[1:] / filled[:-1] - 1)
+        return returns @ self.weights.to_numpy(), filled[-1]
+
+    def update(self, date, prices):
+        if isinstance(prices, pd.Series):
+            prices = prices.reindex(self.weights.index)
+        return self.update_frame(pd.DataFrame([np.asarray(prices, dtype=float)], index=[pd.Timestamp(date)], columns=self.weights.index))
+
+    def update_frame(self, prices):
+        prices = prices.reindex(columns=self.weights.index).sort_index()
+        if prices.empty:
+            return self
+        self.value.check_date(prices.index[0])
+        if self.value.last_date is None:
+            # The portfolio value is 1 before the first bar
+            self.value.update(prices.index[0] - pd.Timedelta(days=1), [self.value_level])
+        returns, self.last_price = self.portfolio_returns(prices.to_numpy(dtype=float))
+        levels = self.value_level * np.cumprod(1 + returns)
+        self.value.update_frame(pd.DataFrame({'Portfolio': levels}, index=prices.index))
+        self.value_level = levels[-1]
+        return self
+
+    @property
+    def cumulative_return(self):
+        return self.value_level - 1
+
+    def to_frame(self):
+        return self.value.to_frame()
+
+    def state(self):
+        state = {'value_' + name: value for name, value in self.value.state().items()}
+        state.update({
+            'weights': self.weights.to_numpy(),
+            'weight_tickers': np.array(self.weights.index, dtype=str),
+            'last_price': self.last_price,
+            'value_level': np.array(self.value_level),
+        })
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        portfolio = cls(dict(zip(state['weight_tickers'], state['weights'] * 100)))
+        portfolio.last_price = state['last_price'].astype(float)
+        portfolio.value_level = float(state['value_level'])
+        portfolio.value = StreamingStatistics.from_state({name[len('value_'):]: value for name, value in state.items() if name.startswith('value_') and name != 'value_level'})
+        return portfolio
+
+    def save(self, path):
+        save_checkpoint(path, self.state())
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_state(load_checkpoint(path))
+
+#
+# Checkpoints
+#
+
+def save_checkpoint(path, state):
+    # Write to a temporary file first so an interrupted save never leaves a broken checkpoint, with
+    # a name of its own so concurrent saves of the same checkpoint never write to the same file
+    checkpoint_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp', delete=False)
+    try:
+        with checkpoint_file:
+            np.savez(checkpoint_file, **state)
+        os.replace(checkpoint_file.name, path)
+    except BaseException:
+        os.remove(checkpoint_file.name)
+        raise
+
+def load_checkpoint(path):
+    with np.load(path) as checkpoint:
+        return {name: checkpoint[name] for name in checkpoint.files}
+
+def advance(path, prices, weights=None):
+    # Loads the statistics checkpointed at path (starting new ones if there are none), advances them
+    # by the prices after their last update and saves them back
+    cls = StreamingStatistics if weights is None else StreamingPortfolio
+    if os.path.exists(path):
+        statistics = cls.load(path)
+    else:
+        statistics = cls(list(prices.columns)) if weights is None else cls(weights)
+    if weights is None:
+        statistics.add_tickers(list(prices.columns))
+    if statistics.last_date is not None:
+        prices = prices[prices.index > statistics.last_date]
+    statistics.update_frame(prices)
+    statistics.save(path)
+    return statistics
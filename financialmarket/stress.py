@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from financialmarket import DATA_DIR
+
+#
+# Stress scenarios
+#
+
+# Named historical windows (from the close of the first date to the close of the last one) and
+# hypothetical shocks (a return per ticker, "default" for the tickers not listed, which are
+# otherwise not shocked), kept in a JSON file that can be edited or extended with add_scenarios:
+#
+#   {"historical": {"COVID-19 Crash (March 2020)": ["2020-02-21", "2020-03-23"]},
+#    "hypothetical": {"Market -30%": {"default": -0.3}, "Petrobras -20%": {"PETR4.SA": -0.2}}}
+#
+# Every scenario is a row of asset returns, so applying all the scenarios to all the portfolios is
+# a single (scenarios x assets) by (assets x portfolios) matrix product. Portfolios are bought at
+# the start of each window and held (the weights drift with the prices) and their weights are
+# fractions; a ticker without a price at the start of a window has no return in it.
+SCENARIOS_PATH = os.path.join(DATA_DIR, 'stress-scenarios.json')
+
+def load_scenarios(path=SCENARIOS_PATH):
+    with open(path) as scenarios_file:
+        scenarios = json.load(scenarios_file)
+    return {'historical': scenarios.get('historical', {}), 'hypothetical': scenarios.get('hypothetical', {})}
+
+def add_scenarios(historical=None, hypothetical=None, path=SCENARIOS_PATH):
+    # historical maps names to [start, end] dates and hypothetical maps names to shocks by ticker,
+    # e.g. {'Real -15%': {'default': -0.15}}; scenarios with the same names are replaced
+    scenarios = load_scenarios(path) if os.path.exists(path) else {'historical': {}, 'hypothetical': {}}
+    scenarios['historical'].update({name: [str(pd.Timestamp(date).date()) for date in window] for name, window in (historical or {}).items()})
+    scenarios['hypothetical'].update(hypothetical or {})
+    with open(path, 'w') as scenarios_file:
+        json.dump(scenarios, scenarios_file, indent=2)
+    return scenarios
+
+def window_positions(dates, windows):
+    # Positions of the last dates on or before the start and the end of each window (-1 before the first date)
+    starts = pd.to_datetime([start for start, end in windows.values()]).to_numpy(dtype='datetime64[D]')
+    ends = pd.to_datetime([end for start, end in windows.values()]).to_numpy(dtype='datetime64[D]')
+    dates = dates.to_numpy(dtype='datetime64[D]')
+    return np.searchsorted(dates, starts, side='right') - 1, np.searchsorted(dates, ends, side='right') - 1
+
+def historical_paths(prices, windows):
+    # Cumulative return of every asset on each date of each window (starting at 0), stacked into a
+    # single dates x assets array, and the positions of the first and last rows of each window in it
+    values = prices.ffill().to_numpy(dtype=float)
+    starts, ends = window_positions(prices.index, windows)
+    paths = []
+    for start, end in zip(starts, ends):
+        if start < 0 or end <= start:
+            # A window outside the prices has no returns
+            paths.append(np.full((1, values.shape[1]), np.nan))
+        else:
+            paths.append(values[start:end + 1] / values[start] - 1)
+    last_rows = np.cumsum([len(path) for path in paths], dtype=int) - 1
+    first_rows = last_rows - [len(path) - 1 for path in paths]
+    return np.vstack(paths) if paths else np.empty((0, values.shape[1])), first_rows, last_rows
+
+def hypothetical_shocks(shocks, tickers):
+    # Scenarios x tickers returns of the hypothetical shocks
+    rows = [[scenario.get(ticker, scenario.get('default', 0.0)) for ticker in tickers] for scenario in shocks.values()]
+    return pd.DataFrame(rows, index=list(shocks), columns=tickers, dtype=float)
+
+def portfolio_returns(shocks, weights):
+    # Return of each portfolio (columns of weights, assets x portfolios) in each scenario (rows of
+    # shocks, scenarios x assets), with missing shocks counted as no return, and the fraction of the
+    # gross weight of each portfolio that has a shock in each scenario
+    has_shock = ~np.isnan(shocks)
+    returns = np.where(has_shock, shocks, 0.0) @ weights
+    gross = np.abs(weights)
+    coverage = has_shock @ gross / gross.sum(axis=0)
+    return np.where(coverage > 0, returns, np.nan), coverage
+
+def stress_test(prices, weights, scenarios):
+    # prices are the adjusted closes (covering the historical windows), weights a DataFrame of
+    # tickers x portfolios and scenarios as given by load_scenarios. Returns DataFrames of the
+    # scenario returns of the assets, the returns of the portfolios over each scenario, the lowest
+    # cumulative return of the portfolios within each historical window and the coverage.
+    tickers = weights.index
+    prices = prices.reindex(columns=tickers)
+    weight_values = weights.to_numpy(dtype=float)
+    windows = scenarios['historical']
+
+    # Historical paths of all the windows through a single product, the scenario returns being the
+    # last row of each window and the lowest cumulative return the minimum of its rows
+    paths, first_rows, last_rows = historical_paths(prices, windows)
+    path_returns, path_coverage = portfolio_returns(paths, weight_values)
+    worst = np.minimum.reduceat(path_returns, first_rows, axis=0) if len(first_rows) else np.empty((0, weights.shape[1]))
+
+    hypothetical = hypothetical_shocks(scenarios['hypothetical'], tickers)
+    hypothetical_returns, hypothetical_coverage = portfolio_returns(hypothetical.to_numpy(), weight_values)
+
+    names = list(windows) + list(hypothetical.index)
+    shocks = pd.DataFrame(np.vstack([paths[last_rows], hypothetical.to_numpy()]), index=names, columns=tickers)
+    return {
+        'shocks': shocks,
+        'returns': pd.DataFrame(np.vstack([path_returns[last_rows], hypothetical_returns]), index=names, columns=weights.columns),
+        'worst': pd.DataFrame(worst, index=list(windows), columns=weights.columns),
+        'coverage': pd.DataFrame(np.vstack([path_coverage[last_rows], hypothetical_coverage]), index=names, columns=weights.columns),
+    }
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+#
+# Synthetic data
+#
+
+# Seeded random data with the shape of the downloaded data, used to run and benchmark the
+# analyses without network access. The same arguments always give the same data.
+
+def business_days(years, end='2024-12-31'):
+    end = pd.Timestamp(end)
+    return pd.bdate_range(end - pd.DateOffset(years=years), end)
+
+def gbm_prices(tickers, index, seed=0, drift=0.08, volatility=0.3, staggered=True):
+    # Geometric brownian motion prices (annual drift and volatility), one column per ticker. When
+    # staggered, assets start trading at random dates in the first half of the index (NaN before),
+    # like real assets with different inception dates.
+    rng = np.random.default_rng(seed)
+    days = len(index)
+    asset_volatility = volatility * rng.uniform(0.5, 1.5, len(tickers))
+    log_returns = (drift - asset_volatility ** 2 / 2) / 252 + asset_volatility / np.sqrt(252) * rng.standard_normal((days, len(tickers)))
+    prices = 10 * np.exp(np.cumsum(log_returns, axis=0))
+    if staggered:
+        inception = rng.integers(0, days // 2, len(tickers))
+        inception[0] = 0
+        prices[np.arange(days)[:, None] < inception] = np.nan
+    return pd.DataFrame(prices, index=index, columns=list(tickers))
+
+def ar_rates(index, seed=0, mean=0.04, persistence=0.995, volatility=0.001, minimum=0.0):
+    # AR(1) process around mean, e.g. daily CDI rates in percent
+    rng = np.random.default_rng(seed)
+    shocks = volatility * rng.standard_normal(len(index))
+    rates = np.empty(len(index))
+    rate = mean
+    for day, shock in enumerate(shocks):
+        rate = mean + persistence * (rate - mean) + shock
+        rates[day] = rate
+    return pd.Series(np.maximum(rates, minimum), index=index)
+
+def monthly_rates(years, seed=0, mean=0.4, persistence=0.6, volatility=0.3, end='2024-12-31'):
+    # Monthly rates (e.g. IPCA in percent), indexed by the first day of each month
+    index = pd.date_range(pd.Timestamp(end) - pd.DateOffset(years=years), end, freq='MS')
+    return ar_rates(index, seed, mean, persistence, volatility, minimum=-np.inf)
+
+def tickers(count):
+    return [f'ASSET{number:04d}' for number in range(count)]
@@ -1,11 +1,5 @@
-import logging
 from datetime import datetime, date
-from bcb import sgs
-import yfinance as yf
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import mplcursors
+from financialmarket import rendering
 
 #
 # Overview
@@ -22,9 +16,6 @@ print('\n#----------------------------------------------------------------------
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -48,101 +39,56 @@ while start_date is None:
         print('Invalid date. Please use YYYY-MM-DD format.')
         start_date = None
 
-#
-# CDI
-#
-
-# Fetch historical CDI data
-cdi_data = sgs.get({'CDI': 11}, start=start_date)
-cdi_data = cdi_data['CDI']
-
-# Convert CDI rates to decimal form (dividing by 100)
-cdi_daily_returns = cdi_data / 100
+returns_type = input('Do you want nominal returns or real returns (deflated by IPCA)? (nominal/real): ')
+while returns_type not in ['nominal', 'real']:
+    returns_type = input('Invalid input. Please enter "nominal" or "real": ')
 
-cdi_cumulative_daily_returns = (1 + cdi_daily_returns).cumprod()
-cdi_month_closing = cdi_cumulative_daily_returns.resample('M').last()
-cdi_returns = cdi_cumulative_daily_returns.resample('M').last().pct_change().dropna()
-
-# Calculate returns for the first month (missing previously)
-cdi_month_opening = cdi_cumulative_daily_returns.resample('M').first()
-first_month_cdi_returns = (cdi_month_closing.iloc[0] - cdi_month_opening.iloc[0]) / cdi_month_opening.iloc[0]
+resamples = None
+while resamples is None:
+    resamples_input = input('Number of bootstrap resamples for confidence intervals of the CAGR, sharpe ratio and max. drawdown (e.g. 5000), or press Enter to skip: ').strip()
+    try:
+        resamples = int(resamples_input) if resamples_input else 0
+        if resamples < 0:
+            raise ValueError
+    except ValueError:
+        print('Invalid input. Please enter a positive integer.')
+        resamples = None
 
 #
-# IBOV
+# Data
 #
 
-# Download historical data for the Bovespa index (^BVSP)
-ibov_data = yf.download('^BVSP', start=start_date)
-ibov = ibov_data['Adj Close']
+from financialmarket import analyses, charts, data
+from financialmarket.cdi import CDIIndex
 
-# Convert the index to datetime and sort the data by date in ascending order for all DataFrames
-ibov.index = pd.to_datetime(ibov.index)
-ibov = ibov.sort_index(ascending=True)
+# CDI accumulation index, only downloading the rates it doesn't have yet
+cdi_index = CDIIndex()
+cdi_index.update(start_date)
 
-ibov_month_closing = ibov.resample('M').last()
-ibov_returns = ibov.resample('M').last().pct_change().dropna()
-
-# Calculate returns for the first month (missing previously)
-ibov_month_opening = ibov.resample('M').first()
-first_month_ibov_returns = (ibov_month_closing.iloc[0] - ibov_month_opening.iloc[0]) / ibov_month_opening.iloc[0]
+# Download historical data for the Bovespa index (^BVSP)
+ibov = data.download_prices(['^BVSP'], start_date)['^BVSP']
 
 #
 # Model
 #
 
-returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Last Month Perf. Method'], index=ibov_returns.index)
-returns['CDI'] = cdi_returns
-returns['IBOV'] = ibov_returns
+# Monthly returns of CDI, IBOV and the method (deflated by the IPCA if real returns were selected)
+results = analyses.lmp_method(ibov, cdi_index, real=returns_type == 'real')
 
-choices = pd.DataFrame(columns=['Last Month Perf. Method'], index=ibov_returns.index)
+# 95% confidence intervals from stationary bootstrap resamples of the monthly returns
+if resamples:
+    from financialmarket import bootstrap
 
-for index, date in enumerate(ibov_returns.index):
-    if index < len(ibov_returns.index):
-        if index > 0:
-            if ibov_returns.iloc[index - 1] > cdi_returns.iloc[index - 1]:
-                lm_returns = ibov_returns.iloc[index]
-                lm_choice = 'IBOV'
-            else:
-                lm_returns = cdi_returns.iloc[index]
-                lm_choice = 'CDI'
-        else:
-            if first_month_ibov_returns > first_month_cdi_returns:
-                lm_returns = ibov_returns.iloc[index]
-                lm_choice = 'IBOV'
-            else:
-                lm_returns = cdi_returns.iloc[index]
-                lm_choice = 'CDI'
-
-        returns.loc[date, 'Last Month Perf. Method'] = lm_returns
-        choices.loc[date, 'Last Month Perf. Method'] = lm_choice
-
-cumulative_returns = (1 + returns).cumprod() - 1
+    intervals = bootstrap.bootstrap(results['returns'], 12, resamples)
+    for (series, statistic), row in intervals.iterrows():
+        number_format = '.2f' if statistic == 'sharpe_ratio' else '.2%'
+        print(f'{series} {statistic.replace("_", " ")}: {row["estimate"]:{number_format}} (95% interval {row["lower"]:{number_format}} to {row["upper"]:{number_format}})')
 
 #
 # Graph
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-performance, axes = plt.subplots(figsize=(14, 8))
-
-axes.plot(cumulative_returns['CDI'], label='CDI')
-axes.plot(cumulative_returns['IBOV'], label='IBOV')
-axes.plot(cumulative_returns['Last Month Perf. Method'], label='Last Month Perf. Method')
-
-axes.yaxis.set_major_formatter(ticker.PercentFormatter(1.0))
-plt.xlabel('Time')
-plt.ylabel('Performance')
-axes.set_title('Performance x Time')
-plt.legend(title=f'LMP current investment: {choices["Last Month Perf. Method"].iloc[len(ibov_returns.index) - 1]}')
-
-# Add hover tooltips using mplcursors
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
-
-plt.show()
+figure = rendering.setup().figure(figsize=(14, 8))
+legend_title = f'LMP current investment: {results["current_choice"]}'
+charts.performance_chart(figure, results['cumulative_returns'], legend_title, 'Real Performance' if returns_type == 'real' else 'Performance')
+rendering.finish(figure)
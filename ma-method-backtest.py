@@ -1,12 +1,5 @@
-import logging
 from datetime import datetime, date
-from bcb import sgs
-import yfinance as yf
-import pandas_ta as ta
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import mplcursors
+from financialmarket import rendering
 
 #
 # Overview
@@ -17,15 +10,14 @@ print('The models reinvest the entirety of the hypothetical value on the first d
 print('- CDI (Certificado de Depósito Interbancário): CDI is an important interest rate benchmark in Brazil.')
 print('- IBOV (Ibovespa): IBOV is the benchmark stock index of the São Paulo Stock Exchange (B3).')
 print('- Moving Average Method: Invests in IBOV if the previous month\'s closing value was higher than the moving average. In CDI if not.')
+print('- Trend Following: The moving average method applied to each asset of a list of tickers, whose shares of the portfolio')
+print('  (equal or scaled by their volatility) are invested in the asset or in CDI. Universe holds all the assets with the same shares.')
 print('\n#----------------------------------------------------------------------------#\n')
 
 #
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -66,107 +58,70 @@ while ma_months is None:
         print('Invalid input. Please enter a positive integer for the moving average.')
         ma_months = None
 
-#
-# CDI
-#
-
-# Fetch historical CDI data
-cdi_data = sgs.get({'CDI': 11}, start=start_date)
-cdi_data = cdi_data['CDI']
-
-# Convert CDI rates to decimal form (dividing by 100)
-cdi_daily_returns = cdi_data / 100
+asset_tickers = input('Specify the asset ticker symbols for trend following (comma-separated), or press Enter for IBOV: ').strip()
+weighting = 'equal'
+if asset_tickers:
+    weighting = input('Do you want equal shares or shares scaled by the volatility of each asset? (equal/volatility): ')
+    while weighting not in ['equal', 'volatility']:
+        weighting = input('Invalid input. Please enter "equal" or "volatility": ')
 
+returns_type = input('Do you want nominal returns or real returns (deflated by IPCA)? (nominal/real): ')
+while returns_type not in ['nominal', 'real']:
+    returns_type = input('Invalid input. Please enter "nominal" or "real": ')
 
-cdi_cumulative_daily_returns = (1 + cdi_daily_returns).cumprod()
-cdi_month_closing = cdi_cumulative_daily_returns.resample('ME').last()
-cdi_returns = cdi_cumulative_daily_returns.resample('ME').last().pct_change().dropna()
-
-# Calculate returns for the first month (missing with the previous method)
-cdi_month_opening = cdi_cumulative_daily_returns.resample('ME').first()
-first_month_cdi_returns = (cdi_month_closing.iloc[0] - cdi_month_opening.iloc[0]) / cdi_month_opening.iloc[0]
+resamples = None
+while resamples is None:
+    resamples_input = input('Number of bootstrap resamples for confidence intervals of the CAGR, sharpe ratio and max. drawdown (e.g. 5000), or press Enter to skip: ').strip()
+    try:
+        resamples = int(resamples_input) if resamples_input else 0
+        if resamples < 0:
+            raise ValueError
+    except ValueError:
+        print('Invalid input. Please enter a positive integer.')
+        resamples = None
 
 #
-# IBOV
+# Data
 #
 
-# Download historical data for the Bovespa index (^BVSP)
-ibov_data = yf.download('^BVSP', start=start_date)
-ibov = ibov_data['Adj Close']
-
-# Calculate moving averages
-ibov_ma = ta.sma(ibov_data['Close'], ma_months * 21) # Average of 21 working days / month
-
-# Convert the index to datetime and sort the data by date in ascending order for all DataFrames
-ibov.index = pd.to_datetime(ibov.index)
-ibov = ibov.sort_index(ascending=True)
-ibov_ma.index = pd.to_datetime(ibov_ma.index)
-ibov_ma = ibov_ma.sort_index(ascending=True)
-
-ibov_month_closing = ibov.resample('ME').last()
-ibov_ma_month_closing = ibov_ma.resample('ME').last()
-ibov_returns = ibov.resample('ME').last().pct_change().dropna()
+from financialmarket import analyses, charts, data
+from financialmarket.cdi import CDIIndex
 
-print(ibov_returns)
+# CDI accumulation index, only downloading the rates it doesn't have yet
+cdi_index = CDIIndex()
+cdi_index.update(start_date)
 
-# Calculate returns for the first month (missing previously)
-ibov_month_opening = ibov.resample('ME').first()
-first_month_ibov_returns = (ibov_month_closing.iloc[0] - ibov_month_opening.iloc[0]) / ibov_month_opening.iloc[0]
+# Download historical data for the assets, or for the Bovespa index (^BVSP)
+if asset_tickers:
+    assets = data.download_prices([ticker.strip() for ticker in asset_tickers.split(',')], start_date)
+else:
+    ibov = data.download_prices(['^BVSP'], start_date)['^BVSP']
 
 #
 # Model
 #
 
-returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Moving Average Method'], index=ibov_returns.index)
-returns['CDI'] = cdi_returns
-returns['IBOV'] = ibov_returns
+# Monthly returns of CDI, IBOV (or the assets) and the method (deflated by the IPCA if real returns were selected)
+if asset_tickers:
+    results = analyses.trend_following(assets, cdi_index, ma_months, weighting, real=returns_type == 'real')
+    legend_title = f'Invested in {len(results["current_choice"])} of {len(assets.columns)} assets: {", ".join(results["current_choice"])}'
+else:
+    results = analyses.ma_method(ibov, cdi_index, ma_months, real=returns_type == 'real')
+    legend_title = f'MA current investment: {results["current_choice"]}'
 
-choices = pd.DataFrame(columns=['Moving Average Method'], index=ibov_returns.index)
+# 95% confidence intervals from stationary bootstrap resamples of the monthly returns
+if resamples:
+    from financialmarket import bootstrap
 
-for index, date in enumerate(ibov_returns.index):
-    if index < len(ibov_returns.index):
-        if index > ma_months - 1:
-            if ibov_month_closing.iloc[index] > ibov_ma_month_closing.iloc[index]:
-                ma_returns = ibov_returns.iloc[index]
-                ma_choice = 'IBOV'
-            else:
-                ma_returns = cdi_returns.iloc[index]
-                ma_choice = 'CDI'
-        else:
-            # For the first months, determine the 'Moving Average Method' as the CDI because of lack of data
-            ma_returns = cdi_returns.iloc[index]
-            ma_choice = 'CDI'
-
-        returns.loc[date, 'Moving Average Method'] = ma_returns
-        choices.loc[date, 'Moving Average Method'] = ma_choice
-
-cumulative_returns = (1 + returns).cumprod() - 1
+    intervals = bootstrap.bootstrap(results['returns'], 12, resamples)
+    for (series, statistic), row in intervals.iterrows():
+        number_format = '.2f' if statistic == 'sharpe_ratio' else '.2%'
+        print(f'{series} {statistic.replace("_", " ")}: {row["estimate"]:{number_format}} (95% interval {row["lower"]:{number_format}} to {row["upper"]:{number_format}})')
 
 #
 # Graph
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-performance, axes = plt.subplots(figsize=(14, 8))
-
-axes.plot(cumulative_returns['CDI'], label='CDI')
-axes.plot(cumulative_returns['IBOV'], label='IBOV')
-axes.plot(cumulative_returns['Moving Average Method'], label='Moving Average Method')
-
-axes.yaxis.set_major_formatter(ticker.PercentFormatter(1.0))
-plt.xlabel('Time')
-plt.ylabel('Performance')
-axes.set_title('Performance x Time')
-plt.legend(title=f'MA current investment: {choices["Moving Average Method"].iloc[len(ibov_returns.index) - 1]}')
-
-# Add hover tooltips using mplcursors
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
-
-plt.show()
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.performance_chart(figure, results['cumulative_returns'], legend_title, 'Real Performance' if returns_type == 'real' else 'Performance')
+rendering.finish(figure)
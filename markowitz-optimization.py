@@ -1,12 +1,6 @@
-import logging
+import os
 from datetime import datetime, date
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from scipy import optimize
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mplticker
-import mplcursors
+from financialmarket import rendering
 
 #
 # Overview
@@ -18,15 +12,15 @@ print('It generates the portfolio weights according to the specified constrains.
 print('- Sharpe Ratio: Highest relation return/risk.')
 print('- Return: Lowest risk for a specified expected return.')
 print('- Risk: Highest return for a specified (or lower) volatility (risk).')
+print('- HRP: Hierarchical Risk Parity, splits the weights between clusters of correlated assets by their variance.')
+print('- ERC: Equal Risk Contributions, every asset adds the same risk to the portfolio.')
+print('The optimization goals can take a constraints file with weight bounds, group, exposure and turnover limits.')
 print('\n#----------------------------------------------------------------------------#\n')
 
 #
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -46,35 +40,26 @@ def validate_date(input_date):
         return False
 
 def validate_assets(asset_inputs, start_date):
-    assets = {}
-    asset_tickers = asset_inputs.split(',')
+    # The data libraries are only imported once they're needed, after the start date is known
+    import pandas as pd
+    from financialmarket import data
+
+    asset_tickers = [ticker.strip() for ticker in asset_inputs.split(',')]
 
     # Check if the input is more than one asset
     if len(asset_tickers) == 1:
         print('Error: Please enter at least two valid asset ticker symbols.')
         return pd.DataFrame()
 
+    # Download the adjusted closes of the tickers
+    assets_df = data.download_prices(asset_tickers, start_date)
     for ticker in asset_tickers:
-        # Remove leading/trailing spaces
-        ticker = ticker.strip()
-        # Download asset data using yfinance
-        asset_data = yf.download(ticker, start_date, auto_adjust=False)['Adj Close']
-        if not asset_data.empty:
-            # Convert DataFrame to Series
-            assets[ticker] = asset_data.squeeze()
-        else:
+        if ticker not in assets_df.columns:
             print(f"Error: No data found for ticker '{ticker}'.")
             return pd.DataFrame()
 
-    if not assets:
-        print("Error: No valid assets found. Please enter at least two valid asset ticker symbol.")
-        return pd.DataFrame()
-
-    # Convert the dictionary to a DataFrame
-    assets_df = pd.DataFrame(assets)
-
     # Drop rows with missing values to ensure data for all dates
-    assets_df.dropna(inplace=True)
+    assets_df = assets_df.dropna()
 
     if assets_df.empty:
         print("Error: No overlapping data found for the selected assets. Please choose different tickers or a different date range.")
@@ -95,42 +80,32 @@ while asset_tickers is None:
     if assets.empty:
         asset_tickers = None
 
-log_returns = np.log(assets / assets.shift(1))
-
-# Calculate the annualized mean of log returns and its covariance matrix
-log_mean = log_returns.mean() * 252
-covariance = log_returns.cov() * 252
-
-# Define the bounds for portfolio weights (between 0 and 1)
-bounds = [(0, 1)] * len(assets.columns)
-
-# Define an initial guess for portfolio weights (equal weights)
-initial_guess = [(1 / len(assets.columns))] * len(assets.columns)
-
-# Define an initial constraint that ensures the sum of weights equals 1
-constraints = [{'type':'eq','fun':lambda weights: np.sum(weights) - 1}]
-
-def metrics(weights):
-    weights = np.array(weights)
-    returns = log_mean.dot(weights)
-    volatility = np.sqrt(weights.T.dot(covariance.dot(weights)))
-    sharpe_ratio = returns / volatility
-    return [returns, volatility, sharpe_ratio]
-
-# Calculate weights and returns for the optimizations and input filtering
-maximum_return_weights = optimize.minimize(lambda weights: metrics(weights)[0] * -1, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-maximum_return = metrics(maximum_return_weights)[0]
-
-minimum_risk_weights = optimize.minimize(lambda weights: metrics(weights)[1], initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-minimum_risk = metrics(minimum_risk_weights)[1]
-minimum_risk_return = metrics(minimum_risk_weights)[0]
-
-maximum_risk_weights = optimize.minimize(lambda weights: metrics(weights)[1] * -1, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-maximum_risk = metrics(maximum_risk_weights)[1]
-
-calculation_type = input('Choose the optimization goal ("sharpe", "risk" or "return"): ')
-while calculation_type not in ['sharpe', 'risk', 'return']:
-    calculation_type = input('Invalid input. Please enter either "sharpe", "risk" or "return": ')
+from financialmarket import analyses, optimization
+
+calculation_type = input('Choose the optimization goal ("sharpe", "risk" or "return") or a risk parity allocation ("hrp" for hierarchical risk parity, "erc" for equal risk contributions): ')
+while calculation_type not in ['sharpe', 'risk', 'return', 'hrp', 'erc']:
+    calculation_type = input('Invalid input. Please enter either "sharpe", "risk", "return", "hrp" or "erc": ')
+
+# Calculate the attainable risk and return ranges for input filtering, under the optional weight
+# bounds, group limits, exposure and turnover limits of the optimization goals
+log_mean, covariance = analyses.annualized_log_returns(assets)
+constraints_path = ''
+limits = None
+while limits is None:
+    if calculation_type not in analyses.ALLOCATORS:
+        constraints_path = input('Constraints file (JSON, see the README), or press Enter for long only weights: ').strip()
+        if constraints_path and not os.path.exists(constraints_path):
+            print(f'Error: File {constraints_path} not found.')
+            continue
+    try:
+        constraints = optimization.load_constraints(constraints_path) if constraints_path else None
+        limits = analyses.markowitz_limits(log_mean, covariance, constraints)
+    except (ValueError, KeyError) as error:
+        print(f'Invalid constraints: {error}')
+maximum_return = limits['maximum_return']
+minimum_risk = limits['minimum_risk']
+minimum_risk_return = limits['minimum_risk_return']
+maximum_risk = limits['maximum_risk']
 
 if calculation_type == 'risk':
     while True:
@@ -158,76 +133,16 @@ if calculation_type == 'return':
 # Optimization
 #
 
-# Use the minimize function to find optimal weights that maximize Sharpe ratio (minimize sharpe_ratio * -1)
-sharpe_ratio_optimal_weights = optimize.minimize(lambda weights: metrics(weights)[2] * -1, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-
-if calculation_type == 'risk':
-    # Find optimal weights that maximize return (minimize return * -1)
-    constraints.append({'type': 'ineq', 'fun': lambda weights: risk_tolerance - metrics(weights)[1]})
-    optimal_weights = optimize.minimize(lambda weights: metrics(weights)[0] * -1, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-
-
-elif calculation_type == 'return':
-    # Find optimal weights that minimize risk
-    constraints.append({'type': 'eq', 'fun': lambda weights: metrics(weights)[0] - expected_return})
-    optimal_weights = optimize.minimize(lambda weights: metrics(weights)[1], initial_guess, method='SLSQP', bounds=bounds, constraints=constraints).x
-
-#
-# Efficient Frontier
-#
-
-# Generate a range of target returns
-target_returns = np.linspace(minimum_risk_return, maximum_return, 100)
-
-efficient_frontier_volatility = []
-efficient_frontier_return = []
-
-# Calculate the efficient frontier
-for target_return in target_returns:
-    # Optimize for minimum volatility given the target return
-    constraints = [
-        {'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1},
-        {'type': 'eq', 'fun': lambda weights: metrics(weights)[0] - target_return}
-    ]
-    result = optimize.minimize(lambda weights: metrics(weights)[1], initial_guess, method='SLSQP', bounds=bounds, constraints=constraints)
-
-    efficient_frontier_volatility.append(result.fun)
-    efficient_frontier_return.append(target_return)
+# Find the optimal weights for the chosen goal (or the risk parity weights, and the highest sharpe ratio ones) and calculate the efficient frontier
+target = risk_tolerance if calculation_type == 'risk' else expected_return if calculation_type == 'return' else None
+results = analyses.markowitz(assets, calculation_type, target, limits, constraints=constraints)
 
 #
 # Graph
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-markowitz_optimization, axes = plt.subplots(figsize=(14, 8))
-
-axes.plot(efficient_frontier_volatility, efficient_frontier_return, label='Efficient Frontier')
-
-if calculation_type == 'sharpe':
-    optimal_weights = sharpe_ratio_optimal_weights
-    axes.scatter(metrics(optimal_weights)[1], metrics(optimal_weights)[0], marker='o', label='Optimal Portfolio')
-else:
-    axes.scatter(metrics(sharpe_ratio_optimal_weights)[1], metrics(sharpe_ratio_optimal_weights)[0], marker='o', label='Max. Sharpe Ratio')
-    axes.scatter(metrics(optimal_weights)[1], metrics(optimal_weights)[0], marker='o', label='Optimal Portfolio')
-
-axes.xaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
-axes.yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
-plt.xlabel('Volatility')
-plt.ylabel('Return')
-axes.set_title('Anual Expected Return x Volatility')
-
-legend_text = '\n'.join([f'{metric}: {metrics(optimal_weights)[i]:.2%}' for i, metric in enumerate(['Expected Return','Volatility','Sharpe Ratio'])]) + '\n\n'
-legend_text = legend_text + '\n'.join([f'{asset}\'s weight: {i:.2%}' for asset, i in zip(assets.columns.tolist(), optimal_weights)]) + '\n'
-plt.legend(title=f'{legend_text}')
-
-# Enable cursor interaction on the graph
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
+from financialmarket import charts
 
-plt.show()
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.markowitz_chart(figure, results, calculation_type)
+rendering.finish(figure)
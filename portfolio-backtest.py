@@ -1,10 +1,5 @@
-import logging
 from datetime import datetime, date
-import yfinance as yf
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mplticker
-import mplcursors
-import pandas as pd
+from financialmarket import rendering
 
 #
 # Overview
@@ -22,9 +17,6 @@ print('\n#----------------------------------------------------------------------
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -42,17 +34,12 @@ def validate_date(input_date):
         return False
 
 def validate_assets(asset_inputs, start_date):
-    assets = {}
-    asset_tickers = asset_inputs.split(',')
-    for ticker in asset_tickers:
-        # Remove leading/trailing spaces
-        ticker = ticker.strip() 
-        # Download asset data using yfinance
-        asset_data = yf.download(ticker, start_date)['Adj Close']
-        if len(asset_data) > 0:
-            # Store asset data if successfully downloaded
-            assets[ticker] = asset_data
-    return assets
+    # Download the adjusted closes of the tickers, keeping only the ones with data (the data
+    # libraries are only imported once they're needed, after the start date is known)
+    from financialmarket import data
+
+    asset_tickers = [ticker.strip() for ticker in asset_inputs.split(',')]
+    return data.download_prices(asset_tickers, start_date)
 
 def clear_weights(asset_weights, assets):
     asset_weights.clear()
@@ -71,10 +58,15 @@ asset_tickers = None
 while asset_tickers is None:
     asset_tickers = input('Specify the asset ticker symbols (comma-separated): ')
     assets = validate_assets(asset_tickers, start_date)
-    if not assets:
+    if assets.empty:
         print('No valid assets found. Please enter at least one valid asset ticker symbol.')
         asset_tickers = None
 
+# Assets quoted in other currencies can be converted to BRL
+from financialmarket import currencies
+
+assets = currencies.prompt_conversion(assets)
+
 asset_weights = {}
 total_weight = clear_weights(asset_weights, assets)
 while total_weight != 100:
@@ -94,62 +86,57 @@ while total_weight != 100:
         print(f'Total weight is {total_weight}, but it should be 100. Please re-enter the weights.')
         total_weight = clear_weights(asset_weights, assets)
 
-#
-# Calculate Cumulative Returns
-#
-
-# Align all assets data by reindexing them to the same dates
-all_dates = pd.date_range(start=min([data.index.min() for data in assets.values()]), end=date.today())
-aligned_assets = {ticker: data.reindex(all_dates).ffill() for ticker, data in assets.items()}
-
-# Calculate cumulative returns for each asset
-asset_cumulative_returns = {}
-for ticker, data in aligned_assets.items():
-    # Calculate daily returns
-    daily_returns = data.pct_change().fillna(0)
-    # Create a mask for the period the asset exists
-    asset_exists_mask = data.notna().astype(float)
-    # Calculate weighted daily returns
-    weighted_returns = daily_returns * (asset_weights[ticker] / 100) * asset_exists_mask
-    # Calculate cumulative returns
-    asset_cumulative_returns[ticker] = (1 + daily_returns).cumprod() - 1
-
-# Calculate cumulative returns for the portfolio
-portfolio_returns = sum([data.pct_change().fillna(0) * (asset_weights[ticker] / 100) * data.notna().astype(float) for ticker, data in aligned_assets.items()])
-cumulative_portfolio_returns = (1 + portfolio_returns).cumprod() - 1
+threshold = None
+while threshold is None:
+    threshold_input = input('Rebalancing threshold (percentage points a weight can drift from its target before the portfolio is rebalanced, e.g. 5), or press Enter to keep the weights constant: ').strip()
+    try:
+        threshold = float(threshold_input) / 100 if threshold_input else 0
+        if threshold < 0:
+            raise ValueError
+    except ValueError:
+        print('Invalid input. Please enter a non-negative number.')
+        threshold = None
+
+returns_type = input('Do you want nominal returns or real returns (deflated by IPCA)? (nominal/real): ')
+while returns_type not in ['nominal', 'real']:
+    returns_type = input('Invalid input. Please enter "nominal" or "real": ')
+
+resamples = None
+while resamples is None:
+    resamples_input = input('Number of bootstrap resamples for confidence intervals of the CAGR, sharpe ratio and max. drawdown (e.g. 5000), or press Enter to skip: ').strip()
+    try:
+        resamples = int(resamples_input) if resamples_input else 0
+        if resamples < 0:
+            raise ValueError
+    except ValueError:
+        print('Invalid input. Please enter a positive integer.')
+        resamples = None
 
 #
-# Graph
+# Calculate Cumulative Returns
 #
 
-plt.style.use('./mplstyles/financialgraphs.mplstyle')
-
-# Plot the cumulative returns
-plt.figure(figsize=(14, 8))
+from financialmarket import analyses, charts
 
-# Plot portfolio cumulative returns
-plt.plot(cumulative_portfolio_returns.index, cumulative_portfolio_returns, label='Portfolio', linewidth=2)
+# Calculate the cumulative returns of each asset and of the portfolio (deflated by the IPCA if real returns were selected)
+results = analyses.portfolio_backtest(assets, asset_weights, real=returns_type == 'real', threshold=threshold or None)
+if threshold:
+    print(f'The portfolio was rebalanced {len(results["rebalances"])} times.')
 
-# Plot cumulative returns for each asset
-for ticker, cum_returns in asset_cumulative_returns.items():
-    plt.plot(cum_returns.index, cum_returns, label=f'{ticker}', alpha=0.3)
+# 95% confidence intervals from stationary bootstrap resamples of the daily returns
+if resamples:
+    from financialmarket import bootstrap
 
-plt.xlabel('Date')
-plt.ylabel('Returns')
-plt.title('Portfolio and Asset Cumulative Returns Over Time')
-plt.legend()
+    intervals = bootstrap.bootstrap(results['portfolio_returns'].to_frame('Portfolio'), 252, resamples)
+    for (series, statistic), row in intervals.iterrows():
+        number_format = '.2f' if statistic == 'sharpe_ratio' else '.2%'
+        print(f'{series} {statistic.replace("_", " ")}: {row["estimate"]:{number_format}} (95% interval {row["lower"]:{number_format}} to {row["upper"]:{number_format}})')
 
-# Format y-axis tick labels as percentages
-plt.gca().yaxis.set_major_formatter(mplticker.PercentFormatter(1.0))
-
-# Enable cursor interaction on the graph
-cursor = mplcursors.cursor()
-@cursor.connect("add")
-def on_add(sel):
-    sel.annotation.get_bbox_patch().set(fc='gray', alpha=0.8)
-    sel.annotation.get_bbox_patch().set_edgecolor('gray')
-    sel.annotation.arrow_patch.set_color('white')
-    sel.annotation.arrow_patch.set_arrowstyle('-')
+#
+# Graph
+#
 
-# Show the plot
-plt.show()
+# Plot the cumulative returns of the portfolio and of each asset
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.portfolio_chart(figure, results['cumulative_portfolio_returns'], results['asset_cumulative_returns'], 'Real Returns' if returns_type == 'real' else 'Returns')
+rendering.finish(figure)
@@ -0,0 +1,107 @@
+from datetime import datetime, date
+from financialmarket import rendering
+
+#
+# Overview
+#
+
+print('\n#----------------------------- Program Overview -----------------------------#\n')
+print('This program stress tests a given portfolio with historical scenarios and hypothetical shocks.')
+print('It replays windows such as the 2008 crisis and the March 2020 crash on the portfolio, applies shocks to its assets')
+print('and plots the portfolio return in each scenario. The scenarios are in data/stress-scenarios.json.')
+print('\n#----------------------------------------------------------------------------#\n')
+
+#
+# Inputs
+#
+
+def validate_date(input_date):
+    try:
+        # Check if the input matches the desired format (YYYY-MM-DD)
+        parsed_date = datetime.strptime(input_date, '%Y-%m-%d')
+        year, month, day = map(str, input_date.split('-'))
+        if len(year) == 4 and len(month) == 2 and len(day) == 2:
+            if parsed_date.date() < date.today():
+                return True
+            else:
+                print('The start date should be before today\'s date.')
+                return False
+        else:
+            return False
+    except:
+        return False
+
+def validate_assets(asset_inputs, start_date):
+    # Download the adjusted closes of the tickers, keeping only the ones with data (the data
+    # libraries are only imported once they're needed, after the start date is known)
+    from financialmarket import data
+
+    asset_tickers = [ticker.strip() for ticker in asset_inputs.split(',')]
+    return data.download_prices(asset_tickers, start_date)
+
+start_date = None
+while start_date is None:
+    start_date = input('Please input the start date of the price history, before the first scenario (YYYY-MM-DD, e.g. 2008-01-01): ')
+    if not validate_date(start_date):
+        print('Invalid date. Please use YYYY-MM-DD format.')
+        start_date = None
+
+asset_tickers = None
+while asset_tickers is None:
+    asset_tickers = input('Specify the asset ticker symbols (comma-separated): ')
+    assets = validate_assets(asset_tickers, start_date)
+    if assets.empty:
+        print('No valid assets found. Please enter at least one valid asset ticker symbol.')
+        asset_tickers = None
+
+# Gather the asset weights of the portfolio
+asset_weights = {}
+while True:
+    total_weight = 0
+    for ticker in assets.keys():
+        while True:
+            try:
+                weight = float(input(f'Enter the weight (as a percentage) of asset {ticker} in the portfolio: '))
+                if weight < 0 or weight > 100:
+                    print('Invalid weight. Please enter a value between 0 and 100.')
+                else:
+                    asset_weights[ticker] = weight
+                    total_weight += weight
+                    break
+            except ValueError:
+                print('Invalid input. Please enter a valid number.')
+
+    if total_weight != 100:
+        print(f'Total weight is {total_weight}, but it should be 100. Please re-enter the weights.')
+    else:
+        break
+
+#
+# Stress test
+#
+
+from financialmarket import analyses
+
+# Return of the portfolio in each scenario and its lowest return within each historical window
+results = analyses.stress_test(assets, asset_weights)
+returns, worst, coverage = results['returns']['Portfolio'], results['worst']['Portfolio'], results['coverage']['Portfolio']
+for scenario, scenario_return in returns.items():
+    if coverage[scenario] == 0:
+        print(f'- {scenario}: no prices for the portfolio\'s assets in this window.')
+        continue
+    text = f'- {scenario}: {scenario_return:.2%}'
+    if scenario in worst.index:
+        text += f' (lowest within the window: {worst[scenario]:.2%})'
+    if coverage[scenario] < 1:
+        text += f', only {coverage[scenario]:.0%} of the portfolio has prices in this window'
+    print(text)
+
+#
+# Graph
+#
+
+from financialmarket import charts
+
+figure = rendering.setup().figure(figsize=(14, 8))
+charts.stress_chart(figure, returns, worst)
+rendering.finish(figure)
@@ -0,0 +1,84 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from financialmarket import analyses
+from financialmarket.cdi import CDIIndex
+from financialmarket.providers import SyntheticProvider
+
+#
+# Data
+#
+
+@pytest.fixture(scope='module')
+def rates():
+    # Daily synthetic CDI rates (in percent) up to today, as the index is updated up to the last published rate
+    return SyntheticProvider(seed=5).sgs({'CDI': 11}, '1995-01-01')['CDI']
+
+def downloader(rates, calls=None):
+    def download(start_date):
+        if calls is not None:
+            calls.append(start_date)
+        return rates[rates.index >= pd.Timestamp(start_date)]
+    return download
+
+def assert_same_monthly_returns(index, rates, start_date):
+    returns, first_month_returns = index.monthly_returns(start_date)
+    expected, expected_first_month_returns = analyses.cdi_monthly_returns(rates, pd.Timestamp(start_date))
+    pd.testing.assert_series_equal(returns, expected, check_freq=False, check_names=False, check_index_type=False, rtol=1e-10)
+    assert first_month_returns == pytest.approx(expected_first_month_returns, rel=1e-10)
+
+#
+# Monthly returns
+#
+
+@pytest.mark.parametrize('start_date', ['2010-01-01', '2015-03-17', '2020-02-29'])
+def test_monthly_returns_match_compounded_rates(tmp_path, rates, start_date):
+    index = CDIIndex(str(tmp_path / 'cdi-index.npz'), download=downloader(rates))
+    index.update(start_date)
+    assert_same_monthly_returns(index, rates, start_date)
+
+def test_monthly_returns_after_back_extension_and_reload(tmp_path, rates):
+    path = str(tmp_path / 'cdi-index.npz')
+    calls = []
+    index = CDIIndex(path, download=downloader(rates, calls))
+    assert index.update('2018-06-15') > 0
+    assert index.update('2018-06-15') == 0
+
+    # An earlier start date downloads the earlier rates only, and rescales the ones already there
+    added = index.update('2012-01-01')
+    assert added == ((rates.index >= '2012-01-01') & (rates.index < '2018-06-15')).sum()
+    assert calls == ['2018-06-15', '2012-01-01']
+    for start_date in ['2012-01-01', '2016-05-10', '2018-06-15', '2021-12-31']:
+        assert_same_monthly_returns(index, rates, start_date)
+
+    reloaded = CDIIndex(path, download=downloader(rates, calls))
+    np.testing.assert_array_equal(reloaded.dates, index.dates)
+    np.testing.assert_array_equal(reloaded.factors, index.factors)
+    assert reloaded.update('2013-01-01') == 0
+    assert len(calls) == 2
+    assert_same_monthly_returns(reloaded, rates, '2013-01-01')
+
+#
+# Concurrent updates
+#
+
+def test_concurrent_updates(tmp_path, rates):
+    # Indexes on the same file updated from several threads at once (as the service's worker threads
+    # do) leave a single complete index, and no temporary files
+    path = str(tmp_path / 'cdi-index.npz')
+    start_dates = ['2010-01-01', '2014-01-01', '2008-01-01', '2019-01-01'] * 4
+    indexes = [CDIIndex(path, download=downloader(rates)) for _ in start_dates]
+    threads = [threading.Thread(target=index.update, args=(start_date,)) for index, start_date in zip(indexes, start_dates)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path) == ['cdi-index.npz']
+    reloaded = CDIIndex(path, download=downloader(rates))
+    assert reloaded.first_date == rates.index[rates.index >= '2008-01-01'][0]
+    assert_same_monthly_returns(reloaded, rates, '2008-01-01')
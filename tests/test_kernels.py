@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from financialmarket import analyses, kernels
+from financialmarket.providers import SyntheticProvider
+
+#
+# Kernels
+#
+
+# Each kernel's loop (the one numba compiles) against its NumPy fallback, and the kernel itself
+# (compiled when numba is installed) against the loop
+
+def assert_same_episodes(values):
+    expected = kernels.drawdown_episodes.loop(values)
+    for episodes in [kernels.drawdown_episodes.fallback(values), kernels.drawdown_episodes(values)]:
+        for result, expected_result in zip(episodes, expected):
+            np.testing.assert_array_equal(result, expected_result)
+
+def assert_same_rebalances(returns, target, threshold):
+    expected_returns, expected_rebalanced = kernels.threshold_rebalance.loop(returns, target, threshold)
+    for portfolio_returns, rebalanced in [kernels.threshold_rebalance.fallback(returns, target, threshold), kernels.threshold_rebalance(returns, target, threshold)]:
+        np.testing.assert_array_equal(rebalanced, expected_rebalanced)
+        np.testing.assert_allclose(portfolio_returns, expected_returns, rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize('values', [
+    [],
+    [1.0],
+    [1.0, 1.0, 1.0],
+    [1.0, 2.0, 3.0],
+    # Never recovered
+    [3.0, 2.0, 1.0],
+    [1.0, 2.0, 1.5, 1.8, 1.2],
+    # Recovered exactly at the peak, and ties between the lowest prices (the first is the trough)
+    [2.0, 1.0, 1.5, 1.0, 2.0, 1.0, 1.0, 3.0],
+    [5.0, 4.0, 5.0, 4.0, 5.0],
+])
+def test_drawdown_episodes_cases(values):
+    assert_same_episodes(np.array(values, dtype=float))
+
+def test_drawdown_episodes_random():
+    random = np.random.default_rng(0)
+    for _ in range(300):
+        # Rounded prices, so there are ties
+        values = np.round(np.exp(np.cumsum(random.normal(0, 0.02, random.integers(1, 400)))), 2)
+        assert_same_episodes(values)
+
+def test_drawdown_episodes_never_recovered():
+    peaks, troughs, recoveries, drawdowns = kernels.drawdown_episodes.fallback(np.array([1.0, 2.0, 1.5, 1.0, 1.2]))
+    assert list(peaks) == [1] and list(troughs) == [3] and list(recoveries) == [-1]
+    assert drawdowns[0] == pytest.approx(-0.5)
+
+@pytest.mark.parametrize('threshold', [0.0, 0.01, 0.05, 1.0])
+def test_threshold_rebalance_cases(threshold):
+    target = np.array([0.5, 0.3, 0.2])
+    assert_same_rebalances(np.zeros((0, 3)), target, threshold)
+    assert_same_rebalances(np.zeros((10, 3)), target, threshold)
+    # An asset without returns before its inception
+    returns = np.random.default_rng(1).normal(0.0005, 0.01, (200, 3))
+    returns[:50, 2] = 0.0
+    assert_same_rebalances(returns, target, threshold)
+    # A single asset never drifts
+    assert_same_rebalances(returns[:, :1], np.array([1.0]), threshold)
+
+def test_threshold_rebalance_random():
+    random = np.random.default_rng(2)
+    for _ in range(200):
+        assets = random.integers(1, 8)
+        returns = random.normal(0.0003, 0.01, (random.integers(1, 600), assets))
+        assert_same_rebalances(returns, random.dirichlet(np.ones(assets)), random.choice([0.0, 0.005, 0.02, 0.1]))
+
+#
+# Switching methods
+#
+
+# The month by month loops that ma_method and lmp_method replaced, as they were
+
+def reference_ma_method(prices, cdi, ma_months):
+    cdi_returns, first_month_cdi_returns = analyses.cdi_monthly_returns(cdi, prices.index.min())
+    prices = prices.sort_index()
+    ma = prices.rolling(ma_months * 21).mean()
+    month_closing = prices.resample('ME').last()
+    ma_month_closing = ma.resample('ME').last()
+    asset_returns, first_month_asset_returns = analyses.monthly_returns(prices)
+
+    returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Moving Average Method'], index=asset_returns.index)
+    returns['CDI'] = cdi_returns
+    returns['IBOV'] = asset_returns
+    choices = pd.DataFrame(columns=['Moving Average Method'], index=asset_returns.index)
+    for index, month in enumerate(asset_returns.index):
+        if index > ma_months - 1:
+            if month_closing.iloc[index] > ma_month_closing.iloc[index]:
+                ma_returns = asset_returns.iloc[index]
+                ma_choice = 'IBOV'
+            else:
+                ma_returns = cdi_returns.iloc[index]
+                ma_choice = 'CDI'
+        else:
+            ma_returns = cdi_returns.iloc[index]
+            ma_choice = 'CDI'
+        returns.loc[month, 'Moving Average Method'] = ma_returns
+        choices.loc[month, 'Moving Average Method'] = ma_choice
+    return analyses.method_results(returns.astype(float), choices['Moving Average Method'], False)
+
+def reference_lmp_method(prices, cdi):
+    cdi_returns, first_month_cdi_returns = analyses.cdi_monthly_returns(cdi, prices.index.min())
+    asset_returns, first_month_asset_returns = analyses.monthly_returns(prices.sort_index())
+
+    returns = pd.DataFrame(columns=['CDI', 'IBOV', 'Last Month Perf. Method'], index=asset_returns.index)
+    returns['CDI'] = cdi_returns
+    returns['IBOV'] = asset_returns
+    choices = pd.DataFrame(columns=['Last Month Perf. Method'], index=asset_returns.index)
+    for index, month in enumerate(asset_returns.index):
+        if index > 0:
+            if asset_returns.iloc[index - 1] > cdi_returns.iloc[index - 1]:
+                lm_returns = asset_returns.iloc[index]
+                lm_choice = 'IBOV'
+            else:
+                lm_returns = cdi_returns.iloc[index]
+                lm_choice = 'CDI'
+        else:
+            if first_month_asset_returns > first_month_cdi_returns:
+                lm_returns = asset_returns.iloc[index]
+                lm_choice = 'IBOV'
+            else:
+                lm_returns = cdi_returns.iloc[index]
+                lm_choice = 'CDI'
+        returns.loc[month, 'Last Month Perf. Method'] = lm_returns
+        choices.loc[month, 'Last Month Perf. Method'] = lm_choice
+    return analyses.method_results(returns.astype(float), choices['Last Month Perf. Method'], False)
+
+def assert_same_results(results, expected):
+    pd.testing.assert_frame_equal(results['returns'], expected['returns'])
+    pd.testing.assert_series_equal(results['choices'], expected['choices'])
+    assert results['current_choice'] == expected['current_choice']
+
+@pytest.fixture(scope='module')
+def synthetic_data():
+    provider = SyntheticProvider(seed=7, end_date='2024-06-28')
+    return provider.prices(['^BVSP'], '1995-01-01')['^BVSP'], provider.sgs({'CDI': 11}, '1995-01-01')['CDI']
+
+@pytest.mark.parametrize('start_date', ['2000-01-01', '2015-03-17', '2022-01-01'])
+@pytest.mark.parametrize('ma_months', [1, 6, 10, 24])
+def test_ma_method_matches_loop(synthetic_data, start_date, ma_months):
+    ibov, cdi = synthetic_data
+    prices = ibov[ibov.index >= start_date]
+    assert_same_results(analyses.ma_method(prices, cdi, ma_months), reference_ma_method(prices, cdi, ma_months))
+
+@pytest.mark.parametrize('start_date', ['2000-01-01', '2015-03-17', '2022-01-01'])
+def test_lmp_method_matches_loop(synthetic_data, start_date):
+    ibov, cdi = synthetic_data
+    prices = ibov[ibov.index >= start_date]
+    assert_same_results(analyses.lmp_method(prices, cdi), reference_lmp_method(prices, cdi))
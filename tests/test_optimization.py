@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from scipy import optimize, sparse
+
+from financialmarket import analyses, optimization, synthetic
+
+#
+# Data
+#
+
+@pytest.fixture(scope='module')
+def market():
+    prices = synthetic.gbm_prices(synthetic.tickers(8), synthetic.business_days(3), seed=3, staggered=False)
+    return analyses.annualized_log_returns(prices)
+
+def specifications(tickers):
+    return {
+        'default': {},
+        'bounds': {'bounds': {'default': [0.02, 0.3], tickers[0]: [0.1, 0.15]}},
+        'groups': {'groups': {'first': {'assets': tickers[:3], 'min': 0.4}, 'last': {'assets': tickers[-3:], 'max': 0.1}}},
+        'long short': {'bounds': {'default': [-0.3, 0.5]}, 'long': 1.3, 'short': 0.3},
+        'turnover': {'current': {tickers[0]: 0.5, tickers[1]: 0.5}, 'turnover': 0.4},
+        'everything': {
+            'bounds': {'default': [-0.2, 0.4]}, 'groups': {'first': {'assets': tickers[:4], 'max': 0.6}}, 'budget': 1,
+            'long': 1.2, 'short': 0.2, 'current': {ticker: 1 / len(tickers) for ticker in tickers}, 'turnover': 0.5,
+        },
+    }
+
+SPECIFICATIONS = ['default', 'bounds', 'groups', 'long short', 'turnover', 'everything']
+
+#
+# Reference solvers
+#
+
+def slsqp(P, q, A, lower, upper):
+    # The same program solved with SLSQP, from the constraint rows as dense inequalities and equalities
+    A = A.toarray()
+    equal = (upper - lower) < 1e-12
+    finite_upper, finite_lower = np.isfinite(upper) & ~equal, np.isfinite(lower) & ~equal
+    constraints = [
+        {'type': 'eq', 'fun': lambda x: A[equal] @ x - upper[equal], 'jac': lambda x: A[equal]},
+        {'type': 'ineq', 'fun': lambda x: upper[finite_upper] - A[finite_upper] @ x, 'jac': lambda x: -A[finite_upper]},
+        {'type': 'ineq', 'fun': lambda x: A[finite_lower] @ x - lower[finite_lower], 'jac': lambda x: A[finite_lower]},
+    ]
+    P = P.toarray()
+    result = optimize.minimize(lambda x: x @ P @ x / 2 + q @ x, np.zeros(len(q)), jac=lambda x: P @ x + q, constraints=constraints,
+                               method='SLSQP', options={'ftol': 1e-14, 'maxiter': 1000})
+    assert result.success, result.message
+    return result.x
+
+def assert_feasible(x, A, lower, upper, tolerance=1e-7):
+    rows = A @ x
+    assert np.all(rows >= lower - tolerance) and np.all(rows <= upper + tolerance)
+
+#
+# Quadratic programs
+#
+
+@pytest.mark.parametrize('name', SPECIFICATIONS)
+def test_minimum_variance_matches_slsqp(market, name):
+    log_mean, covariance = market
+    spec = specifications(list(log_mean.index))[name]
+    A, lower, upper, variables = optimization.linear_constraints(spec, log_mean.index)
+    P = optimization.objective(covariance, variables)
+
+    solution = optimization.solve_qp(P, np.zeros(variables), A, lower, upper)
+    expected = slsqp(P, np.zeros(variables), A, lower, upper)
+    assert_feasible(solution, A, lower, upper)
+    assert solution @ P @ solution == pytest.approx(expected @ P @ expected, rel=1e-6, abs=1e-12)
+    # The variance is strictly convex in the weights, so they are unique (the shorts and trades are
+    # not); the default tolerance (a duality gap of 1e-8) leaves them within about 1e-4
+    np.testing.assert_allclose(solution[:len(log_mean)], expected[:len(log_mean)], atol=1e-3)
+    tight = optimization.solve_qp(P, np.zeros(variables), A, lower, upper, tolerance=1e-11)
+    np.testing.assert_allclose(tight[:len(log_mean)], expected[:len(log_mean)], atol=1e-6)
+
+@pytest.mark.parametrize('name', SPECIFICATIONS)
+def test_minimum_variance_with_return_target_matches_slsqp(market, name):
+    log_mean, covariance = market
+    spec = specifications(list(log_mean.index))[name]
+    limits = optimization.constrained_limits(log_mean, covariance, spec)
+    target = (limits['minimum_risk_return'] + limits['maximum_return']) / 2
+    weights = optimization.minimum_variance(log_mean, covariance, spec, target)
+
+    A, lower, upper, variables = optimization.linear_constraints(spec, log_mean.index)
+    A = sparse.vstack([A, optimization.mean_row(log_mean, variables)], format='csc')
+    expected = slsqp(optimization.objective(covariance, variables), np.zeros(variables), A, np.append(lower, target), np.append(upper, np.inf))
+    assert log_mean.to_numpy() @ weights >= target - 1e-7
+    np.testing.assert_allclose(weights, expected[:len(log_mean)], atol=1e-3)
+
+@pytest.mark.parametrize('name', SPECIFICATIONS)
+def test_linear_program_matches_linprog(market, name):
+    # Without P the interior point method solves the linear program of the highest return
+    log_mean, covariance = market
+    spec = specifications(list(log_mean.index))[name]
+    A, lower, upper, variables = optimization.linear_constraints(spec, log_mean.index)
+    q = -optimization.mean_row(log_mean, variables)[0]
+
+    solution = optimization.solve_qp(np.zeros((variables, variables)), q, A, lower, upper)
+    expected = optimization.solve_lp(q, A, lower, upper)
+    assert_feasible(solution, A, lower, upper)
+    assert q @ solution == pytest.approx(q @ expected, rel=1e-6)
+
+@pytest.mark.parametrize('name', SPECIFICATIONS)
+def test_maximum_sharpe_matches_slsqp(market, name):
+    log_mean, covariance = market
+    spec = specifications(list(log_mean.index))[name]
+    weights = optimization.maximum_sharpe(log_mean, covariance, spec)
+    A, lower, upper, variables = optimization.linear_constraints(spec, log_mean.index)
+
+    # The highest sharpe ratio over the same constraints, with SLSQP from the minimum variance weights
+    covariance = covariance.to_numpy()
+    A = A.toarray()
+    equal = (upper - lower) < 1e-12
+    finite_upper, finite_lower = np.isfinite(upper) & ~equal, np.isfinite(lower) & ~equal
+    start = optimization.solve_qp(optimization.objective(covariance, variables), np.zeros(variables), A, lower, upper)
+    count = len(log_mean)
+    result = optimize.minimize(
+        lambda x: -(log_mean.to_numpy() @ x[:count]) / np.sqrt(x[:count] @ covariance @ x[:count]), start,
+        constraints=[
+            {'type': 'eq', 'fun': lambda x: A[equal] @ x - upper[equal]},
+            {'type': 'ineq', 'fun': lambda x: upper[finite_upper] - A[finite_upper] @ x},
+            {'type': 'ineq', 'fun': lambda x: A[finite_lower] @ x - lower[finite_lower]},
+        ], method='SLSQP', options={'ftol': 1e-14, 'maxiter': 1000},
+    )
+    assert result.success, result.message
+
+    def sharpe(x):
+        return log_mean.to_numpy() @ x / np.sqrt(x @ covariance @ x)
+
+    assert sharpe(weights) == pytest.approx(sharpe(result.x[:count]), rel=1e-5)
+    assert sharpe(weights) >= sharpe(result.x[:count]) - 1e-6
+
+@pytest.mark.parametrize('spec', [
+    # Minimum weights adding up to more than the budget
+    {'bounds': {'default': [0.2, 1]}},
+    # A group minimum above its assets' maximum weights
+    {'bounds': {'default': [0, 0.1]}, 'groups': {'first': {'assets': ['ASSET0001', 'ASSET0002'], 'min': 0.5}}},
+    # A turnover too small to reach the bounds from the current weights
+    {'bounds': {'default': [0, 0.2]}, 'current': {'ASSET0001': 1.0}, 'turnover': 0.5},
+])
+def test_infeasible_specification(market, spec):
+    log_mean, covariance = market
+    with pytest.raises(ValueError, match='did not converge'):
+        optimization.minimum_variance(log_mean, covariance, spec)
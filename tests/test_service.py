@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from financialmarket.service import AnalysisService, SeriesCache
+
+#
+# Fakes
+#
+
+# Local series instead of downloads, recording the calls made, so the service runs offline
+
+class FakeFetch:
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, key, start_date):
+        with self.lock:
+            self.calls.append((key, start_date))
+        dates = pd.bdate_range(start_date, '2024-06-28')
+        seed = sum(map(ord, str(key)))
+        return pd.Series(100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0.0003, 0.01, len(dates)))), index=dates)
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+#
+# Cache
+#
+
+def test_concurrent_requests_fetch_once():
+    fetch = FakeFetch()
+    cache = SeriesCache(fetch)
+
+    async def requests():
+        return await asyncio.gather(*[cache.get('PETR4.SA', '2020-01-01') for _ in range(10)])
+
+    results = asyncio.run(requests())
+    assert fetch.calls == [('PETR4.SA', '2020-01-01')]
+    for series in results:
+        pd.testing.assert_series_equal(series, results[0])
+    assert cache.stats() == {'entries': 1, 'downloads': 0, 'hits': 0, 'misses': 1}
+
+def test_least_recently_used_entries_are_evicted():
+    fetch = FakeFetch()
+    cache = SeriesCache(fetch, max_entries=2)
+
+    async def requests():
+        await cache.get('A', '2020-01-01')
+        await cache.get('B', '2020-01-01')
+        # A is used again, so B is the least recently used entry when C comes in
+        await cache.get('A', '2020-01-01')
+        await cache.get('C', '2020-01-01')
+        await cache.get('A', '2020-01-01')
+        await cache.get('B', '2020-01-01')
+
+    asyncio.run(requests())
+    assert [key for key, _ in fetch.calls] == ['A', 'B', 'C', 'B']
+    assert list(cache.entries) == ['A', 'B']
+
+def test_entries_are_refreshed_after_ttl():
+    fetch = FakeFetch()
+    clock = FakeClock()
+    cache = SeriesCache(fetch, ttl=60, clock=clock)
+
+    async def requests():
+        await cache.get('A', '2020-01-01')
+        clock.now = 60
+        await cache.get('A', '2020-01-01')
+        clock.now = 61
+        await cache.get('A', '2020-01-01')
+        clock.now = 100
+        await cache.get('A', '2020-01-01')
+
+    asyncio.run(requests())
+    assert len(fetch.calls) == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_zero_ttl_fetches_every_request():
+    fetch = FakeFetch()
+    clock = FakeClock()
+    cache = SeriesCache(fetch, ttl=0, clock=clock)
+
+    async def requests():
+        for _ in range(3):
+            clock.now += 1
+            assert len(await cache.get('A', '2020-01-01')) > 0
+
+    asyncio.run(requests())
+    assert len(fetch.calls) == 3
+
+def test_earlier_start_date_widens_the_entry():
+    fetch = FakeFetch()
+    cache = SeriesCache(fetch)
+
+    async def requests():
+        recent = await cache.get('A', '2022-01-01')
+        older = await cache.get('A', '2020-01-01')
+        # A later start date is served from the wider entry, which is never shrunk
+        latest = await cache.get('A', '2023-01-01')
+        return recent, older, latest
+
+    recent, older, latest = asyncio.run(requests())
+    assert fetch.calls == [('A', '2022-01-01'), ('A', '2020-01-01')]
+    assert older.index[0] == pd.Timestamp('2020-01-01')
+    assert recent.index[0] == pd.Timestamp('2022-01-03')
+    assert latest.index[0] == pd.Timestamp('2023-01-02')
+    assert cache.entries['A']['start'] == pd.Timestamp('2020-01-01')
+
+#
+# Service
+#
+
+def test_handle_drawdown_round_trip():
+    fetch = FakeFetch()
+    service = AnalysisService(fetch_price=fetch, fetch_sgs=FakeFetch(), fetch_currency=FakeFetch())
+    body = json.dumps({'start': '2020-01-01', 'tickers': ['PETR4.SA', 'VALE3.SA']}).encode()
+
+    async def requests():
+        posted = await service.handle('POST', '/drawdown', body)
+        queried = await service.handle('GET', '/drawdown?start=2020-01-01&tickers=PETR4.SA,VALE3.SA', b'')
+        return posted, queried, await service.handle('GET', '/stats', b'')
+
+    (status, content), queried, (stats_status, stats) = asyncio.run(requests())
+    assert status == 200 and queried == (status, content)
+    results = json.loads(content)
+    assert results['analysis'] == 'drawdown'
+    assert set(results['summary']['max_drawdowns']) == {'PETR4.SA', 'VALE3.SA'}
+    assert results['table']['columns'] == ['PETR4.SA', 'VALE3.SA']
+    assert sorted(fetch.calls) == [('PETR4.SA', '2020-01-01'), ('VALE3.SA', '2020-01-01')]
+    assert stats_status == 200 and json.loads(stats)['prices']['hits'] == 2
+
+@pytest.mark.parametrize('method, path, body, status', [
+    ('GET', '/unknown', b'', 404),
+    ('POST', '/drawdown', b'{"tickers": "PETR4.SA"}', 400),
+    ('GET', '/drawdown?start=2020-13-01&tickers=PETR4.SA', b'', 400),
+])
+def test_handle_errors(method, path, body, status):
+    service = AnalysisService(fetch_price=FakeFetch(), fetch_sgs=FakeFetch(), fetch_currency=FakeFetch())
+    result_status, content = asyncio.run(service.handle(method, path, body))
+    assert result_status == status
+    assert 'error' in json.loads(content)
+
+@pytest.mark.parametrize('length', ['-1', 'abc', '1.5'])
+def test_invalid_content_length(length):
+    service = AnalysisService(fetch_price=FakeFetch(), fetch_sgs=FakeFetch(), fetch_currency=FakeFetch())
+
+    async def request():
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(f'POST /drawdown HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode())
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+    response = asyncio.run(request()).decode()
+    assert response.startswith('HTTP/1.1 400 Bad Request')
+    assert 'Content-Length' in json.loads(response.split('\r\n\r\n', 1)[1])['error']
@@ -1,7 +1,4 @@
-import logging
 from datetime import datetime, date
-import yfinance as yf
-import numpy as np
 
 #
 # Overview
@@ -10,16 +7,13 @@ import numpy as np
 print('\n#----------------------------- Program Overview -----------------------------#\n')
 print('This program calculates the Value at Risk (VaR) for a given portfolio or assets using historical simulation.')
 print('You can choose to calculate VaR for individual assets or for a portfolio, informing the weights.')
-print('It then downloads historical data for the specified assets and calculates the VaR for a given confidence level.')
+print('It then downloads historical data for the specified assets and calculates the 1-day, 10-day and 1-month VaR for a given confidence level.')
 print('\n#----------------------------------------------------------------------------#\n')
 
 #
 # Inputs
 #
 
-# Set the logging level for yfinance to CRITICAL to reduce noise
-logging.getLogger('yfinance').setLevel(logging.CRITICAL)
-
 def validate_date(input_date):
     try:
         # Check if the input matches the desired format (YYYY-MM-DD)
@@ -39,17 +33,12 @@ def validate_date(input_date):
         return False
 
 def validate_assets(asset_inputs, start_date):
-    assets = {}
-    asset_tickers = asset_inputs.split(',')
-    for ticker in asset_tickers:
-        # Remove leading/trailing spaces
-        ticker = ticker.strip() 
-        # Download asset data using yfinance
-        asset_data = yf.download(ticker, start_date)['Adj Close']
-        if len(asset_data) > 0:
-            # Store asset data if successfully downloaded
-            assets[ticker] = asset_data
-    return assets
+    # Download the adjusted closes of the tickers, keeping only the ones with data (the data
+    # libraries are only imported once they're needed, after the start date is known)
+    from financialmarket import data
+
+    asset_tickers = [ticker.strip() for ticker in asset_inputs.split(',')]
+    return data.download_prices(asset_tickers, start_date)
 
 start_date = None
 while start_date is None:
@@ -68,6 +57,10 @@ while confidence_level is None:
     except ValueError:
         print('Invalid input. Please enter a number between 1 and 99.')
 
+scaling_type = input('Do you want the longer horizons from overlapping returns or from the 1-day VaR scaled by the square root of time? (overlapping/scaled): ')
+while scaling_type not in ['overlapping', 'scaled']:
+    scaling_type = input('Invalid input. Please enter "overlapping" or "scaled": ')
+
 calculation_type = input('Do you want to calculate VaR for individual assets or for a portfolio? (assets/portfolio): ')
 while calculation_type not in ['assets', 'portfolio']:
     calculation_type = input('Invalid input. Please enter "assets" or "portfolio": ')
@@ -76,10 +69,15 @@ asset_tickers = None
 while asset_tickers is None:
     asset_tickers = input('Specify the asset ticker symbols (comma-separated): ')
     assets = validate_assets(asset_tickers, start_date)
-    if not assets:
+    if assets.empty:
         print('No valid assets found. Please enter at least one valid asset ticker symbol.')
         asset_tickers = None
 
+# Assets quoted in other currencies can be converted to BRL
+from financialmarket import currencies
+
+assets = currencies.prompt_conversion(assets)
+
 # If calculating VaR for a portfolio, gather asset weights
 asset_weights = {}
 if calculation_type == 'portfolio':
@@ -104,33 +102,41 @@ if calculation_type == 'portfolio':
             break
 
 #
-# Assets
+# Value at Risk
 #
 
-# Calculate the VaR for each asset if assets was selected
-if calculation_type == 'assets':
-    for ticker, asset_data in assets.items():
-        returns = asset_data.resample('M').last().pct_change().dropna()
-        ordered_returns = np.sort(returns.values)
-        alpha_returns_position = int((1 - confidence_level) * len(ordered_returns))
-        var = abs(ordered_returns[alpha_returns_position] * 100)
-        print(f'The VaR at a {confidence_level * 100}% confidence level for {ticker} is: {var:.2f}%')
+from financialmarket import analyses
 
-#
-# Portfolio
-#
+# Calculate the VaR for each asset if assets was selected, or for the given portfolio if portfolio was selected
+results = analyses.value_at_risk(assets, confidence_level, asset_weights if calculation_type == 'portfolio' else None, scaling=scaling_type == 'scaled')
+for ticker, horizons_var in results['var'].items():
+    name = 'the given portfolio' if calculation_type == 'portfolio' else ticker
+    horizons_text = ', '.join([f'{var * 100:.2f}% ({horizon})' for horizon, var in horizons_var.items()])
+    print(f'The VaR at a {confidence_level * 100}% confidence level for {name} is: {horizons_text}')
 
-# Calculate the VaR for the given portfolio if portfolio was selected
+# Contributions of each asset to the portfolio's 1-day VaR and expected shortfall (ES)
 if calculation_type == 'portfolio':
-    combined_asset_data = None
-    for ticker, asset_data in assets.items():
-        weighted_asset_data = asset_data * asset_weights[ticker]
-        if combined_asset_data is None:
-            combined_asset_data = weighted_asset_data
-        else:
-            combined_asset_data += weighted_asset_data
-    returns = combined_asset_data.resample('M').last().pct_change().dropna()
-    ordered_returns = np.sort(returns.values)
-    alpha_returns_position = int((1 - confidence_level) * len(ordered_returns))
-    var = abs(ordered_returns[alpha_returns_position] * 100)
-    print(f'The VaR at a {confidence_level * 100}% confidence level for the given portfolio is: {var:.2f}%')
+    decomposition = analyses.var_decomposition(assets, confidence_level, asset_weights)
+    for method in ['parametric', 'historical']:
+        totals = decomposition['totals'][method]
+        print(f'\n{method.capitalize()} 1-day VaR {totals["var"] * 100:.2f}% and ES {totals["es"] * 100:.2f}% of the portfolio (daily rebalanced), by asset:')
+        for ticker, row in decomposition['decomposition'][method].iterrows():
+            print(f'- {ticker}: component VaR {row["component_var"] * 100:.2f}%, marginal VaR {row["marginal_var"] * 100:.2f}%, '
+                  f'component ES {row["component_es"] * 100:.2f}%, marginal ES {row["marginal_es"] * 100:.2f}%')
+
+    # Incremental VaR of hypothetical trades, without recomputing the whole portfolio
+    from financialmarket.jobs import parse_trades
+
+    while True:
+        trade_input = input('\nEnter a hypothetical trade as weight changes (e.g. PETR4.SA:5,VALE3.SA:-5), or press enter to finish: ')
+        if not trade_input.strip():
+            break
+        try:
+            trades = parse_trades(trade_input)
+            if not trades:
+                raise ValueError('Invalid trade. Please use TICKER:PERCENTAGE pairs, e.g. PETR4.SA:5,VALE3.SA:-5.')
+            incremental = decomposition['portfolio_risk'].incremental_var({ticker: change / 100 for ticker, change in trades[0].items()}).iloc[0]
+        except (ValueError, KeyError) as error:
+            print(error.args[0])
+            continue
+        print(f'Incremental 1-day VaR: {incremental["parametric_incremental_var"] * 100:+.2f}% (parametric), {incremental["historical_incremental_var"] * 100:+.2f}% (historical)')